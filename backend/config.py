@@ -2,6 +2,11 @@ import os
 
 
 class Settings:
+    """
+    Read once from the environment by get_settings() and read-only afterwards,
+    so every module of a process sees the same values.
+    """
+
     def __init__(self):
         # Read directly from environment variables
         self.database_url = (
@@ -13,6 +18,66 @@ class Settings:
         )
         self.environment = os.environ.get("ENVIRONMENT", "development")
 
+        # Worker processes serving the app (uvicorn --workers reads WEB_CONCURRENCY too)
+        self.web_concurrency = max(1, int(os.environ.get("WEB_CONCURRENCY", "1")))
+
+        # Connection pool (per process). With DB_CONNECTION_BUDGET > 0 the pool of each
+        # worker is sized from budget / workers instead, so all workers together stay within it
+        self.db_pool_size = int(os.environ.get("DB_POOL_SIZE", "10"))
+        self.db_max_overflow = int(os.environ.get("DB_MAX_OVERFLOW", "20"))
+        self.db_connection_budget = int(os.environ.get("DB_CONNECTION_BUDGET", "0"))
+        self.db_pool_pre_ping = os.environ.get("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+        self.db_pool_recycle = int(os.environ.get("DB_POOL_RECYCLE", "1800"))
+        self.db_pool_timeout = float(os.environ.get("DB_POOL_TIMEOUT", "30"))
+
+        # Request/DB instrumentation exported at /api/metrics
+        self.metrics_enabled = os.environ.get("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+        # With several workers, how often (seconds) each one writes its metrics for the others to serve
+        self.metrics_snapshot_interval = float(os.environ.get("METRICS_SNAPSHOT_INTERVAL", "15"))
+
+        # Slow-query log (needs METRICS_ENABLED): threshold in ms (0 = off), plan
+        # capture for new SELECT shapes, shapes kept
+        self.slow_query_ms = float(os.environ.get("SLOW_QUERY_MS", "0"))
+        self.slow_query_explain = os.environ.get("SLOW_QUERY_EXPLAIN", "true").lower() in ("1", "true", "yes")
+        self.slow_query_buffer = int(os.environ.get("SLOW_QUERY_BUFFER", "100"))
+
+        # Parsed User-Agent LRU cache (entries)
+        self.ua_cache_size = int(os.environ.get("UA_CACHE_SIZE", "1024"))
+
+        # Dashboard rollups: compaction interval (seconds) and days re-aggregated each run
+        self.rollup_interval = float(os.environ.get("ROLLUP_INTERVAL", "60"))
+        self.rollup_lookback_days = int(os.environ.get("ROLLUP_LOOKBACK_DAYS", "2"))
+
+        # Sessionization: inactivity gap (minutes) that ends a session, job interval (seconds)
+        self.session_gap_minutes = float(os.environ.get("SESSION_GAP_MINUTES", "30"))
+        self.sessionize_interval = float(os.environ.get("SESSIONIZE_INTERVAL", "300"))
+
+        # Unique-visitor sketches: how often (seconds) ingested visitors are merged into visitor_sketches
+        self.sketch_flush_interval = float(os.environ.get("SKETCH_FLUSH_INTERVAL", "10"))
+
+        # Whether /api/stats/export may return emails and IP addresses (include_private=true).
+        # There is no auth on the API, so this stays off unless the API is not public
+        self.export_private_columns = os.environ.get("EXPORT_PRIVATE_COLUMNS", "false").lower() in ("1", "true", "yes")
+
+        # TTL (seconds) of cached stats responses (/api/stats/dashboard, /api/signups/count)
+        self.response_cache_ttl = float(os.environ.get("RESPONSE_CACHE_TTL", "30"))
+
+        # Partitions of events/page_views: "month" or "day", how many to create ahead,
+        # and retention (0 = keep forever; "drop" or "archive" expired partitions)
+        self.partition_interval = os.environ.get("PARTITION_INTERVAL", "month")
+        self.partition_premake = int(os.environ.get("PARTITION_PREMAKE", "3"))
+        self.partition_maintenance_interval = float(os.environ.get("PARTITION_MAINTENANCE_INTERVAL", "3600"))
+        self.retention_days = int(os.environ.get("RETENTION_DAYS", "0"))
+        self.retention_mode = os.environ.get("RETENTION_MODE", "drop")
+
+        # Write-behind ingestion queue (tracking events, page view updates)
+        self.ingestion_queue_size = int(os.environ.get("INGESTION_QUEUE_SIZE", "10000"))
+        self.ingestion_batch_size = int(os.environ.get("INGESTION_BATCH_SIZE", "500"))
+        self.ingestion_flush_interval = float(os.environ.get("INGESTION_FLUSH_INTERVAL", "1.0"))
+        self.ingestion_enqueue_timeout = float(os.environ.get("INGESTION_ENQUEUE_TIMEOUT", "0.5"))
+        # Page view metric updates are merged per page view and flushed this often (seconds)
+        self.page_view_flush_interval = float(os.environ.get("PAGE_VIEW_FLUSH_INTERVAL", "5.0"))
+
         # Debug: print which URL we're using (without password)
         if "localhost" not in self.database_url:
             print(f"[CONFIG] Using database URL from environment")
@@ -20,6 +85,20 @@ class Settings:
             print(f"[CONFIG] WARNING: Using localhost database URL - no env var found")
             print(f"[CONFIG] Available env vars: {[k for k in os.environ.keys() if 'DATA' in k or 'POSTGRES' in k or 'PG' in k]}")
 
+        object.__setattr__(self, "_frozen", True)
+
+    def __setattr__(self, name, value):
+        if getattr(self, "_frozen", False):
+            raise AttributeError(f"Settings are read-only (tried to set {name})")
+        super().__setattr__(name, value)
+
+
+# Module level cache - initialized at runtime, not import time
+_settings = None
+
 
 def get_settings() -> Settings:
-    return Settings()
+    global _settings
+    if _settings is None:
+        _settings = Settings()
+    return _settings
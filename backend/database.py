@@ -1,4 +1,9 @@
-from sqlalchemy import create_engine
+import zlib
+from pathlib import Path
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -7,16 +12,74 @@ Base = declarative_base()
 # Module level cache - initialized at runtime, not import time
 _engine = None
 _SessionLocal = None
+_async_engine = None
+_AsyncSessionLocal = None
+
+# Alembic revisions, named after their revision id (0001_initial_schema.py, ...)
+MIGRATION_VERSIONS_DIR = Path(__file__).parent / "migrations" / "versions"
+
+# Sync driver -> async driver used by the request-serving engine. Postgres only:
+# ingestion and the jobs rely on ON CONFLICT, data-modifying CTEs and advisory locks
+ASYNC_DRIVERS = {
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+
+
+def get_async_database_url(database_url: str):
+    """Translate the configured (sync) URL into its async-driver equivalent."""
+    url = make_url(database_url)
+    if url.drivername not in ASYNC_DRIVERS and url.drivername != "postgresql+asyncpg":
+        raise RuntimeError(f"Unsupported database driver '{url.drivername}': ValidateIQ needs Postgres")
+    url = url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+
+    # asyncpg takes "ssl" instead of libpq's "sslmode"
+    if url.drivername == "postgresql+asyncpg" and "sslmode" in url.query:
+        url = url.update_query_dict({"ssl": url.query["sslmode"]}).difference_update_query(["sslmode"])
+
+    return url
+
+
+def worker_pool_size(budget: int, workers: int) -> tuple:
+    """
+    (pool_size, max_overflow) for one of `workers` processes sharing `budget`
+    Postgres connections: half kept open, half overflow closed when idle.
+    """
+    per_worker = budget // workers
+    # Cache invalidation listener, job leader lock, ingestion flusher and one request
+    if per_worker < 4:
+        raise RuntimeError(
+            f"DB_CONNECTION_BUDGET={budget} leaves {per_worker} connections per worker "
+            f"for {workers} workers (need at least 4)"
+        )
+    pool_size = per_worker // 2
+    return pool_size, per_worker - pool_size
+
+
+def get_pool_options(settings) -> dict:
+    """Connection pool settings shared by the sync and async engines."""
+    pool_size, max_overflow = settings.db_pool_size, settings.db_max_overflow
+    if settings.db_connection_budget > 0:
+        pool_size, max_overflow = worker_pool_size(settings.db_connection_budget, settings.web_concurrency)
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_timeout": settings.db_pool_timeout,
+    }
 
 
 def get_engine():
+    """Sync engine, for scripts and one-off maintenance."""
     global _engine
     if _engine is None:
         # Import here to avoid import-time execution
         from backend.config import get_settings
         settings = get_settings()
         print(f"[DATABASE] Creating engine with URL: {settings.database_url[:20]}...")
-        _engine = create_engine(settings.database_url)
+        _engine = create_engine(settings.database_url, **get_pool_options(settings))
     return _engine
 
 
@@ -27,10 +90,68 @@ def get_session_local():
     return _SessionLocal
 
 
-def get_db():
-    SessionLocal = get_session_local()
-    db = SessionLocal()
-    try:
+def get_async_engine():
+    """Async engine used by the API; one pool shared by every request."""
+    global _async_engine
+    if _async_engine is None:
+        from backend.config import get_settings
+        settings = get_settings()
+        url = get_async_database_url(settings.database_url)
+        print(f"[DATABASE] Creating async engine with driver: {url.drivername}")
+        options = get_pool_options(settings)
+        print(
+            f"[DATABASE] Pool per worker: {options['pool_size']} + {options['max_overflow']} overflow "
+            f"({settings.web_concurrency} worker(s))"
+        )
+        if settings.metrics_enabled:
+            from backend.services.metrics import TimedAsyncAdaptedQueuePool, get_metrics
+            options["poolclass"] = TimedAsyncAdaptedQueuePool
+            _async_engine = create_async_engine(url, **options)
+            get_metrics().instrument_engine(_async_engine.sync_engine)
+        else:
+            _async_engine = create_async_engine(url, **options)
+    return _async_engine
+
+
+def advisory_lock_key(name: str) -> int:
+    """Postgres advisory lock key for a named lock of this app."""
+    return zlib.crc32(f"validateiq:{name}".encode())
+
+
+def expected_schema_revision() -> str:
+    """
+    Newest migration revision shipped with this code. Revisions are numbered
+    sequentially, so this is a directory listing, not an Alembic import.
+    """
+    return max(path.name.split("_", 1)[0] for path in MIGRATION_VERSIONS_DIR.glob("[0-9]*_*.py"))
+
+
+async def check_schema(engine) -> None:
+    """Refuse to serve against a database not migrated to this code's schema."""
+    expected = expected_schema_revision()
+    current = None
+    async with engine.connect() as conn:
+        if await conn.run_sync(lambda sync_conn: sync_conn.dialect.has_table(sync_conn, "alembic_version")):
+            current = await conn.scalar(text("SELECT version_num FROM alembic_version"))
+    if current != expected:
+        raise RuntimeError(
+            f"Database schema is at revision {current or 'none'}, this code needs {expected}: "
+            f"run python -m backend.migrate first"
+        )
+
+
+def get_async_session_local():
+    global _AsyncSessionLocal
+    if _AsyncSessionLocal is None:
+        _AsyncSessionLocal = async_sessionmaker(
+            bind=get_async_engine(),
+            autoflush=False,
+            expire_on_commit=False,
+        )
+    return _AsyncSessionLocal
+
+
+async def get_db():
+    AsyncSessionLocal = get_async_session_local()
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
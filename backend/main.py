@@ -5,17 +5,47 @@ from fastapi.responses import FileResponse
 from pathlib import Path
 import os
 
-from backend.database import get_engine, Base
-from backend.routers import analytics, signups, stats
+from backend.database import get_async_engine, check_schema
+from backend.routers import analytics, signups, stats, metrics
+from backend.services.ingestion_queue import get_ingestion_queue
+from backend.config import get_settings
+from backend.services.metrics import MetricsMiddleware, get_metrics, snapshot_dir
+from backend.services.response_cache import InvalidationListener, get_response_cache
+from backend.services.user_agent_cache import get_user_agent_cache
+from backend.services.jobs import start_background_jobs, stop_background_jobs, flush_sketches_job
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: Create database tables
-    engine = get_engine()
-    Base.metadata.create_all(bind=engine)
+    # Startup: No DDL here. Tables and partitions are created by python -m backend.migrate
+    # (run once per deploy); only check that it ran for this version of the code
+    engine = get_async_engine()
+    await check_schema(engine)
+    # Startup: Start the write-behind ingestion flusher
+    ingestion_queue = get_ingestion_queue()
+    await ingestion_queue.start()
+    # Startup: Export queue and cache counters next to the request metrics
+    get_metrics().add_collector("ingestion", ingestion_queue.stats)
+    get_metrics().add_collector("response_cache", get_response_cache().stats)
+    get_metrics().add_collector("ua_cache", get_user_agent_cache().stats)
+    # Startup: With several workers, apply the cache invalidations the others broadcast
+    settings = get_settings()
+    listener = None
+    if settings.web_concurrency > 1:
+        listener = InvalidationListener(get_response_cache())
+        listener.start()
+        get_metrics().add_collector("cache_invalidation", listener.stats)
+    # Startup: Periodic jobs (dashboard rollups)
+    jobs = start_background_jobs()
     yield
-    # Shutdown: nothing to do
+    # Shutdown: Stop jobs, flush everything still queued (and its sketches), then close the pool
+    await stop_background_jobs(jobs)
+    await ingestion_queue.stop()
+    await flush_sketches_job(backfill=False)
+    if listener is not None:
+        await listener.stop()
+        get_metrics().remove_snapshot(snapshot_dir())
+    await engine.dispose()
 
 
 app = FastAPI(
@@ -25,10 +55,14 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Request timing and DB statement counts (no-op when METRICS_ENABLED=false)
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(analytics.router)
 app.include_router(signups.router)
 app.include_router(stats.router)
+app.include_router(metrics.router)
 
 # Serve static files (React build)
 frontend_dist = Path(__file__).parent.parent / "frontend" / "dist"
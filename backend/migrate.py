@@ -0,0 +1,101 @@
+"""
+Bring the database schema up to date. Run once per deploy, before the app:
+
+    python -m backend.migrate            # upgrade to the newest revision
+    python -m backend.migrate --check    # exit 1 unless already there
+
+Runs the Alembic migrations in backend/migrations, moves any rows out of the
+DEFAULT partitions, then creates the current and upcoming partitions of
+events/page_views. The app itself does no DDL at
+startup: it only checks that the schema is at the revision it was shipped
+with (database.check_schema).
+
+Concurrent runs (several replicas deploying at once) take turns on a
+Postgres advisory lock; the later ones find nothing left to do.
+"""
+import argparse
+import os
+import sys
+import time
+
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from sqlalchemy import create_engine, func, pool, select, text
+
+from backend.config import get_settings
+from backend.database import advisory_lock_key, expected_schema_revision
+from backend.services.partition_service import (
+    PARTITIONED_TABLES, drain_default_partition, upcoming_partitions
+)
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini")
+
+
+def current_revision(conn) -> str:
+    return MigrationContext.configure(conn).get_current_revision()
+
+
+def migrate(revision: str = "head") -> None:
+    settings = get_settings()
+    engine = create_engine(settings.database_url, poolclass=pool.NullPool)
+    key = advisory_lock_key("migrate")
+    try:
+        with engine.connect() as conn:
+            conn.execute(select(func.pg_advisory_lock(key)))
+            conn.commit()
+            try:
+                started = time.perf_counter()
+                before = current_revision(conn)
+                # Alembic must start its own transaction (CONCURRENTLY revisions step out of it)
+                conn.commit()
+                config = Config(ALEMBIC_INI)
+                config.attributes["connection"] = conn
+                command.upgrade(config, revision)
+                conn.commit()
+
+                # Rows in a DEFAULT partition would block creating their range partition
+                for table in PARTITIONED_TABLES:
+                    rows = drain_default_partition(conn, table, settings.partition_interval)
+                    if rows:
+                        print(f"[MIGRATE] Moved {rows} rows out of {table}'s DEFAULT partition")
+                for statement in upcoming_partitions(settings.partition_interval, settings.partition_premake):
+                    conn.execute(text(statement))
+                conn.commit()
+                print(
+                    f"[MIGRATE] {before or 'empty'} -> {current_revision(conn)} "
+                    f"in {time.perf_counter() - started:.1f}s"
+                )
+            finally:
+                # Never commit what a failed step left behind
+                conn.rollback()
+                conn.execute(select(func.pg_advisory_unlock(key)))
+                conn.commit()
+    finally:
+        engine.dispose()
+
+
+def check() -> bool:
+    engine = create_engine(get_settings().database_url, poolclass=pool.NullPool)
+    try:
+        with engine.connect() as conn:
+            current = current_revision(conn)
+    finally:
+        engine.dispose()
+    expected = expected_schema_revision()
+    print(f"[MIGRATE] Database at {current or 'empty'}, code needs {expected}")
+    return current == expected
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Apply database migrations")
+    parser.add_argument("--revision", default="head", help="Target revision (default: head)")
+    parser.add_argument("--check", action="store_true", help="Only report whether the schema is up to date")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.check:
+        sys.exit(0 if check() else 1)
+    migrate(args.revision)
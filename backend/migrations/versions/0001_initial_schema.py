@@ -0,0 +1,122 @@
+"""Initial schema: visitors, page_views, events, signups
+
+Databases created by Base.metadata.create_all before migrations existed
+already have these tables, so each one is only created when missing.
+
+Revision ID: 0001
+Revises:
+Create Date: 2024-06-01 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if "visitors" not in existing:
+        op.create_table(
+            "visitors",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("ip_address", sa.String(45), nullable=False),
+            sa.Column("fingerprint", sa.String(255), nullable=True),
+            sa.Column("first_seen", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("last_seen", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("user_agent", sa.Text(), nullable=True),
+            sa.Column("browser", sa.String(100), nullable=True),
+            sa.Column("browser_version", sa.String(50), nullable=True),
+            sa.Column("os", sa.String(100), nullable=True),
+            sa.Column("os_version", sa.String(50), nullable=True),
+            sa.Column("device_type", sa.String(50), nullable=True),
+            sa.Column("device_brand", sa.String(100), nullable=True),
+            sa.Column("device_model", sa.String(100), nullable=True),
+            sa.Column("is_bot", sa.Boolean(), nullable=True),
+            sa.Column("country", sa.String(100), nullable=True),
+            sa.Column("city", sa.String(100), nullable=True),
+            sa.Column("original_referrer", sa.Text(), nullable=True),
+            sa.Column("utm_source", sa.String(255), nullable=True),
+            sa.Column("utm_medium", sa.String(255), nullable=True),
+            sa.Column("utm_campaign", sa.String(255), nullable=True),
+            sa.Column("total_visits", sa.Integer(), nullable=True),
+            sa.Column("total_events", sa.Integer(), nullable=True),
+            sa.Column("total_time_seconds", sa.Integer(), nullable=True),
+            sa.Column("converted", sa.Boolean(), nullable=True),
+            sa.Column("converted_at", sa.DateTime(timezone=True), nullable=True),
+        )
+        op.create_index("ix_visitors_id", "visitors", ["id"])
+        op.create_index("ix_visitors_ip_address", "visitors", ["ip_address"], unique=True)
+
+    if "page_views" not in existing:
+        op.create_table(
+            "page_views",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("visitor_id", sa.Integer(), sa.ForeignKey("visitors.id"), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("referrer", sa.Text(), nullable=True),
+            sa.Column("utm_source", sa.String(255), nullable=True),
+            sa.Column("utm_medium", sa.String(255), nullable=True),
+            sa.Column("utm_campaign", sa.String(255), nullable=True),
+            sa.Column("utm_content", sa.String(255), nullable=True),
+            sa.Column("screen_width", sa.Integer(), nullable=True),
+            sa.Column("screen_height", sa.Integer(), nullable=True),
+            sa.Column("viewport_width", sa.Integer(), nullable=True),
+            sa.Column("viewport_height", sa.Integer(), nullable=True),
+            sa.Column("time_on_page_seconds", sa.Integer(), nullable=True),
+            sa.Column("max_scroll_depth", sa.Integer(), nullable=True),
+            sa.Column("reached_form", sa.Boolean(), nullable=True),
+            sa.Column("session_id", sa.String(255), nullable=True),
+        )
+        op.create_index("ix_page_views_id", "page_views", ["id"])
+
+    if "events" not in existing:
+        op.create_table(
+            "events",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("visitor_id", sa.Integer(), sa.ForeignKey("visitors.id"), nullable=False),
+            sa.Column("page_view_id", sa.Integer(), sa.ForeignKey("page_views.id"), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("event_type", sa.String(100), nullable=False),
+            sa.Column("event_category", sa.String(100), nullable=True),
+            sa.Column("element_id", sa.String(255), nullable=True),
+            sa.Column("element_class", sa.String(255), nullable=True),
+            sa.Column("element_text", sa.Text(), nullable=True),
+            sa.Column("section", sa.String(100), nullable=True),
+            sa.Column("properties", sa.JSON(), nullable=True),
+            sa.Column("scroll_position", sa.Integer(), nullable=True),
+            sa.Column("time_since_page_load", sa.Integer(), nullable=True),
+        )
+        op.create_index("ix_events_id", "events", ["id"])
+        op.create_index("ix_events_event_type", "events", ["event_type"])
+
+    if "signups" not in existing:
+        op.create_table(
+            "signups",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("visitor_id", sa.Integer(), sa.ForeignKey("visitors.id"), nullable=False),
+            sa.Column("email", sa.String(255), nullable=False),
+            sa.Column("most_wanted_feature", sa.String(100), nullable=False),
+            sa.Column("marketing_consent", sa.Boolean(), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("waitlist_position", sa.Integer(), nullable=True),
+            sa.Column("signup_source", sa.String(100), nullable=True),
+            sa.Column("time_to_signup_seconds", sa.Integer(), nullable=True),
+            sa.Column("page_views_before_signup", sa.Integer(), nullable=True),
+            sa.Column("events_before_signup", sa.Integer(), nullable=True),
+        )
+        op.create_index("ix_signups_id", "signups", ["id"])
+        op.create_index("ix_signups_email", "signups", ["email"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_table("signups")
+    op.drop_table("events")
+    op.drop_table("page_views")
+    op.drop_table("visitors")
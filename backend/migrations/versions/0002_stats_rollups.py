@@ -0,0 +1,37 @@
+"""Daily dashboard rollups (stats_rollups)
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2024-06-15 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if sa.inspect(op.get_bind()).has_table("stats_rollups"):
+        return
+
+    op.create_table(
+        "stats_rollups",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("bucket_date", sa.Date(), nullable=False),
+        sa.Column("metric", sa.String(50), nullable=False),
+        sa.Column("dimension", sa.Text(), nullable=False),
+        sa.Column("count", sa.BigInteger(), nullable=False),
+        sa.Column("total", sa.BigInteger(), nullable=False),
+        sa.UniqueConstraint("bucket_date", "metric", "dimension", name="uq_stats_rollups_bucket"),
+    )
+    op.create_index("ix_stats_rollups_id", "stats_rollups", ["id"])
+
+
+def downgrade() -> None:
+    op.drop_table("stats_rollups")
@@ -0,0 +1,64 @@
+"""Indexes for the hot query shapes
+
+- (event_type, visitor_id): COUNT(DISTINCT visitor_id) per event type
+- (event_type, section, visitor_id): section engagement
+- (visitor_id, event_type, created_at): per-visitor lookups and the
+  first-occurrence checks of the rollup job
+- visitor_id on page_views/signups, page_view_id on events
+- BRIN on created_at for the append-only events/page_views tables,
+  btree on signups.created_at and visitors.first_seen
+
+Indexes are built CONCURRENTLY so ingestion keeps running. The single
+column event_type / created_at btrees they supersede are dropped.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2024-07-01 00:00:00
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ("ix_events_type_visitor", "events", ["event_type", "visitor_id"], {}),
+    ("ix_events_type_section_visitor", "events", ["event_type", "section", "visitor_id"], {}),
+    ("ix_events_visitor_type_created", "events", ["visitor_id", "event_type", "created_at"], {}),
+    ("ix_events_page_view_id", "events", ["page_view_id"], {}),
+    ("brin_events_created_at", "events", ["created_at"], {"postgresql_using": "brin"}),
+    ("ix_page_views_visitor_id", "page_views", ["visitor_id"], {}),
+    ("brin_page_views_created_at", "page_views", ["created_at"], {"postgresql_using": "brin"}),
+    ("ix_signups_visitor_id", "signups", ["visitor_id"], {}),
+    ("ix_signups_created_at", "signups", ["created_at"], {}),
+    ("ix_visitors_first_seen", "visitors", ["first_seen"], {}),
+]
+
+SUPERSEDED = [
+    ("ix_events_event_type", "events"),
+    ("ix_events_created_at", "events"),
+    ("ix_page_views_created_at", "page_views"),
+]
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns, options in INDEXES:
+            op.create_index(
+                name, table, columns,
+                if_not_exists=True, postgresql_concurrently=True, **options
+            )
+        for name, table in SUPERSEDED:
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index("ix_events_event_type", "events", ["event_type"], postgresql_concurrently=True)
+        for name, table, _, _ in INDEXES:
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
@@ -0,0 +1,98 @@
+"""Partition events and page_views by RANGE (created_at)
+
+Postgres cannot turn an existing table into a partitioned one, so each
+table is renamed, recreated as a partitioned twin (LIKE ... INCLUDING
+DEFAULTS keeps the id sequence), given partitions covering its data plus
+PARTITION_PREMAKE upcoming ones, and refilled with INSERT ... SELECT.
+This rewrites both tables: run it in a maintenance window.
+
+The primary keys become (id, created_at), as required for partitioned
+tables. events.page_view_id loses its foreign key, since page_views.id
+alone is no longer unique-constrained.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2024-07-15 00:00:00
+
+"""
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+from backend.config import get_settings
+from backend.services.partition_service import next_partition_start, partition_start, partitions_between
+
+
+# revision identifiers, used by Alembic.
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+INDEXES = {
+    "events": [
+        ("ix_events_id", ["id"], {}),
+        ("ix_events_type_visitor", ["event_type", "visitor_id"], {}),
+        ("ix_events_type_section_visitor", ["event_type", "section", "visitor_id"], {}),
+        ("ix_events_visitor_type_created", ["visitor_id", "event_type", "created_at"], {}),
+        ("ix_events_page_view_id", ["page_view_id"], {}),
+        ("brin_events_created_at", ["created_at"], {"postgresql_using": "brin"}),
+    ],
+    "page_views": [
+        ("ix_page_views_id", ["id"], {}),
+        ("ix_page_views_visitor_id", ["visitor_id"], {}),
+        ("brin_page_views_created_at", ["created_at"], {"postgresql_using": "brin"}),
+    ],
+}
+
+
+def _rebuild(table: str, partitioned: bool) -> None:
+    old = f"{table}_old"
+
+    op.execute(f"UPDATE {table} SET created_at = now() WHERE created_at IS NULL")
+    op.execute(f"ALTER TABLE {table} RENAME TO {old}")
+    op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY NONE")
+
+    if partitioned:
+        settings = get_settings()
+        op.execute(
+            f"CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)"
+        )
+        op.execute(f"ALTER TABLE {table} ALTER COLUMN created_at SET NOT NULL")
+
+        today = datetime.now(timezone.utc).date()
+        first = op.get_bind().scalar(sa.text(f"SELECT min(created_at) FROM {old}"))
+        first = first.astimezone(timezone.utc).date() if first else today
+        last = partition_start(today, settings.partition_interval)
+        for _ in range(settings.partition_premake):
+            last = next_partition_start(last, settings.partition_interval)
+        for statement in partitions_between(table, first, last, settings.partition_interval):
+            op.execute(statement)
+    else:
+        op.execute(f"CREATE TABLE {table} (LIKE {old} INCLUDING DEFAULTS)")
+
+    op.execute(f"INSERT INTO {table} SELECT * FROM {old}")
+    # CASCADE drops foreign keys that point at the old table (events.page_view_id)
+    op.execute(f"DROP TABLE {old} CASCADE")
+    op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+
+    primary_key = ["id", "created_at"] if partitioned else ["id"]
+    op.create_primary_key(f"{table}_pkey", table, primary_key)
+    op.create_foreign_key(f"{table}_visitor_id_fkey", table, "visitors", ["visitor_id"], ["id"])
+    for name, columns, options in INDEXES[table]:
+        op.create_index(name, table, columns, **options)
+
+
+def upgrade() -> None:
+    _rebuild("events", partitioned=True)
+    _rebuild("page_views", partitioned=True)
+
+
+def downgrade() -> None:
+    _rebuild("page_views", partitioned=False)
+    _rebuild("events", partitioned=False)
+    op.create_foreign_key(
+        "events_page_view_id_fkey", "events", "page_views", ["page_view_id"], ["id"]
+    )
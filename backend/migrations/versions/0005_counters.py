@@ -0,0 +1,38 @@
+"""Counters table for gap-free waitlist positions
+
+Seeds the "signups" counter with the highest position handed out so far,
+so new signups continue the existing sequence.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2024-07-22 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if not sa.inspect(op.get_bind()).has_table("counters"):
+        op.create_table(
+            "counters",
+            sa.Column("name", sa.String(50), primary_key=True),
+            sa.Column("value", sa.BigInteger(), nullable=False),
+        )
+
+    op.execute(
+        "INSERT INTO counters (name, value) "
+        "SELECT 'signups', GREATEST(COALESCE(MAX(waitlist_position), 0), COUNT(*)) FROM signups "
+        "ON CONFLICT (name) DO NOTHING"
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("counters")
@@ -0,0 +1,57 @@
+"""Sessions table and job watermarks for incremental sessionization
+
+The sessions job backfills from the earliest page view / event on its first
+run, so nothing is copied here.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2024-08-05 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table("sessions"):
+        op.create_table(
+            "sessions",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("session_id", sa.String(64), nullable=False, unique=True),
+            sa.Column("visitor_id", sa.Integer(), sa.ForeignKey("visitors.id"), nullable=False),
+            sa.Column("started_at", sa.DateTime(timezone=True), nullable=False),
+            sa.Column("ended_at", sa.DateTime(timezone=True), nullable=False),
+            sa.Column("duration_seconds", sa.Integer(), nullable=False),
+            sa.Column("page_views", sa.Integer(), nullable=False),
+            sa.Column("events", sa.Integer(), nullable=False),
+            sa.Column("is_bounce", sa.Boolean(), nullable=False),
+            sa.Column("converted", sa.Boolean(), nullable=False),
+            sa.Column("entry_section", sa.String(100), nullable=True),
+            sa.Column("exit_section", sa.String(100), nullable=True),
+            sa.Column("referrer", sa.Text(), nullable=True),
+            sa.Column("utm_source", sa.String(255), nullable=True),
+        )
+        op.create_index("ix_sessions_id", "sessions", ["id"])
+        op.create_index("ix_sessions_started_at", "sessions", ["started_at"])
+        op.create_index("ix_sessions_visitor_ended", "sessions", ["visitor_id", "ended_at"])
+
+    if not inspector.has_table("job_watermarks"):
+        op.create_table(
+            "job_watermarks",
+            sa.Column("name", sa.String(50), primary_key=True),
+            sa.Column("watermark", sa.DateTime(timezone=True), nullable=False),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("job_watermarks")
+    op.drop_table("sessions")
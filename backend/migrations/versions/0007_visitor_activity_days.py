@@ -0,0 +1,41 @@
+"""Visitor activity days for cohort retention
+
+Backfills one row per visitor and UTC day with a page view or event.
+From here on ingestion keeps the table current.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2024-08-19 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if sa.inspect(op.get_bind()).has_table("visitor_activity_days"):
+        return
+
+    op.create_table(
+        "visitor_activity_days",
+        sa.Column("visitor_id", sa.Integer(), sa.ForeignKey("visitors.id"), primary_key=True),
+        sa.Column("day", sa.Date(), primary_key=True),
+    )
+
+    op.execute("""
+        INSERT INTO visitor_activity_days (visitor_id, day)
+        SELECT visitor_id, (created_at AT TIME ZONE 'UTC')::date FROM page_views
+        UNION
+        SELECT visitor_id, (created_at AT TIME ZONE 'UTC')::date FROM events
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table("visitor_activity_days")
@@ -0,0 +1,36 @@
+"""HyperLogLog unique-visitor sketches per day, event type and section
+
+The sketches job fills the table from events on its first run, because
+the registers are computed in Python.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2024-09-02 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if sa.inspect(op.get_bind()).has_table("visitor_sketches"):
+        return
+
+    op.create_table(
+        "visitor_sketches",
+        sa.Column("day", sa.Date(), primary_key=True),
+        sa.Column("event_type", sa.String(100), primary_key=True),
+        sa.Column("section", sa.String(100), primary_key=True),
+        sa.Column("registers", sa.LargeBinary(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("visitor_sketches")
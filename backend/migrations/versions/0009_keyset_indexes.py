@@ -0,0 +1,89 @@
+"""Keyset browsing indexes on (created_at, id)
+
+The /api/stats/events, /page-views and /visitors lists page on
+(created_at, id) (first_seen for visitors), optionally after an equality
+filter. The INCLUDE columns are the compact projection, so compact pages
+are index-only scans.
+
+CREATE INDEX CONCURRENTLY does not work on a partitioned table. For
+events and page_views, the index is therefore created ON ONLY the parent
+(invalid until every partition has one). Each partition's index is built
+CONCURRENTLY and then attached. Partitions created later get the index
+automatically.
+
+ix_visitors_first_seen is superseded by (first_seen, id) and dropped.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2024-09-09 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+# (name, table, columns, include)
+PARTITIONED_INDEXES = [
+    ("ix_events_created_id", "events", ["created_at", "id"], ["visitor_id", "event_type", "section"]),
+    ("ix_events_visitor_created_id", "events", ["visitor_id", "created_at", "id"], ["event_type", "section"]),
+    ("ix_events_type_created_id", "events", ["event_type", "created_at", "id"], ["visitor_id", "section"]),
+    ("ix_page_views_created_id", "page_views", ["created_at", "id"], ["visitor_id"]),
+    ("ix_page_views_visitor_created_id", "page_views", ["visitor_id", "created_at", "id"], []),
+]
+
+
+def _definition(table: str, columns, include) -> str:
+    definition = f"{table} ({', '.join(columns)})"
+    if include:
+        definition += f" INCLUDE ({', '.join(include)})"
+    return definition
+
+
+def _partitions(table: str):
+    return op.get_bind().execute(sa.text(
+        "SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = CAST(:table AS regclass)"
+    ), {"table": table}).scalars().all()
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns, include in PARTITIONED_INDEXES:
+            op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON ONLY {_definition(table, columns, include)}")
+            suffix = name[len(f"ix_{table}_"):]
+            for partition in _partitions(table):
+                partition_index = f"{partition}_{suffix}"
+                op.execute(
+                    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {partition_index} "
+                    f"ON {_definition(partition, columns, include)}"
+                )
+                # Already attached if a previous run got this far
+                attached = op.get_bind().execute(sa.text(
+                    "SELECT 1 FROM pg_inherits WHERE inhrelid = CAST(:index AS regclass)"
+                ), {"index": partition_index}).first()
+                if not attached:
+                    op.execute(f"ALTER INDEX {name} ATTACH PARTITION {partition_index}")
+
+        op.create_index(
+            "ix_visitors_first_seen_id", "visitors", ["first_seen", "id"],
+            if_not_exists=True, postgresql_concurrently=True,
+        )
+        op.drop_index("ix_visitors_first_seen", table_name="visitors", if_exists=True, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_visitors_first_seen", "visitors", ["first_seen"],
+            if_not_exists=True, postgresql_concurrently=True,
+        )
+        op.drop_index("ix_visitors_first_seen_id", table_name="visitors", if_exists=True, postgresql_concurrently=True)
+    # Dropping the parent index drops the attached partition indexes
+    for name, table, _, _ in PARTITIONED_INDEXES:
+        op.drop_index(name, table_name=table, if_exists=True)
@@ -0,0 +1,40 @@
+"""DEFAULT partitions for events and page_views
+
+Rows whose range partition was not created in time (the maintenance job
+down for longer than PARTITION_PREMAKE intervals) land in events_default /
+page_views_default instead of failing the insert. The maintenance job
+moves them into range partitions on its next run.
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2024-09-16 00:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+
+TABLES = ("events", "page_views")
+
+
+def upgrade() -> None:
+    for table in TABLES:
+        op.execute(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT")
+
+
+def downgrade() -> None:
+    for table in TABLES:
+        rows = op.get_bind().execute(sa.text(f"SELECT COUNT(*) FROM {table}_default")).scalar()
+        if rows:
+            # Without a DEFAULT partition those rows have nowhere to go
+            raise RuntimeError(
+                f"{table}_default still has {rows} rows: run the partition maintenance job first"
+            )
+        op.execute(f"DROP TABLE IF EXISTS {table}_default")
@@ -2,5 +2,11 @@ from backend.models.visitor import Visitor
 from backend.models.page_view import PageView
 from backend.models.event import Event
 from backend.models.signup import Signup
+from backend.models.stats_rollup import StatsRollup
+from backend.models.counter import Counter
+from backend.models.session import VisitorSession
+from backend.models.job_watermark import JobWatermark
+from backend.models.visitor_activity_day import VisitorActivityDay
+from backend.models.visitor_sketch import VisitorSketch
 
-__all__ = ["Visitor", "PageView", "Event", "Signup"]
+__all__ = ["Visitor", "PageView", "Event", "Signup", "StatsRollup", "Counter", "VisitorSession", "JobWatermark", "VisitorActivityDay", "VisitorSketch"]
@@ -0,0 +1,14 @@
+"""
+Contadores globales (una fila por nombre).
+"signups" reparte las posiciones de la waitlist: se incrementa en la misma
+transaccion que inserta el signup, asi que las posiciones son unicas y sin huecos.
+"""
+from sqlalchemy import Column, String, BigInteger
+from backend.database import Base
+
+
+class Counter(Base):
+    __tablename__ = "counters"
+
+    name = Column(String(50), primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
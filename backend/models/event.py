@@ -1,7 +1,9 @@
 """
 Cada click, scroll, hover, etc. que queramos trackear.
+
+Tabla particionada por RANGE (created_at); ver services/partition_service.py.
 """
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, JSON
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, JSON, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from backend.database import Base
@@ -10,15 +12,16 @@ from backend.database import Base
 class Event(Base):
     __tablename__ = "events"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     visitor_id = Column(Integer, ForeignKey("visitors.id"), nullable=False)
-    page_view_id = Column(Integer, ForeignKey("page_views.id"), nullable=True)
+    # Sin FK: page_views esta particionada y su PK es (id, created_at)
+    page_view_id = Column(Integer, nullable=True)
 
-    # Timestamp exacto
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Timestamp exacto (clave de particion, por eso es parte de la PK)
+    created_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
 
     # Tipo de evento
-    event_type = Column(String(100), nullable=False, index=True)
+    event_type = Column(String(100), nullable=False)
     # Ejemplos:
     # - "scroll" (con depth en properties)
     # - "section_view" (que seccion vieron)
@@ -67,3 +70,33 @@ class Event(Base):
 
     # Relaciones
     visitor = relationship("Visitor", back_populates="events")
+
+    # Indices para los queries calientes (ver migrations/versions/0003)
+    __table_args__ = (
+        # COUNT(DISTINCT visitor_id) WHERE event_type = ... (index-only)
+        Index("ix_events_type_visitor", "event_type", "visitor_id"),
+        # Section engagement: GROUP BY section por event_type
+        Index("ix_events_type_section_visitor", "event_type", "section", "visitor_id"),
+        # Eventos de un visitor (signups, "primera vez" en rollups)
+        Index("ix_events_visitor_type_created", "visitor_id", "event_type", "created_at"),
+        Index("ix_events_page_view_id", "page_view_id"),
+        # Tabla append-only: BRIN es diminuto y sirve para rangos de tiempo
+        Index("brin_events_created_at", "created_at", postgresql_using="brin"),
+        # Paginacion keyset por (created_at, id); INCLUDE = proyeccion compacta (ver 0009)
+        Index(
+            "ix_events_created_id", "created_at", "id",
+            postgresql_include=["visitor_id", "event_type", "section"],
+        ),
+        Index(
+            "ix_events_visitor_created_id", "visitor_id", "created_at", "id",
+            postgresql_include=["event_type", "section"],
+        ),
+        Index(
+            "ix_events_type_created_id", "event_type", "created_at", "id",
+            postgresql_include=["visitor_id", "section"],
+        ),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+    # La PK de la tabla es (id, created_at); para el ORM basta con id
+    __mapper_args__ = {"primary_key": [id]}
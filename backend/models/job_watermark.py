@@ -0,0 +1,16 @@
+"""
+Hasta donde llego cada job incremental (una fila por job).
+"sessions": toda la actividad con created_at anterior ya esta sesionizada.
+"sketch_backfill": primer dia de historia sin sketches todavia, hasta
+"sketch_backfill_until" (lo posterior lo cubren los buffers de ingest).
+"rollups": primer dia sin agregar todavia en stats_rollups.
+"""
+from sqlalchemy import Column, String, DateTime
+from backend.database import Base
+
+
+class JobWatermark(Base):
+    __tablename__ = "job_watermarks"
+
+    name = Column(String(50), primary_key=True)
+    watermark = Column(DateTime(timezone=True), nullable=False)
@@ -1,7 +1,9 @@
 """
 Cada vez que un visitante carga la pagina.
+
+Tabla particionada por RANGE (created_at); ver services/partition_service.py.
 """
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from backend.database import Base
@@ -10,11 +12,11 @@ from backend.database import Base
 class PageView(Base):
     __tablename__ = "page_views"
 
-    id = Column(Integer, primary_key=True, index=True)
-    visitor_id = Column(Integer, ForeignKey("visitors.id"), nullable=False)
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
+    visitor_id = Column(Integer, ForeignKey("visitors.id"), nullable=False, index=True)
 
-    # Timestamp
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Timestamp (clave de particion, por eso es parte de la PK)
+    created_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
 
     # De donde vienen en esta sesion especifica
     referrer = Column(Text, nullable=True)
@@ -45,3 +47,15 @@ class PageView(Base):
 
     # Relacion
     visitor = relationship("Visitor", back_populates="page_views")
+
+    __table_args__ = (
+        # Tabla append-only: BRIN es diminuto y sirve para rangos de tiempo
+        Index("brin_page_views_created_at", "created_at", postgresql_using="brin"),
+        # Paginacion keyset por (created_at, id) (ver 0009)
+        Index("ix_page_views_created_id", "created_at", "id", postgresql_include=["visitor_id"]),
+        Index("ix_page_views_visitor_created_id", "visitor_id", "created_at", "id"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+    # La PK de la tabla es (id, created_at); para el ORM basta con id
+    __mapper_args__ = {"primary_key": [id]}
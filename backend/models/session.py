@@ -0,0 +1,49 @@
+"""
+Sesiones de un visitante: su actividad (page views + eventos) agrupada por
+inactividad. Las calcula el job de sesiones de forma incremental a partir
+de las tablas crudas; ver services/session_service.py.
+"""
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean, Index
+from backend.database import Base
+
+
+class VisitorSession(Base):
+    __tablename__ = "sessions"
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    # "<visitor_id>-<inicio en ms>"; es lo que se escribe en page_views.session_id
+    session_id = Column(String(64), unique=True, nullable=False)
+    visitor_id = Column(Integer, ForeignKey("visitors.id"), nullable=False)
+
+    # Primera y ultima actividad (page view o evento)
+    started_at = Column(DateTime(timezone=True), nullable=False)
+    ended_at = Column(DateTime(timezone=True), nullable=False)
+
+    # Hasta la ultima actividad o el final de la ultima pagina (si llego el beacon)
+    duration_seconds = Column(Integer, nullable=False, default=0)
+
+    # Profundidad
+    page_views = Column(Integer, nullable=False, default=0)
+    events = Column(Integer, nullable=False, default=0)
+
+    # Una sola pagina y ningun evento de interaccion (scroll, tabs, etc. no cuentan)
+    is_bounce = Column(Boolean, nullable=False, default=False)
+
+    # Hubo form_submit_success (o un signup) en la sesion?
+    converted = Column(Boolean, nullable=False, default=False)
+
+    # Primera y ultima seccion con eventos
+    entry_section = Column(String(100), nullable=True)
+    exit_section = Column(String(100), nullable=True)
+
+    # Del primer page view de la sesion
+    referrer = Column(Text, nullable=True)
+    utm_source = Column(String(255), nullable=True)
+
+    __table_args__ = (
+        # Reportes por rango de fechas
+        Index("ix_sessions_started_at", "started_at"),
+        # Sesiones que pueden seguir abiertas de un visitor (sesionizacion incremental)
+        Index("ix_sessions_visitor_ended", "visitor_id", "ended_at"),
+    )
@@ -11,7 +11,7 @@ class Signup(Base):
     __tablename__ = "signups"
 
     id = Column(Integer, primary_key=True, index=True)
-    visitor_id = Column(Integer, ForeignKey("visitors.id"), nullable=False)
+    visitor_id = Column(Integer, ForeignKey("visitors.id"), nullable=False, index=True)
 
     # Email
     email = Column(String(255), unique=True, index=True, nullable=False)
@@ -23,7 +23,7 @@ class Signup(Base):
     marketing_consent = Column(Boolean, default=False)
 
     # Timestamps
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
 
     # Posicion en la waitlist (calculado)
     waitlist_position = Column(Integer, nullable=True)
@@ -0,0 +1,35 @@
+"""
+Agregados diarios precalculados para el dashboard.
+Una fila por (dia, metrica, dimension); los recalcula el job de rollups.
+"""
+from sqlalchemy import Column, Integer, String, Date, Text, BigInteger, UniqueConstraint
+from backend.database import Base
+
+
+class StatsRollup(Base):
+    __tablename__ = "stats_rollups"
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    # Dia del bucket (por created_at / first_seen de la fila original)
+    bucket_date = Column(Date, nullable=False)
+
+    # Que se cuenta
+    metric = Column(String(50), nullable=False)
+    # Ejemplos:
+    # - "visitors", "page_views", "signups" (dimension vacia)
+    # - "devices" (device_type), "referrers" (original_referrer)
+    # - "events" (event_type), "feature_votes" (most_wanted_feature)
+    # - "section_visitors" (section), "form_visitors" (event_type)
+    # - "time_on_page", "scroll_depth" (count + total para sacar promedios)
+
+    # Valor del GROUP BY ("" si la metrica no tiene dimension)
+    dimension = Column(Text, nullable=False, default="")
+
+    # Contador y suma (la suma solo se usa en metricas de promedio)
+    count = Column(BigInteger, nullable=False, default=0)
+    total = Column(BigInteger, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("bucket_date", "metric", "dimension", name="uq_stats_rollups_bucket"),
+    )
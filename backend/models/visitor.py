@@ -1,7 +1,7 @@
 """
 Cada IP unica es un visitante. Trackeamos todo lo que podamos de ellos.
 """
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from backend.database import Base
@@ -56,3 +56,8 @@ class Visitor(Base):
     events = relationship("Event", back_populates="visitor")
     page_views = relationship("PageView", back_populates="visitor")
     signup = relationship("Signup", back_populates="visitor", uselist=False)
+
+    __table_args__ = (
+        # Rangos de first_seen (rollups, retencion) y paginacion keyset (ver 0009)
+        Index("ix_visitors_first_seen_id", "first_seen", "id"),
+    )
@@ -0,0 +1,14 @@
+"""
+Dias (UTC) en que un visitante tuvo actividad: una fila por (visitor, dia).
+Se escribe al ingerir (page views y eventos) y alimenta /api/stats/retention
+sin tocar events.
+"""
+from sqlalchemy import Column, Integer, Date, ForeignKey
+from backend.database import Base
+
+
+class VisitorActivityDay(Base):
+    __tablename__ = "visitor_activity_days"
+
+    visitor_id = Column(Integer, ForeignKey("visitors.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
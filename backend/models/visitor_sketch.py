@@ -0,0 +1,20 @@
+"""
+HyperLogLog de visitors unicos por (dia, event_type, section).
+Se pueden unir (max por registro) para cualquier rango de dias; ver
+services/sketch_service.py. Los page views usan event_type "page_view".
+"""
+from sqlalchemy import Column, String, Date, LargeBinary
+from backend.database import Base
+
+
+class VisitorSketch(Base):
+    __tablename__ = "visitor_sketches"
+
+    # Dia UTC de la actividad
+    day = Column(Date, primary_key=True)
+    event_type = Column(String(100), primary_key=True)
+    # "" si el evento no tiene seccion
+    section = Column(String(100), primary_key=True, default="")
+
+    # 2^precision registros de un byte
+    registers = Column(LargeBinary, nullable=False)
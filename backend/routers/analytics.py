@@ -1,12 +1,15 @@
 """
 Endpoints para recibir eventos de tracking del frontend.
 """
-from fastapi import APIRouter, Request, Depends
-from sqlalchemy.orm import Session
-from typing import Optional
-from pydantic import BaseModel
+from fastapi import APIRouter, Request, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional, List
+from pydantic import BaseModel, Field
 from backend.database import get_db
-from backend.services import visitor_service, analytics_service
+from backend.services import visitor_service
+from backend.services.ingestion_queue import (
+    get_ingestion_queue, QueueFullError, EVENTS, PAGE_VIEW_UPDATE, BEACON
+)
 
 router = APIRouter(prefix="/api/analytics", tags=["analytics"])
 
@@ -42,6 +45,11 @@ class TrackEventRequest(BaseModel):
     time_since_page_load: Optional[int] = None
 
 
+class TrackEventsBatchRequest(BaseModel):
+    """Varios eventos del mismo visitor/page view en un solo request"""
+    events: List[TrackEventRequest] = Field(..., min_length=1, max_length=500)
+
+
 class UpdatePageViewRequest(BaseModel):
     """Para actualizar metricas de la pagina (scroll, tiempo)"""
     page_view_id: int
@@ -67,32 +75,25 @@ class BeaconRequest(BaseModel):
 async def init_visitor(
     request: Request,
     data: InitVisitorRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Se llama cuando carga la pagina.
-    Crea o actualiza el visitor, crea un page_view.
+    Crea o actualiza el visitor y crea un page_view en un solo statement.
     Retorna visitor_id y page_view_id para usar en subsequent calls.
+
+    No pasa por la cola de ingestion porque necesita los IDs de la DB.
     """
     ip = get_client_ip(request)
     user_agent = request.headers.get("user-agent", "")
 
-    visitor = visitor_service.get_or_create_visitor(
+    visit = await visitor_service.record_visit(
         db=db,
         ip_address=ip,
         user_agent=user_agent,
         referrer=data.referrer,
         utm_source=data.utm_source,
         utm_medium=data.utm_medium,
-        utm_campaign=data.utm_campaign
-    )
-
-    page_view = analytics_service.create_page_view(
-        db=db,
-        visitor_id=visitor.id,
-        referrer=data.referrer,
-        utm_source=data.utm_source,
-        utm_medium=data.utm_medium,
         utm_campaign=data.utm_campaign,
         utm_content=data.utm_content,
         screen_width=data.screen_width,
@@ -102,76 +103,75 @@ async def init_visitor(
     )
 
     return {
-        "visitor_id": visitor.id,
-        "page_view_id": page_view.id,
-        "is_returning": visitor.total_visits > 1,
-        "visit_count": visitor.total_visits
+        "visitor_id": visit.visitor_id,
+        "page_view_id": visit.page_view_id,
+        "is_returning": visit.total_visits > 1,
+        "visit_count": visit.total_visits
     }
 
 
-@router.post("/event")
+@router.post("/event", status_code=202)
 async def track_event(
-    request: Request,
     data: TrackEventRequest,
     visitor_id: int,
-    page_view_id: Optional[int] = None,
-    db: Session = Depends(get_db)
+    page_view_id: Optional[int] = None
 ):
     """
     Trackea cualquier evento del usuario.
+    Se encola y se escribe en batch por el flusher.
     """
-    event = analytics_service.create_event(
-        db=db,
-        visitor_id=visitor_id,
-        page_view_id=page_view_id,
-        event_type=data.event_type,
-        event_category=data.event_category,
-        element_id=data.element_id,
-        element_class=data.element_class,
-        element_text=data.element_text,
-        section=data.section,
-        properties=data.properties,
-        scroll_position=data.scroll_position,
-        time_since_page_load=data.time_since_page_load
-    )
-
-    return {"event_id": event.id}
+    await enqueue(EVENTS, {
+        "visitor_id": visitor_id,
+        "page_view_id": page_view_id,
+        "events": [data.model_dump()]
+    })
+    return {"queued": True}
 
 
-@router.post("/pageview/update")
-async def update_page_view(
-    data: UpdatePageViewRequest,
-    db: Session = Depends(get_db)
+@router.post("/events", status_code=202)
+async def track_events(
+    data: TrackEventsBatchRequest,
+    visitor_id: int,
+    page_view_id: Optional[int] = None
 ):
+    """
+    Trackea un batch de eventos del mismo visitor/page view.
+    Se encola completo y se escribe con un solo INSERT.
+    """
+    await enqueue(EVENTS, {
+        "visitor_id": visitor_id,
+        "page_view_id": page_view_id,
+        "events": [event.model_dump() for event in data.events]
+    })
+    return {"queued": True, "events_count": len(data.events)}
+
+
+@router.post("/pageview/update", status_code=202)
+async def update_page_view(data: UpdatePageViewRequest):
     """
     Actualiza metricas del page view (scroll depth, tiempo, etc.)
     Se puede llamar periodicamente o en eventos especificos.
     """
-    analytics_service.update_page_view(
-        db=db,
-        page_view_id=data.page_view_id,
-        time_on_page_seconds=data.time_on_page_seconds,
-        max_scroll_depth=data.max_scroll_depth,
-        reached_form=data.reached_form
-    )
+    await enqueue(PAGE_VIEW_UPDATE, {
+        "page_view_id": data.page_view_id,
+        "time_on_page_seconds": data.time_on_page_seconds,
+        "max_scroll_depth": data.max_scroll_depth,
+        "reached_form": data.reached_form
+    })
     return {"success": True}
 
 
-@router.post("/beacon")
-async def beacon(
-    data: BeaconRequest,
-    db: Session = Depends(get_db)
-):
+@router.post("/beacon", status_code=202)
+async def beacon(data: BeaconRequest):
     """
     Se llama con sendBeacon cuando el usuario sale de la pagina.
     Guarda las metricas finales.
     """
-    analytics_service.finalize_page_view(
-        db=db,
-        page_view_id=data.page_view_id,
-        time_on_page_seconds=data.time_on_page_seconds,
-        max_scroll_depth=data.max_scroll_depth
-    )
+    await enqueue(BEACON, {
+        "page_view_id": data.page_view_id,
+        "time_on_page_seconds": data.time_on_page_seconds,
+        "max_scroll_depth": data.max_scroll_depth
+    })
     return {"success": True}
 
 
@@ -187,3 +187,15 @@ def get_client_ip(request: Request) -> str:
     if forwarded:
         return forwarded.split(",")[0].strip()
     return request.client.host if request.client else "unknown"
+
+
+async def enqueue(kind: str, payload: dict) -> None:
+    """Encola un write; responde 503 si la cola sigue llena (backpressure)."""
+    try:
+        await get_ingestion_queue().put(kind, payload)
+    except QueueFullError:
+        raise HTTPException(
+            status_code=503,
+            detail="Tracking queue is full, retry later",
+            headers={"Retry-After": "1"}
+        )
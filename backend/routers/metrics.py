@@ -0,0 +1,28 @@
+"""
+Endpoint de metricas en formato Prometheus.
+"""
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+from backend.config import get_settings
+from backend.services.metrics import get_metrics, snapshot_dir
+
+router = APIRouter(prefix="/api", tags=["metrics"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_prometheus_metrics():
+    """
+    Latencia por ruta, statements y tiempo de DB, espera del pool y
+    contadores de la cola y los caches. Proteger en produccion.
+
+    Con varios workers incluye las metricas de todos, con label worker
+    (las de los otros workers, de su ultimo snapshot).
+    """
+    settings = get_settings()
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    if settings.web_concurrency > 1:
+        body = get_metrics().render_workers(snapshot_dir())
+    else:
+        body = get_metrics().render()
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
@@ -1,13 +1,13 @@
 """
 Endpoints para el waitlist signup.
 """
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel, EmailStr
 from typing import Optional
-from datetime import datetime
 from backend.database import get_db
-from backend import models
+from backend.services import signup_service
+from backend.services.response_cache import broadcast_invalidation, get_response_cache, cached_json_response
 
 router = APIRouter(prefix="/api/signups", tags=["signups"])
 
@@ -24,72 +24,50 @@ class SignupRequest(BaseModel):
 @router.post("/")
 async def create_signup(
     data: SignupRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    # Check duplicate email
-    existing = db.query(models.Signup).filter(
-        models.Signup.email == data.email
-    ).first()
-
-    if existing:
+    try:
+        result = await signup_service.create_signup(
+            db,
+            visitor_id=data.visitor_id,
+            email=data.email,
+            most_wanted_feature=data.most_wanted_feature,
+            marketing_consent=data.marketing_consent,
+            signup_source=data.signup_source,
+            time_to_signup_seconds=data.time_to_signup_seconds,
+        )
+    except signup_service.DuplicateEmailError:
         raise HTTPException(
             status_code=400,
             detail="This email is already on the waitlist!"
         )
-
-    # Get visitor
-    visitor = db.query(models.Visitor).filter(
-        models.Visitor.id == data.visitor_id
-    ).first()
-
-    if not visitor:
+    except signup_service.VisitorNotFoundError:
         raise HTTPException(status_code=404, detail="Visitor not found")
 
-    # Calculate stats
-    page_views_count = db.query(models.PageView).filter(
-        models.PageView.visitor_id == data.visitor_id
-    ).count()
-
-    events_count = db.query(models.Event).filter(
-        models.Event.visitor_id == data.visitor_id
-    ).count()
-
-    # Get current waitlist position
-    current_count = db.query(models.Signup).count()
-
-    # Create signup
-    signup = models.Signup(
-        visitor_id=data.visitor_id,
-        email=data.email,
-        most_wanted_feature=data.most_wanted_feature,
-        marketing_consent=data.marketing_consent,
-        signup_source=data.signup_source,
-        time_to_signup_seconds=data.time_to_signup_seconds,
-        page_views_before_signup=page_views_count,
-        events_before_signup=events_count,
-        waitlist_position=current_count + 1
-    )
-
-    db.add(signup)
-
-    # Update visitor as converted
-    visitor.converted = True
-    visitor.converted_at = datetime.utcnow()
-
-    db.commit()
-    db.refresh(signup)
+    # El count publico cambio (en todos los workers)
+    await broadcast_invalidation("signups")
 
     return {
         "success": True,
-        "position": signup.waitlist_position,
-        "spots_left": max(100 - signup.waitlist_position, 0),
+        "position": result.waitlist_position,
+        "spots_left": max(100 - result.waitlist_position, 0),
         "message": "You're in! Check your inbox for confirmation."
     }
 
 
 @router.get("/count")
-async def get_signup_count(db: Session = Depends(get_db)):
-    count = db.query(models.Signup).count()
+async def get_signup_count(request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Lo llama la landing en cada carga: cacheado con TTL + ETag, y se
+    invalida en cada signup.
+    """
+    cache = get_response_cache()
+    cached = await cache.get_or_compute("signups:count", lambda: count_signups(db))
+    return cached_json_response(request, cached, max_age=int(cache.ttl))
+
+
+async def count_signups(db: AsyncSession) -> dict:
+    count = await signup_service.get_signup_count(db)
     return {
         "count": count,
         "spots_left": max(100 - count, 0)
@@ -1,98 +1,509 @@
 """
 Endpoints para ver estadisticas (para ti, no publico).
 """
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.config import get_settings
 from backend.database import get_db
-from backend import models
+from backend.services import (
+    browse_service, export_service, funnel_service, retention_service, rollup_service, session_service, sketch_service, timeseries_service
+)
+from backend.services.ingestion_queue import get_ingestion_queue
+from backend.services.response_cache import get_response_cache, cached_json_response, make_etag
+from backend.services.slow_query_log import get_slow_query_log
+from backend.services.user_agent_cache import get_user_agent_cache
 
 router = APIRouter(prefix="/api/stats", tags=["stats"])
 
 
+# ============================================
+# SCHEMAS
+# ============================================
+
+
+class FunnelStepRequest(BaseModel):
+    """Un paso del funnel: todos los campos que vengan tienen que coincidir"""
+    event_type: Optional[str] = None
+    section: Optional[str] = None
+    # Igualdad por llave, e.g. {"depth": 75} o {"feature_name": "AI Research Agent"}
+    properties: Optional[Dict[str, Any]] = None
+
+    @model_validator(mode="after")
+    def check_not_empty(self):
+        if self.event_type is None and self.section is None and not self.properties:
+            raise ValueError("Each step needs event_type, section or properties")
+        return self
+
+
+class FunnelRequest(BaseModel):
+    """Pasos en orden + ventana de conversion desde el primer paso"""
+    model_config = ConfigDict(populate_by_name=True)
+
+    steps: List[FunnelStepRequest] = Field(
+        ..., min_length=funnel_service.MIN_STEPS, max_length=funnel_service.MAX_STEPS
+    )
+    window_seconds: int = Field(86400, gt=0, le=90 * 86400)
+    date_from: Optional[datetime] = Field(None, alias="from")
+    date_to: Optional[datetime] = Field(None, alias="to")
+
+
+# ============================================
+# ENDPOINTS
+# ============================================
+
+
 @router.get("/dashboard")
-async def get_dashboard_stats(db: Session = Depends(get_db)):
+async def get_dashboard_stats(
+    request: Request,
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    granularity: Literal["hour", "day", "week"] = "day",
+    approx: bool = False,
+    db: AsyncSession = Depends(get_db)
+):
     """
     Stats completos para tu dashboard.
     Proteger con auth en produccion.
+
+    Se lee de stats_rollups (agregados diarios que recalcula el job de
+    rollups), no de las tablas crudas: el costo depende del numero de
+    buckets, no del tamano de events.
+
+    Con `from`/`to` agrega "timeseries": visitors, page views, signups y
+    eventos por tipo en buckets de `granularity` (hour/day/week).
+    Si falta `to` es ahora; si falta `from` son los 7 dias antes de `to`.
+
+    Con `approx=true` los conteos de visitors unicos (total_visitors,
+    section_engagement, form_funnel) salen de unir los sketches HyperLogLog
+    diarios (error relativo ~1.6%, ver services/sketch_service.py): de los
+    dias de [from, to] si vienen, si no de toda la historia. Todo el resto
+    (page views, signups, promedios, breakdowns) sale de los rollups de esos
+    mismos dias, asi los numeros son comparables entre si. Sin `approx` el
+    resumen es siempre de toda la historia. "approximate" dice el rango y
+    el error.
+
+    La respuesta se cachea RESPONSE_CACHE_TTL segundos (con ETag) y se
+    invalida cada vez que el job de rollups recalcula.
     """
-    # Total visitors
-    total_visitors = db.query(models.Visitor).count()
+    cache = get_response_cache()
+    cached = await cache.get_or_compute(
+        f"dashboard:{date_from}:{date_to}:{granularity}:{approx}",
+        lambda: build_dashboard_stats(db, date_from, date_to, granularity, approx)
+    )
+    return cached_json_response(request, cached, max_age=int(cache.ttl), public=False)
+
+
+async def build_dashboard_stats(
+    db: AsyncSession,
+    date_from: Optional[datetime],
+    date_to: Optional[datetime],
+    granularity: str,
+    approx: bool = False
+) -> dict:
+    start = end = None
+    if date_from is not None or date_to is not None:
+        end = as_utc(date_to) if date_to else datetime.now(timezone.utc)
+        start = as_utc(date_from) if date_from else end - timedelta(days=7)
+        if start >= end:
+            raise HTTPException(status_code=400, detail="'from' must be before 'to'")
 
-    # Total page views
-    total_page_views = db.query(models.PageView).count()
+    # Con approx y rango, todo lo que sale de rollups es de los mismos dias
+    # completos que los sketches (que son diarios)
+    first_day = last_day = None
+    if approx and start is not None:
+        first_day, last_day = start.date(), end.date()
 
-    # Total signups
-    total_signups = db.query(models.Signup).count()
+    rollups = await rollup_service.load_rollups(db, first_day, last_day)
+
+    total_visitors = rollup_service.rollup_count(rollups, "visitors")
+    total_page_views = rollup_service.rollup_count(rollups, "page_views")
+    total_signups = rollup_service.rollup_count(rollups, "signups")
 
     # Conversion rate
     conversion_rate = (total_signups / total_visitors * 100) if total_visitors > 0 else 0
 
-    # Average time on page
-    avg_time = db.query(func.avg(models.PageView.time_on_page_seconds)).scalar() or 0
-
-    # Average scroll depth
-    avg_scroll = db.query(func.avg(models.PageView.max_scroll_depth)).scalar() or 0
-
-    # Feature votes
-    feature_votes = db.query(
-        models.Signup.most_wanted_feature,
-        func.count(models.Signup.id)
-    ).group_by(models.Signup.most_wanted_feature).all()
-
-    # Device breakdown
-    device_breakdown = db.query(
-        models.Visitor.device_type,
-        func.count(models.Visitor.id)
-    ).group_by(models.Visitor.device_type).all()
-
-    # Referrer breakdown
-    referrer_breakdown = db.query(
-        models.Visitor.original_referrer,
-        func.count(models.Visitor.id)
-    ).group_by(models.Visitor.original_referrer).limit(10).all()
-
-    # Events breakdown
-    events_breakdown = db.query(
-        models.Event.event_type,
-        func.count(models.Event.id)
-    ).group_by(models.Event.event_type).all()
-
-    # Section engagement (cuantos vieron cada seccion)
-    section_views = db.query(
-        models.Event.section,
-        func.count(func.distinct(models.Event.visitor_id))
-    ).filter(
-        models.Event.event_type == "section_view"
-    ).group_by(models.Event.section).all()
-
-    # Form funnel
-    form_started = db.query(func.count(func.distinct(models.Event.visitor_id))).filter(
-        models.Event.event_type == "form_focus"
-    ).scalar() or 0
-
-    form_email_filled = db.query(func.count(func.distinct(models.Event.visitor_id))).filter(
-        models.Event.event_type == "form_field_blur"
-    ).scalar() or 0
-
-    return {
+    stats = {
         "overview": {
             "total_visitors": total_visitors,
             "total_page_views": total_page_views,
             "total_signups": total_signups,
             "conversion_rate": round(conversion_rate, 2),
-            "avg_time_on_page_seconds": round(float(avg_time), 1),
-            "avg_scroll_depth": round(float(avg_scroll), 1)
+            "avg_time_on_page_seconds": round(rollup_service.rollup_average(rollups, "time_on_page"), 1),
+            "avg_scroll_depth": round(rollup_service.rollup_average(rollups, "scroll_depth"), 1)
         },
-        "feature_votes": {f[0]: f[1] for f in feature_votes if f[0]},
-        "device_breakdown": {d[0] or "unknown": d[1] for d in device_breakdown},
-        "referrer_breakdown": {r[0] or "direct": r[1] for r in referrer_breakdown},
-        "events_breakdown": {e[0]: e[1] for e in events_breakdown if e[0]},
-        "section_engagement": {s[0] or "unknown": s[1] for s in section_views},
+        "feature_votes": rollup_service.rollup_breakdown(rollups, "feature_votes"),
+        "device_breakdown": rollup_service.rollup_breakdown(rollups, "devices"),
+        "referrer_breakdown": rollup_service.rollup_breakdown(rollups, "referrers", limit=10),
+        "events_breakdown": rollup_service.rollup_breakdown(rollups, "events"),
+        "section_engagement": rollup_service.rollup_breakdown(rollups, "section_visitors"),
         "form_funnel": {
             "visitors": total_visitors,
-            "reached_form": form_started,
-            "filled_email": form_email_filled,
+            "reached_form": rollup_service.rollup_count(rollups, "form_visitors", "form_focus"),
+            "filled_email": rollup_service.rollup_count(rollups, "form_visitors", "form_field_blur"),
+            "completed_signup": total_signups
+        }
+    }
+
+    if start is not None:
+        try:
+            stats["timeseries"] = await timeseries_service.get_timeseries(db, start, end, granularity)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+
+    if approx:
+        uniques = await sketch_service.dashboard_uniques(db, first_day, last_day)
+        visitors = uniques["visitors"]
+        stats["overview"]["total_visitors"] = visitors
+        stats["overview"]["conversion_rate"] = round(total_signups / visitors * 100, 2) if visitors else 0
+        stats["section_engagement"] = uniques["section_engagement"]
+        stats["form_funnel"] = {
+            "visitors": visitors,
+            "reached_form": uniques["reached_form"],
+            "filled_email": uniques["filled_email"],
             "completed_signup": total_signups
         }
+        stats["approximate"] = {
+            "from": first_day.isoformat() if first_day else None,
+            "to": last_day.isoformat() if last_day else None,
+            "relative_error": round(sketch_service.RELATIVE_ERROR, 4)
+        }
+
+    return stats
+
+
+@router.get("/uniques")
+async def get_unique_visitors(
+    request: Request,
+    event_type: str = sketch_service.PAGE_VIEW,
+    section: Optional[str] = None,
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    approx: bool = True,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Visitors unicos que hicieron `event_type` (default "page_view": que
+    visitaron) en `section` (si viene; "" = sin seccion) entre from y to.
+    Los page views no tienen seccion: page_view con `section` es 400.
+    Sin from/to es toda la historia.
+
+    Con `approx=true` (default) se unen los sketches HyperLogLog diarios:
+    no lee events, el rango se redondea a dias completos UTC y el error
+    relativo es ~1.6%. Los visitors de los ultimos SKETCH_FLUSH_INTERVAL
+    segundos todavia no estan. Con `approx=false` es COUNT(DISTINCT) exacto
+    sobre events/page_views.
+    """
+    if event_type == sketch_service.PAGE_VIEW and section is not None:
+        raise HTTPException(
+            status_code=400,
+            detail="Page views have no section: drop 'section' or pass an event_type"
+        )
+    start = as_utc(date_from) if date_from else None
+    end = as_utc(date_to) if date_to else None
+    if start is not None and end is not None and start >= end:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+
+    async def compute() -> dict:
+        report = {"event_type": event_type, "section": section, "approximate": approx}
+        if approx:
+            merged = await sketch_service.load_sketches(
+                db, [event_type], start.date() if start else None, end.date() if end else None, section
+            )
+            report["from"] = start.date().isoformat() if start else None
+            report["to"] = end.date().isoformat() if end else None
+            report["visitors"] = sketch_service.count_unique(merged, event_type)
+            report["relative_error"] = round(sketch_service.RELATIVE_ERROR, 4)
+        else:
+            report["from"] = start.isoformat() if start else None
+            report["to"] = end.isoformat() if end else None
+            report["visitors"] = await sketch_service.exact_unique(db, event_type, start, end, section)
+        return report
+
+    cache = get_response_cache()
+    cached = await cache.get_or_compute(
+        f"uniques:{event_type}:{section}:{date_from}:{date_to}:{approx}", compute
+    )
+    return cached_json_response(request, cached, max_age=int(cache.ttl), public=False)
+
+
+@router.get("/sessions")
+async def get_session_stats(
+    request: Request,
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    granularity: Literal["hour", "day", "week"] = "day",
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Reporte por sesion: sesiones, visitors, duracion y profundidad promedio,
+    bounce rate, conversion por sesion, secciones de entrada/salida y serie
+    por bucket, para las sesiones que empezaron en [from, to).
+
+    Se lee solo de la tabla sessions, que el job de sesiones mantiene
+    incrementalmente (cada SESSIONIZE_INTERVAL segundos, nueva sesion tras
+    SESSION_GAP_MINUTES de inactividad). "sessionized_until" dice hasta
+    donde llego: lo mas reciente todavia no esta incluido.
+    Mismos defaults de from/to que /dashboard.
+    """
+    end = as_utc(date_to) if date_to else datetime.now(timezone.utc)
+    start = as_utc(date_from) if date_from else end - timedelta(days=7)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+    buckets = len(timeseries_service.bucket_starts(start, end, granularity))
+    if buckets > timeseries_service.MAX_BUCKETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Window has {buckets} {granularity} buckets (max {timeseries_service.MAX_BUCKETS})"
+        )
+
+    cache = get_response_cache()
+    cached = await cache.get_or_compute(
+        f"sessions:{date_from}:{date_to}:{granularity}",
+        lambda: session_service.get_session_report(db, start, end, granularity)
+    )
+    return cached_json_response(request, cached, max_age=int(cache.ttl), public=False)
+
+
+@router.post("/funnel")
+async def get_funnel(funnel: FunnelRequest, db: AsyncSession = Depends(get_db)):
+    """
+    Funnel con pasos arbitrarios y en orden, por visitor.
+
+    Un visitor llega al paso N si hizo los pasos 1..N en ese orden y el
+    paso N cayo dentro de `window_seconds` desde el paso 1. El paso 1 tiene
+    que estar en [from, to) (default: los 30 dias antes de ahora).
+
+    Ejemplo:
+        {"steps": [{"event_type": "section_view", "section": "hero"},
+                   {"event_type": "form_focus"},
+                   {"event_type": "form_submit_success"}],
+         "window_seconds": 3600}
+
+    Se calcula sobre events crudos en una sola pasada (ver
+    services/funnel_service.py) y se cachea RESPONSE_CACHE_TTL segundos.
+    """
+    end = as_utc(funnel.date_to) if funnel.date_to else datetime.now(timezone.utc)
+    start = as_utc(funnel.date_from) if funnel.date_from else end - timedelta(days=30)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+
+    steps = [step.model_dump() for step in funnel.steps]
+    cached = await get_response_cache().get_or_compute(
+        "funnel:" + make_etag([steps, funnel.window_seconds, funnel.date_from, funnel.date_to]),
+        lambda: funnel_service.compute_funnel(
+            db, steps, start, end, timedelta(seconds=funnel.window_seconds)
+        )
+    )
+    return cached.value
+
+
+@router.get("/retention")
+async def get_retention(
+    request: Request,
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    period: Literal["day", "week"] = "week",
+    breakdown: Literal["none", "utm_source", "referrer"] = "none",
+    periods: int = Query(12, ge=1, le=retention_service.MAX_PERIODS),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Retencion por cohorte: visitors agrupados por la semana (o dia) de
+    first_seen en [from, to) x periodos desde su primera visita, opcionalmente
+    por utm_source o referrer original (los 10 mas grandes + "other").
+
+    Se calcula de visitor_activity_days (una fila por visitor y dia con
+    actividad, escrita al ingerir), no de events.
+    Si falta `to` es ahora; si falta `from` son `periods` periodos antes.
+    """
+    end = as_utc(date_to) if date_to else datetime.now(timezone.utc)
+    start = as_utc(date_from) if date_from else end - periods * timedelta(
+        days=retention_service.PERIOD_DAYS[period]
+    )
+    if start >= end:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+
+    cache = get_response_cache()
+    cached = await cache.get_or_compute(
+        f"retention:{date_from}:{date_to}:{period}:{breakdown}:{periods}",
+        lambda: retention_service.get_retention(db, start, end, period, breakdown, periods)
+    )
+    return cached_json_response(request, cached, max_age=int(cache.ttl), public=False)
+
+
+@router.get("/visitors")
+async def list_visitors(
+    visitor_id: Optional[int] = None,
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=browse_service.MAX_LIMIT),
+    order: Literal["desc", "asc"] = "desc",
+    compact: bool = False,
+    db: AsyncSession = Depends(get_db)
+):
+    """Visitors por first_seen en [from, to). Paginacion igual que /events."""
+    return await browse(db, "visitors", {"id": visitor_id}, date_from, date_to, cursor, limit, order, compact)
+
+
+@router.get("/page-views")
+async def list_page_views(
+    visitor_id: Optional[int] = None,
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=browse_service.MAX_LIMIT),
+    order: Literal["desc", "asc"] = "desc",
+    compact: bool = False,
+    db: AsyncSession = Depends(get_db)
+):
+    """Page views por created_at en [from, to). Paginacion igual que /events."""
+    return await browse(db, "page_views", {"visitor_id": visitor_id}, date_from, date_to, cursor, limit, order, compact)
+
+
+@router.get("/events")
+async def list_events(
+    visitor_id: Optional[int] = None,
+    event_type: Optional[str] = None,
+    section: Optional[str] = None,
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=browse_service.MAX_LIMIT),
+    order: Literal["desc", "asc"] = "desc",
+    compact: bool = False,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Debug: eventos crudos por created_at en [from, to), filtrados por
+    visitor, tipo y/o seccion. E.g. el recorrido de un visitor:
+    `/api/stats/events?visitor_id=123&order=asc`.
+
+    Paginacion keyset: pasar el `next_cursor` de la respuesta como `cursor`
+    (null = ultima pagina). Sin OFFSET, cualquier pagina cuesta lo mismo que
+    la primera. `compact=true` solo devuelve id, created_at, visitor_id,
+    event_type y section, que salen directo del indice.
+    """
+    filters = {"visitor_id": visitor_id, "event_type": event_type, "section": section}
+    return await browse(db, "events", filters, date_from, date_to, cursor, limit, order, compact)
+
+
+async def browse(
+    db: AsyncSession,
+    table: str,
+    filters: Dict[str, Any],
+    date_from: Optional[datetime],
+    date_to: Optional[datetime],
+    cursor: Optional[str],
+    limit: int,
+    order: str,
+    compact: bool
+) -> dict:
+    try:
+        return await browse_service.browse(
+            db,
+            table,
+            filters,
+            start=as_utc(date_from) if date_from else None,
+            end=as_utc(date_to) if date_to else None,
+            cursor=cursor,
+            limit=limit,
+            ascending=order == "asc",
+            compact=compact,
+        )
+    except browse_service.InvalidCursor as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+@router.get("/export/{table}")
+async def export_table(
+    table: str,
+    format: Literal["csv", "ndjson"] = "csv",
+    columns: Optional[str] = None,
+    since: Optional[datetime] = None,
+    after_id: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+    include_private: bool = False
+):
+    """
+    Descarga cruda de events, page_views, signups o visitors en CSV o NDJSON,
+    ordenada por id y en streaming: la memoria no crece con la tabla.
+
+    - `columns`: lista separada por comas (default todas)
+    - `since`: solo filas con created_at (first_seen en visitors) >= since
+    - `after_id`: continuar despues del ultimo id recibido
+    - `include_private`: incluir emails e IPs (solo con EXPORT_PRIVATE_COLUMNS=true)
+
+    Para analisis pesados usar scripts/export_parquet.py.
+    """
+    if include_private and not get_settings().export_private_columns:
+        raise HTTPException(status_code=403, detail="Private columns are disabled (EXPORT_PRIVATE_COLUMNS)")
+    try:
+        export_table = export_service.get_export_table(table)
+    except ValueError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+    names = [name.strip() for name in columns.split(",") if name.strip()] if columns else None
+    try:
+        # Validar antes de empezar: un error a mitad del stream ya no puede ser un 400
+        export_table.columns(include_private, names)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    return StreamingResponse(
+        export_service.stream_rows(
+            table,
+            format,
+            columns=names,
+            since=as_utc(since) if since else None,
+            after_id=after_id,
+            limit=limit,
+            include_private=include_private,
+        ),
+        media_type=export_service.STREAM_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{table}.{format}"'},
+    )
+
+
+@router.get("/ingestion")
+async def get_ingestion_stats():
+    """Profundidad de la cola de ingestion y latencia de los flushes."""
+    return get_ingestion_queue().stats()
+
+
+@router.get("/cache")
+async def get_response_cache_stats():
+    """Hits, misses y requests coalesced del cache de respuestas."""
+    return get_response_cache().stats()
+
+
+@router.get("/ua-cache")
+async def get_user_agent_cache_stats():
+    """Hits, misses y evictions del cache de User-Agents parseados."""
+    return get_user_agent_cache().stats()
+
+
+@router.get("/slow-queries")
+async def get_slow_queries(limit: int = Query(20, ge=1, le=500)):
+    """
+    Debug: queries mas lentas que SLOW_QUERY_MS agrupadas por forma, de la
+    peor a la mejor, con su EXPLAIN si es un SELECT (ANALYZE solo si no llama
+    funciones con efectos).
+    """
+    slow_query_log = get_slow_query_log()
+    if not slow_query_log.enabled:
+        raise HTTPException(status_code=404, detail="Slow-query log is disabled (set SLOW_QUERY_MS)")
+    return {
+        "threshold_ms": slow_query_log.threshold_ms,
+        "queries": slow_query_log.worst(limit),
     }
+
+
+def as_utc(moment: datetime) -> datetime:
+    """Fechas sin timezone se interpretan como UTC."""
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment
@@ -1,134 +1,159 @@
-from sqlalchemy.orm import Session
-from typing import Optional, Dict, Any
-from backend.models import PageView, Event, Visitor
-
-
-def create_page_view(
-    db: Session,
-    visitor_id: int,
-    referrer: Optional[str] = None,
-    utm_source: Optional[str] = None,
-    utm_medium: Optional[str] = None,
-    utm_campaign: Optional[str] = None,
-    utm_content: Optional[str] = None,
-    screen_width: Optional[int] = None,
-    screen_height: Optional[int] = None,
-    viewport_width: Optional[int] = None,
-    viewport_height: Optional[int] = None,
-) -> PageView:
-    """Create a new page view record."""
-    page_view = PageView(
-        visitor_id=visitor_id,
-        referrer=referrer,
-        utm_source=utm_source,
-        utm_medium=utm_medium,
-        utm_campaign=utm_campaign,
-        utm_content=utm_content,
-        screen_width=screen_width,
-        screen_height=screen_height,
-        viewport_width=viewport_width,
-        viewport_height=viewport_height,
+from collections import Counter
+from sqlalchemy import Boolean, Integer, bindparam, column, func, insert, or_, select, update, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, Any, List
+from backend.models import PageView, Event, Visitor, VisitorActivityDay
+from backend.services.rollup_service import utc_day
+from backend.services.sketch_service import get_sketch_buffer
+
+
+async def write_batch(
+    db: AsyncSession,
+    events: List[Dict[str, Any]],
+    page_view_updates: List[Dict[str, Any]],
+    beacons: List[Dict[str, Any]],
+) -> int:
+    """
+    Persist a batch drained from the ingestion queue in one transaction.
+
+    Events carry their own visitor_id/page_view_id and are written with a
+    single multi-row INSERT; visitor totals get one aggregated update per
+    visitor, and each visitor's activity day one row. Page view updates
+    and beacons (already coalesced per page view) share one bulk UPDATE;
+    beacons also add their final time on page to the visitor. Once
+    committed, the events' visitors go to the unique-visitor sketch buffer.
+
+    Events of visitors that do not exist are dropped up front instead of
+    failing the batch on the foreign key; returns how many were dropped.
+    """
+    known = await _known_visitor_events(db, events)
+    dropped = len(events) - len(known)
+    events = known
+
+    if events:
+        await db.execute(insert(Event), events)
+        counts = Counter(event["visitor_id"] for event in events)
+        await _increment_total_events(db, counts)
+        await _record_activity_days(db, counts)
+
+    if page_view_updates or beacons:
+        await update_page_views(db, [*page_view_updates, *beacons])
+
+    if beacons:
+        await _add_visitor_time(db, beacons)
+
+    await db.commit()
+
+    if events:
+        get_sketch_buffer().add_events(events)
+    return dropped
+
+
+async def _known_visitor_events(db: AsyncSession, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    The events whose visitor exists. The visitors are locked FOR KEY SHARE
+    (what the foreign key check takes anyway) until the batch commits.
+    """
+    visitor_ids = {event["visitor_id"] for event in events}
+    if not visitor_ids:
+        return events
+    known = set(
+        await db.scalars(
+            select(Visitor.id).where(Visitor.id.in_(visitor_ids)).with_for_update(key_share=True)
+        )
     )
-
-    db.add(page_view)
-    db.commit()
-    db.refresh(page_view)
-
-    return page_view
-
-
-def create_event(
-    db: Session,
-    visitor_id: int,
-    event_type: str,
-    page_view_id: Optional[int] = None,
-    event_category: Optional[str] = None,
-    element_id: Optional[str] = None,
-    element_class: Optional[str] = None,
-    element_text: Optional[str] = None,
-    section: Optional[str] = None,
-    properties: Optional[Dict[str, Any]] = None,
-    scroll_position: Optional[int] = None,
-    time_since_page_load: Optional[int] = None,
-) -> Event:
-    """Create a new event record."""
-    event = Event(
-        visitor_id=visitor_id,
-        page_view_id=page_view_id,
-        event_type=event_type,
-        event_category=event_category,
-        element_id=element_id,
-        element_class=element_class,
-        element_text=element_text,
-        section=section,
-        properties=properties,
-        scroll_position=scroll_position,
-        time_since_page_load=time_since_page_load,
+    return [event for event in events if event["visitor_id"] in known]
+
+
+async def _increment_total_events(db: AsyncSession, counts: Dict[int, int]) -> None:
+    """Add per-visitor event counts to Visitor.total_events (one executemany)."""
+    visitors = Visitor.__table__
+    await db.execute(
+        update(visitors)
+        .where(visitors.c.id == bindparam("b_visitor_id"))
+        .values(total_events=visitors.c.total_events + bindparam("b_count")),
+        [
+            {"b_visitor_id": visitor_id, "b_count": count}
+            for visitor_id, count in counts.items()
+        ],
     )
 
-    db.add(event)
-
-    # Update visitor's total events count
-    visitor = db.query(Visitor).filter(Visitor.id == visitor_id).first()
-    if visitor:
-        visitor.total_events += 1
-
-    db.commit()
-    db.refresh(event)
-
-    return event
-
-
-def update_page_view(
-    db: Session,
-    page_view_id: int,
-    time_on_page_seconds: Optional[int] = None,
-    max_scroll_depth: Optional[int] = None,
-    reached_form: Optional[bool] = None,
-) -> Optional[PageView]:
-    """Update page view metrics."""
-    page_view = db.query(PageView).filter(PageView.id == page_view_id).first()
-
-    if not page_view:
-        return None
-
-    if time_on_page_seconds is not None:
-        page_view.time_on_page_seconds = time_on_page_seconds
-
-    if max_scroll_depth is not None:
-        # Only update if new depth is greater
-        if page_view.max_scroll_depth is None or max_scroll_depth > page_view.max_scroll_depth:
-            page_view.max_scroll_depth = max_scroll_depth
 
-    if reached_form is not None:
-        page_view.reached_form = reached_form
-
-    db.commit()
-    db.refresh(page_view)
-
-    return page_view
-
-
-def finalize_page_view(
-    db: Session,
-    page_view_id: int,
-    time_on_page_seconds: int,
-    max_scroll_depth: int,
-) -> Optional[PageView]:
-    """Finalize page view when user leaves (beacon)."""
-    page_view = db.query(PageView).filter(PageView.id == page_view_id).first()
+async def _record_activity_days(db: AsyncSession, visitor_ids) -> None:
+    """Mark today (UTC) as an activity day of each visitor (retention)."""
+    await db.execute(
+        pg_insert(VisitorActivityDay)
+        .values([{"visitor_id": visitor_id, "day": utc_day(func.now())} for visitor_id in visitor_ids])
+        .on_conflict_do_nothing()
+    )
 
-    if not page_view:
-        return None
 
-    page_view.time_on_page_seconds = time_on_page_seconds
-    page_view.max_scroll_depth = max_scroll_depth
+async def update_page_views(db: AsyncSession, updates: List[Dict[str, Any]]) -> None:
+    """
+    Apply coalesced page view metrics with one UPDATE ... FROM (VALUES ...).
+
+    Each update carries page_view_id plus optional time_on_page_seconds and
+    max_scroll_depth (each kept if greater, so updates flushed out of order,
+    e.g. by different workers, never move them back) and reached_form (only
+    ever turns the flag on). None leaves a column as is.
+    """
+    if not updates:
+        return
+
+    page_views = PageView.__table__
+    metrics = values(
+        column("page_view_id", Integer),
+        column("time_on_page_seconds", Integer),
+        column("max_scroll_depth", Integer),
+        column("reached_form", Boolean),
+        name="metrics",
+    ).data([
+        (
+            page_view_update["page_view_id"],
+            page_view_update.get("time_on_page_seconds"),
+            page_view_update.get("max_scroll_depth"),
+            page_view_update.get("reached_form"),
+        )
+        for page_view_update in updates
+    ])
+
+    await db.execute(
+        update(page_views)
+        .where(page_views.c.id == metrics.c.page_view_id)
+        .values(
+            # GREATEST ignores NULLs
+            time_on_page_seconds=func.greatest(
+                page_views.c.time_on_page_seconds, metrics.c.time_on_page_seconds
+            ),
+            max_scroll_depth=func.greatest(page_views.c.max_scroll_depth, metrics.c.max_scroll_depth),
+            reached_form=or_(
+                func.coalesce(page_views.c.reached_form, False),
+                func.coalesce(metrics.c.reached_form, False),
+            ),
+        )
+    )
 
-    # Update visitor's total time
-    visitor = db.query(Visitor).filter(Visitor.id == page_view.visitor_id).first()
-    if visitor:
-        visitor.total_time_seconds += time_on_page_seconds
 
-    db.commit()
+async def _add_visitor_time(db: AsyncSession, beacons: List[Dict[str, Any]]) -> None:
+    """Add the final time on page of each beaconed page view to its visitor."""
+    page_views = PageView.__table__
+    visitors = Visitor.__table__
+    final = values(
+        column("page_view_id", Integer),
+        column("seconds", Integer),
+        name="final",
+    ).data([(beacon["page_view_id"], beacon["time_on_page_seconds"]) for beacon in beacons])
+
+    per_visitor = (
+        select(page_views.c.visitor_id, func.sum(final.c.seconds).label("seconds"))
+        .select_from(final.join(page_views, page_views.c.id == final.c.page_view_id))
+        .group_by(page_views.c.visitor_id)
+        .subquery("per_visitor")
+    )
 
-    return page_view
+    await db.execute(
+        update(visitors)
+        .where(visitors.c.id == per_visitor.c.visitor_id)
+        .values(total_time_seconds=visitors.c.total_time_seconds + per_visitor.c.seconds)
+    )
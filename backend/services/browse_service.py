@@ -0,0 +1,134 @@
+"""
+Keyset-paginated lists of raw visitors, page views and events.
+
+Pages are ordered by (created_at, id), or (first_seen, id) for visitors,
+newest first by default. The next page starts strictly after the last row
+of the previous one: WHERE (created_at, id) < (:created_at, :id) ORDER BY
+created_at DESC, id DESC LIMIT n. Every page is therefore one short index
+range scan, however deep, unlike OFFSET, which reads and throws away every
+earlier row. The position travels as an opaque cursor.
+
+The compact projection returns only the columns stored in the keyset
+indexes (see migration 0009), so those pages are index-only scans. The
+full projection leaves out the personal-data columns, like the export
+(export_service.EXPORT_TABLES).
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.models import Event, PageView, Visitor
+from backend.services.export_service import EXPORT_TABLES
+
+MAX_LIMIT = 1000
+
+
+class BrowseTable(NamedTuple):
+    model: Any
+    time_column: str
+    # Columns of the compact projection (all in the keyset index)
+    compact: Tuple[str, ...]
+    # Equality filters that may be applied
+    filters: Tuple[str, ...]
+
+
+BROWSE_TABLES: Dict[str, BrowseTable] = {
+    "events": BrowseTable(
+        Event, "created_at",
+        compact=("id", "created_at", "visitor_id", "event_type", "section"),
+        filters=("visitor_id", "event_type", "section"),
+    ),
+    "page_views": BrowseTable(
+        PageView, "created_at",
+        compact=("id", "created_at", "visitor_id"),
+        filters=("visitor_id",),
+    ),
+    "visitors": BrowseTable(
+        Visitor, "first_seen",
+        compact=("id", "first_seen"),
+        filters=("id",),
+    ),
+}
+
+
+class InvalidCursor(ValueError):
+    """The cursor was not produced by this API."""
+
+
+def encode_cursor(moment: datetime, row_id: int) -> str:
+    payload = json.dumps([moment.isoformat(), row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor; anything it could not have produced is rejected."""
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        moment, row_id = json.loads(payload)
+        moment = datetime.fromisoformat(moment)
+    except (ValueError, TypeError) as exc:
+        raise InvalidCursor("Invalid cursor") from exc
+    # Keyset columns are timestamptz and integer ids (bool is an int subclass)
+    if moment.tzinfo is None or type(row_id) is not int:
+        raise InvalidCursor("Invalid cursor")
+    return moment, row_id
+
+
+async def browse(
+    db: AsyncSession,
+    name: str,
+    filters: Dict[str, Any],
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    ascending: bool = False,
+    compact: bool = False,
+) -> Dict[str, Any]:
+    """
+    One page of a table: rows matching filters (None values ignored) with
+    time in [start, end), after cursor. next_cursor is None on the last page.
+    """
+    table = BROWSE_TABLES[name]
+    columns = table.model.__table__.c
+    time_column = columns[table.time_column]
+    keyset = tuple_(time_column, columns.id)
+
+    if compact:
+        selected = [columns[column] for column in table.compact]
+    else:
+        selected = EXPORT_TABLES[name].columns(include_private=False)
+    stmt = select(*selected)
+    for column, value in filters.items():
+        if column not in table.filters:
+            raise ValueError(f"Cannot filter {name} by {column}")
+        if value is not None:
+            stmt = stmt.where(columns[column] == value)
+    if start is not None:
+        stmt = stmt.where(time_column >= start)
+    if end is not None:
+        stmt = stmt.where(time_column < end)
+    if cursor is not None:
+        position = tuple_(*decode_cursor(cursor))
+        stmt = stmt.where(keyset > position if ascending else keyset < position)
+
+    if ascending:
+        stmt = stmt.order_by(time_column, columns.id)
+    else:
+        stmt = stmt.order_by(time_column.desc(), columns.id.desc())
+    # One extra row tells whether there is a next page
+    rows: List[Dict[str, Any]] = [
+        dict(row._mapping) for row in (await db.execute(stmt.limit(limit + 1))).all()
+    ]
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last[table.time_column], last["id"])
+
+    return {"items": rows, "next_cursor": next_cursor, "limit": limit}
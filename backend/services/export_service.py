@@ -0,0 +1,355 @@
+"""
+Columnar export of the tracking tables for offline analysis.
+
+EXPORT_TABLES is the registry of exportable tables. For each table it
+records the model, the time column used for date partitions and "since"
+filters, whether rows are only appended, and which columns hold personal
+data and are left out unless asked for.
+
+export_parquet streams each table through a server-side cursor, batch_size
+rows at a time, into Hive-style partitions (<table>/date=YYYY-MM-DD/*.parquet).
+The files can be read directly with pyarrow.dataset, DuckDB or Polars.
+Append-only tables are exported incrementally. manifest.json keeps the last
+exported id of each table, and a run exports the ids after it up to the
+newest row older than settle. Rows still being updated (beacons, session
+tagging) are therefore left for the next run. Visitors change after insert
+(last_seen, totals), so every run replaces them with a full snapshot.
+
+pyarrow is optional: only this export needs it.
+
+stream_rows serves the same tables over HTTP as CSV or NDJSON. It reads
+keyset pages on id (WHERE id > last ORDER BY id LIMIT page), each streamed
+with yield_per, so memory stays at one page whatever the table size.
+"""
+import csv
+import io
+import json
+import os
+import shutil
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, List, NamedTuple, Optional, Sequence, Tuple, Type
+
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer, JSON, func, select
+from sqlalchemy.engine import Connection
+
+from backend.database import get_async_session_local
+from backend.models import Event, PageView, Signup, Visitor
+
+MANIFEST = "manifest.json"
+
+# Rows per keyset page of the HTTP export, and per fetch within a page
+STREAM_PAGE_SIZE = 5000
+STREAM_FETCH_SIZE = 1000
+
+# format -> media type
+STREAM_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+class ExportTable(NamedTuple):
+    model: Type
+    time_column: str
+    append_only: bool
+    private: Tuple[str, ...] = ()
+
+    def columns(self, include_private: bool = False, names: Optional[Sequence[str]] = None) -> List[Any]:
+        """Table columns to export, in table order (names filters and validates)."""
+        table = self.model.__table__
+        available = [
+            column for column in table.columns
+            if include_private or column.name not in self.private
+        ]
+        if names is None:
+            return available
+        by_name = {column.name: column for column in available}
+        unknown = [name for name in names if name not in by_name]
+        if unknown:
+            raise ValueError(f"Unknown or private columns: {', '.join(unknown)}")
+        return [column for column in available if column.name in names]
+
+    @property
+    def time(self):
+        return self.model.__table__.c[self.time_column]
+
+    @property
+    def id(self):
+        return self.model.__table__.c.id
+
+
+EXPORT_TABLES: Dict[str, ExportTable] = {
+    "events": ExportTable(Event, "created_at", append_only=True),
+    "page_views": ExportTable(PageView, "created_at", append_only=True),
+    "signups": ExportTable(Signup, "created_at", append_only=True, private=("email",)),
+    "visitors": ExportTable(Visitor, "first_seen", append_only=False, private=("ip_address",)),
+}
+
+
+def get_export_table(name: str) -> ExportTable:
+    if name not in EXPORT_TABLES:
+        raise ValueError(f"Unknown table '{name}' (one of: {', '.join(EXPORT_TABLES)})")
+    return EXPORT_TABLES[name]
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow")
+    return pyarrow
+
+
+def _arrow_type(pa, column):
+    if isinstance(column.type, Integer):
+        return pa.int64()
+    if isinstance(column.type, Boolean):
+        return pa.bool_()
+    if isinstance(column.type, Float):
+        return pa.float64()
+    if isinstance(column.type, DateTime):
+        return pa.timestamp("us", tz="UTC")
+    if isinstance(column.type, Date):
+        return pa.date32()
+    # Strings and JSON (serialized)
+    return pa.string()
+
+
+def _arrow_batch(pa, columns, rows) -> Any:
+    values = list(zip(*rows))
+    arrays = []
+    for column, column_values in zip(columns, values):
+        if isinstance(column.type, JSON):
+            column_values = [None if value is None else json.dumps(value) for value in column_values]
+        arrays.append(pa.array(column_values, type=_arrow_type(pa, column)))
+    return pa.Table.from_arrays(arrays, names=[column.name for column in columns])
+
+
+def load_manifest(out_dir: str) -> Dict[str, Any]:
+    path = os.path.join(out_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {"tables": {}}
+    with open(path) as manifest_file:
+        return json.load(manifest_file)
+
+
+def save_manifest(out_dir: str, manifest: Dict[str, Any]) -> None:
+    """Write-then-rename: a crash never leaves a half-written manifest."""
+    path = os.path.join(out_dir, MANIFEST)
+    with open(path + ".tmp", "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def _remove_orphans(table_dir: str, files: List[str]) -> None:
+    """Drop files of an interrupted run (written but never recorded in the manifest)."""
+    known = set(files)
+    for root, _, names in os.walk(table_dir):
+        for name in names:
+            path = os.path.relpath(os.path.join(root, name), table_dir)
+            if path not in known:
+                os.remove(os.path.join(root, name))
+
+
+def _write_partitions(
+    conn: Connection,
+    stmt,
+    columns,
+    time_index: int,
+    table_dir: str,
+    file_name: str,
+    batch_size: int,
+) -> Tuple[int, List[str]]:
+    """
+    Stream stmt into one Parquet file per UTC day of the time column.
+    Memory stays at one batch plus one open writer per day touched.
+    """
+    pa = _pyarrow()
+    schema = pa.schema([(column.name, _arrow_type(pa, column)) for column in columns])
+    writers: Dict[date, Any] = {}
+    files = []
+    rows_written = 0
+    try:
+        result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(stmt)
+        for batch in result.partitions():
+            per_day: Dict[date, list] = {}
+            for row in batch:
+                moment = row[time_index]
+                day = moment.astimezone(timezone.utc).date() if moment is not None else None
+                per_day.setdefault(day, []).append(row)
+            for day, rows in per_day.items():
+                if day not in writers:
+                    partition = f"date={day.isoformat() if day else 'unknown'}"
+                    os.makedirs(os.path.join(table_dir, partition), exist_ok=True)
+                    path = os.path.join(partition, file_name)
+                    writers[day] = pa.parquet.ParquetWriter(
+                        os.path.join(table_dir, path), schema, compression="zstd"
+                    )
+                    files.append(path)
+                writers[day].write_table(_arrow_batch(pa, columns, rows))
+                rows_written += len(rows)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return rows_written, files
+
+
+def export_table(
+    conn: Connection,
+    name: str,
+    out_dir: str,
+    manifest: Dict[str, Any],
+    batch_size: int = 50000,
+    settle: timedelta = timedelta(hours=1),
+    include_private: bool = False,
+) -> int:
+    """
+    Export one table into out_dir/<name> and record it in manifest (the
+    caller saves it). Returns the rows written.
+    """
+    table = get_export_table(name)
+    columns = table.columns(include_private)
+    time_index = [column.name for column in columns].index(table.time_column)
+    table_dir = os.path.join(out_dir, name)
+    state = manifest["tables"].setdefault(name, {"last_id": 0, "files": []})
+
+    if table.append_only:
+        if os.path.isdir(table_dir):
+            _remove_orphans(table_dir, state["files"])
+        cutoff = datetime.now(timezone.utc) - settle
+        upper = conn.scalar(
+            select(func.max(table.id)).where(table.id > state["last_id"], table.time < cutoff)
+        )
+        if upper is None:
+            return 0
+        stmt = (
+            select(*columns)
+            .where(table.id > state["last_id"], table.id <= upper)
+            .order_by(table.id)
+        )
+        rows, files = _write_partitions(
+            conn, stmt, columns, time_index, table_dir, f"part-{state['last_id'] + 1}-{upper}.parquet", batch_size
+        )
+        state["last_id"] = upper
+        state["files"].extend(files)
+    else:
+        # Full snapshot into a sibling directory, then swapped in
+        staging = table_dir + ".staging"
+        shutil.rmtree(staging, ignore_errors=True)
+        stmt = select(*columns).order_by(table.id)
+        rows, files = _write_partitions(
+            conn, stmt, columns, time_index, staging, "part-0.parquet", batch_size
+        )
+        if os.path.isdir(table_dir):
+            shutil.rmtree(table_dir)
+        if os.path.isdir(staging):
+            os.replace(staging, table_dir)
+        state["files"] = files
+
+    state["rows"] = state.get("rows", 0) + rows if table.append_only else rows
+    state["exported_at"] = datetime.now(timezone.utc).isoformat()
+    state["include_private"] = include_private
+    return rows
+
+
+def export_parquet(
+    conn: Connection,
+    out_dir: str,
+    tables: Optional[Sequence[str]] = None,
+    batch_size: int = 50000,
+    settle: timedelta = timedelta(hours=1),
+    include_private: bool = False,
+) -> Dict[str, int]:
+    """Export tables (default all) one after another, saving the manifest after each."""
+    _pyarrow()
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = load_manifest(out_dir)
+    written = {}
+    for name in tables or EXPORT_TABLES:
+        started = time.perf_counter()
+        written[name] = export_table(conn, name, out_dir, manifest, batch_size, settle, include_private)
+        save_manifest(out_dir, manifest)
+        print(f"[EXPORT] {name}: {written[name]} rows in {time.perf_counter() - started:.1f}s")
+    return written
+
+
+def _text_value(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _ndjson_line(names: List[str], row) -> str:
+    return json.dumps(
+        {name: _text_value(value) for name, value in zip(names, row)}, separators=(",", ":")
+    ) + "\n"
+
+
+async def stream_rows(
+    name: str,
+    fmt: str,
+    columns: Optional[Sequence[str]] = None,
+    since: Optional[datetime] = None,
+    after_id: int = 0,
+    limit: Optional[int] = None,
+    include_private: bool = False,
+) -> AsyncIterator[str]:
+    """
+    Rows of a table ordered by id, as CSV (with header) or NDJSON lines,
+    one chunk per fetch. since filters on the table's time column;
+    after_id resumes after the last id already received.
+
+    The session is opened here rather than taken from the request, so it
+    stays open for as long as the response streams.
+    """
+    table = get_export_table(name)
+    if fmt not in STREAM_FORMATS:
+        raise ValueError(f"Unknown format '{fmt}'")
+    selected = table.columns(include_private, columns)
+    names = [column.name for column in selected]
+    # The keyset needs the id of every row, even if it is not returned
+    query_columns = selected if "id" in names else [*selected, table.id]
+    id_index = [column.name for column in query_columns].index("id")
+
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(names)
+
+        def encode(rows) -> str:
+            for row in rows:
+                writer.writerow([
+                    json.dumps(value) if isinstance(value, (dict, list)) else _text_value(value)
+                    for value in row[:len(names)]
+                ])
+            chunk = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            return chunk
+
+        yield encode([])
+    else:
+        def encode(rows) -> str:
+            return "".join(_ndjson_line(names, row[:len(names)]) for row in rows)
+
+    remaining = limit
+    last_id = after_id
+    async with get_async_session_local()() as db:
+        while remaining is None or remaining > 0:
+            page_size = STREAM_PAGE_SIZE if remaining is None else min(STREAM_PAGE_SIZE, remaining)
+            stmt = select(*query_columns).where(table.id > last_id).order_by(table.id).limit(page_size)
+            if since is not None:
+                stmt = stmt.where(table.time >= since)
+
+            fetched = 0
+            result = await db.stream(stmt.execution_options(yield_per=STREAM_FETCH_SIZE))
+            async for rows in result.partitions():
+                fetched += len(rows)
+                last_id = rows[-1][id_index]
+                yield encode(rows)
+            # Short transaction per page: nothing is held open between pages
+            await db.rollback()
+
+            if remaining is not None:
+                remaining -= fetched
+            if fetched < page_size:
+                break
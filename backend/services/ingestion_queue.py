@@ -0,0 +1,340 @@
+"""
+In-process write-behind queue for tracking writes.
+
+Tracking handlers validate the payload, enqueue it and return 202 right
+away. A background flusher started from the app lifespan drains the queue
+when a batch fills up or the flush interval elapses, and writes each batch
+through analytics_service in a single transaction.
+
+Page view updates are not written per batch: they are merged per
+page_view_id in a PageViewBuffer and flushed every page_view_flush_interval
+as one bulk UPDATE. A beacon finalizes its page view, so it takes the
+pending update for that key with it and is written in its own batch.
+"""
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+
+from backend.database import get_async_session_local
+from backend.services import analytics_service
+
+# Item kinds accepted by the queue
+EVENTS = "events"
+PAGE_VIEW_UPDATE = "pageview_update"
+BEACON = "beacon"
+
+QueueItem = Tuple[str, Dict[str, Any]]
+
+
+class QueueFullError(Exception):
+    """The queue stayed full for longer than the enqueue timeout."""
+
+
+def is_connection_error(exc: Exception) -> bool:
+    """
+    The database (not the batch) is the problem: retrying smaller batches
+    against it would only multiply the timeouts.
+    """
+    if isinstance(exc, DBAPIError) and exc.connection_invalidated:
+        return True
+    return isinstance(exc, (OperationalError, InterfaceError, OSError, asyncio.TimeoutError))
+
+
+def merge_page_view_update(pending: Dict[str, Any], update: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Combine two updates of the same page view: max time on page (the
+    client reports it cumulatively), max scroll depth, reached_form if
+    either reached it. None means "no value".
+    """
+    times_on_page = [
+        seconds for seconds in (pending.get("time_on_page_seconds"), update.get("time_on_page_seconds"))
+        if seconds is not None
+    ]
+    scroll_depths = [
+        depth for depth in (pending.get("max_scroll_depth"), update.get("max_scroll_depth"))
+        if depth is not None
+    ]
+    reached_form = [
+        flag for flag in (pending.get("reached_form"), update.get("reached_form"))
+        if flag is not None
+    ]
+
+    return {
+        "page_view_id": update["page_view_id"],
+        "time_on_page_seconds": max(times_on_page) if times_on_page else None,
+        "max_scroll_depth": max(scroll_depths) if scroll_depths else None,
+        "reached_form": any(reached_form) if reached_form else None,
+    }
+
+
+class PageViewBuffer:
+    """Pending page view updates, coalesced per page_view_id until the next flush."""
+
+    def __init__(self, flush_interval: float):
+        self.flush_interval = flush_interval
+        self._pending: Dict[int, Dict[str, Any]] = {}
+        self._last_flush = time.monotonic()
+
+        # Counters
+        self.added = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, update: Dict[str, Any]) -> None:
+        page_view_id = update["page_view_id"]
+        pending = self._pending.get(page_view_id)
+        if pending is not None:
+            self.coalesced += 1
+        self._pending[page_view_id] = merge_page_view_update(pending or {}, update)
+        self.added += 1
+
+    def pop(self, page_view_id: int) -> Optional[Dict[str, Any]]:
+        return self._pending.pop(page_view_id, None)
+
+    def due(self) -> bool:
+        return bool(self._pending) and time.monotonic() - self._last_flush >= self.flush_interval
+
+    def drain(self) -> List[Dict[str, Any]]:
+        updates = list(self._pending.values())
+        self._pending.clear()
+        self._last_flush = time.monotonic()
+        return updates
+
+
+class IngestionQueue:
+    def __init__(
+        self,
+        max_size: int,
+        batch_size: int,
+        flush_interval: float,
+        enqueue_timeout: float,
+        page_view_flush_interval: float,
+    ):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.page_views = PageViewBuffer(page_view_flush_interval)
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        # Counters
+        self.enqueued = 0
+        self.rejected = 0
+        self.flushed_items = 0
+        self.failed_items = 0
+        self.dropped_events = 0
+        self.flush_count = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    # ============================================
+    # LIFECYCLE
+    # ============================================
+
+    async def start(self) -> None:
+        """Create the queue on the running loop and start the flusher."""
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._stopping = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop accepting work, drain everything left and wait for the flusher."""
+        if self._task is None:
+            return
+        self._stopping.set()
+        await self._task
+        self._task = None
+
+    # ============================================
+    # PRODUCERS
+    # ============================================
+
+    async def put(self, kind: str, payload: Dict[str, Any]) -> None:
+        """
+        Enqueue one item. Waits up to enqueue_timeout when the queue is full
+        (backpressure) and raises QueueFullError after that.
+        """
+        if self._queue is None or self._stopping.is_set():
+            raise QueueFullError("Ingestion queue is not running")
+
+        try:
+            await asyncio.wait_for(self._queue.put((kind, payload)), self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise QueueFullError("Ingestion queue is full")
+
+        self.enqueued += 1
+
+    # ============================================
+    # FLUSHER
+    # ============================================
+
+    async def _run(self) -> None:
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = await self._collect_batch()
+            if batch:
+                await self._flush(self._coalesce(batch))
+            if self.page_views.due():
+                await self._flush_page_views()
+
+        # Shutting down: nothing buffered is lost
+        if len(self.page_views):
+            await self._flush_page_views()
+
+    def _coalesce(self, batch: List[QueueItem]) -> List[QueueItem]:
+        """
+        Move page view updates into the buffer. Beacons absorb the pending
+        update of their page view (and earlier beacons for it in this batch),
+        so the final metrics are written with this batch.
+        """
+        items: List[QueueItem] = []
+        beacons: Dict[int, Dict[str, Any]] = {}
+
+        for kind, payload in batch:
+            if kind == PAGE_VIEW_UPDATE:
+                self.page_views.add(payload)
+            elif kind == BEACON:
+                page_view_id = payload["page_view_id"]
+                pending = beacons.pop(page_view_id, None) or self.page_views.pop(page_view_id) or {}
+                beacons[page_view_id] = merge_page_view_update(pending, payload)
+            else:
+                items.append((kind, payload))
+
+        items.extend((BEACON, beacon) for beacon in beacons.values())
+        return items
+
+    async def _flush_page_views(self) -> None:
+        await self._flush([(PAGE_VIEW_UPDATE, update) for update in self.page_views.drain()])
+
+    async def _collect_batch(self) -> List[QueueItem]:
+        """Wait for up to batch_size items or until the flush interval elapses."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        batch: List[QueueItem] = []
+
+        while len(batch) < self.batch_size:
+            if self._stopping.is_set():
+                # Shutting down: take whatever is left without waiting
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    break
+
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _flush(self, batch: List[QueueItem]) -> None:
+        if not batch:
+            return
+        started = time.perf_counter()
+        await self._write(batch)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        self.flush_count += 1
+        self.last_flush_ms = elapsed_ms
+        self.total_flush_ms += elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+
+    async def _write(self, batch: List[QueueItem]) -> None:
+        """
+        Write the whole batch in one transaction. If that fails, split it in
+        halves and retry each, so one bad payload only drops itself after
+        about log2(len(batch)) transactions. Connection errors drop the batch
+        without retrying.
+        """
+        try:
+            self.dropped_events += await self._write_items(batch)
+            self.flushed_items += len(batch)
+            return
+        except Exception as exc:
+            if len(batch) == 1 or is_connection_error(exc):
+                self.failed_items += len(batch)
+                kinds = ", ".join(sorted({kind for kind, _ in batch}))
+                print(f"[INGESTION] Dropping {len(batch)} {kinds} item(s): {exc}")
+                return
+            print(f"[INGESTION] Batch of {len(batch)} failed, retrying in halves: {exc}")
+
+        middle = len(batch) // 2
+        await self._write(batch[:middle])
+        await self._write(batch[middle:])
+
+    async def _write_items(self, items: List[QueueItem]) -> int:
+        events: List[Dict[str, Any]] = []
+        page_view_updates: List[Dict[str, Any]] = []
+        beacons: List[Dict[str, Any]] = []
+
+        for kind, payload in items:
+            if kind == EVENTS:
+                events.extend(
+                    {**event, "visitor_id": payload["visitor_id"], "page_view_id": payload["page_view_id"]}
+                    for event in payload["events"]
+                )
+            elif kind == PAGE_VIEW_UPDATE:
+                page_view_updates.append(payload)
+            elif kind == BEACON:
+                beacons.append(payload)
+
+        async with get_async_session_local()() as db:
+            return await analytics_service.write_batch(
+                db=db,
+                events=events,
+                page_view_updates=page_view_updates,
+                beacons=beacons,
+            )
+
+    # ============================================
+    # STATS
+    # ============================================
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_size": self.max_size,
+            "enqueued": self.enqueued,
+            "rejected": self.rejected,
+            "flushed_items": self.flushed_items,
+            "failed_items": self.failed_items,
+            "dropped_events": self.dropped_events,
+            "flush_count": self.flush_count,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "avg_flush_ms": round(self.total_flush_ms / self.flush_count, 2) if self.flush_count else 0,
+            "max_flush_ms": round(self.max_flush_ms, 2),
+            "page_views_pending": len(self.page_views),
+            "page_view_updates": self.page_views.added,
+            "page_view_updates_coalesced": self.page_views.coalesced,
+        }
+
+
+# Module level cache - initialized at runtime, not import time
+_ingestion_queue = None
+
+
+def get_ingestion_queue() -> IngestionQueue:
+    global _ingestion_queue
+    if _ingestion_queue is None:
+        from backend.config import get_settings
+        settings = get_settings()
+        _ingestion_queue = IngestionQueue(
+            max_size=settings.ingestion_queue_size,
+            batch_size=settings.ingestion_batch_size,
+            flush_interval=settings.ingestion_flush_interval,
+            enqueue_timeout=settings.ingestion_enqueue_timeout,
+            page_view_flush_interval=settings.page_view_flush_interval,
+        )
+    return _ingestion_queue
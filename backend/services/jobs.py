@@ -0,0 +1,191 @@
+"""
+Periodic background jobs started from the app lifespan.
+
+Every worker process starts the same jobs. With several workers, the jobs
+that must not run twice at the same time (rollups, partitions, sessions,
+the sketch backfill) only run in the job leader: the worker holding a
+Postgres advisory lock on a connection of its own. If the leader dies its
+connection closes, the lock is released and another worker takes over at
+its next attempt. The sketch flush runs in every worker, since each one
+buffers its own ingested visitors.
+"""
+import asyncio
+from datetime import timedelta
+from typing import Awaitable, Callable, List, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from backend.database import advisory_lock_key, get_async_engine, get_async_session_local
+from backend.services import rollup_service, partition_service, session_service, sketch_service
+from backend.services.metrics import get_metrics, snapshot_dir
+from backend.services.response_cache import broadcast_invalidation
+
+
+class JobLeader:
+    """Decides which worker runs the exclusive jobs."""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.key = advisory_lock_key("job_leader")
+        self._conn: Optional[AsyncConnection] = None
+        self._lock = asyncio.Lock()
+
+    async def is_leader(self) -> bool:
+        # A single worker needs no lock (nor the connection it holds)
+        if self.workers == 1:
+            return True
+        async with self._lock:
+            if self._conn is not None:
+                try:
+                    # The lock lives as long as its connection
+                    await self._conn.execute(select(1))
+                    await self._conn.commit()
+                    return True
+                except Exception as exc:
+                    print(f"[JOBS] Lost job leader connection: {exc}")
+                    await self._discard()
+
+            conn = await get_async_engine().connect()
+            try:
+                acquired = await conn.scalar(select(func.pg_try_advisory_lock(self.key)))
+                await conn.commit()
+            except BaseException:
+                await conn.close()
+                raise
+            if not acquired:
+                await conn.close()
+                return False
+            print("[JOBS] This worker is now the job leader")
+            self._conn = conn
+            return True
+
+    async def release(self) -> None:
+        async with self._lock:
+            if self._conn is None:
+                return
+            try:
+                await self._conn.execute(select(func.pg_advisory_unlock(self.key)))
+                await self._conn.commit()
+                await self._conn.close()
+                self._conn = None
+            except Exception:
+                await self._discard()
+
+    async def _discard(self) -> None:
+        """Drop the connection without returning it to the pool (it may still hold the lock)."""
+        conn, self._conn = self._conn, None
+        try:
+            await conn.invalidate()
+            await conn.close()
+        except Exception:
+            pass
+
+
+async def run_periodic(
+    name: str,
+    interval: float,
+    job: Callable[[], Awaitable[None]],
+    exclusive: bool = True,
+) -> None:
+    """
+    Run job every interval seconds until cancelled; failures are logged,
+    not raised. Exclusive jobs only run in the job leader.
+    """
+    while True:
+        try:
+            if not exclusive or await get_job_leader().is_leader():
+                await job()
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            print(f"[JOBS] {name} failed: {exc}")
+        await asyncio.sleep(interval)
+
+
+async def refresh_rollups_job() -> None:
+    from backend.config import get_settings
+    settings = get_settings()
+    async with get_async_session_local()() as db:
+        await rollup_service.refresh_recent_rollups(db, lookback_days=settings.rollup_lookback_days)
+    await broadcast_invalidation("dashboard")
+
+
+async def maintain_partitions_job() -> None:
+    from backend.config import get_settings
+    settings = get_settings()
+    async with get_async_session_local()() as db:
+        await partition_service.maintain_partitions(
+            db,
+            interval=settings.partition_interval,
+            premake=settings.partition_premake,
+            retention_days=settings.retention_days,
+            retention_mode=settings.retention_mode,
+        )
+
+
+async def sessionize_job() -> None:
+    from backend.config import get_settings
+    settings = get_settings()
+    async with get_async_session_local()() as db:
+        visitors = await session_service.sessionize(db, gap=timedelta(minutes=settings.session_gap_minutes))
+    if visitors:
+        await broadcast_invalidation("sessions")
+
+
+async def backfill_sketches_job() -> None:
+    async with get_async_session_local()() as db:
+        rows = await sketch_service.backfill_sketches(db)
+    if rows:
+        print(f"[JOBS] sketches backfilled: {rows} rows")
+
+
+async def flush_sketches_job(backfill: bool = True) -> None:
+    if backfill and await get_job_leader().is_leader():
+        await backfill_sketches_job()
+    async with get_async_session_local()() as db:
+        await sketch_service.flush_sketches(db, sketch_service.get_sketch_buffer())
+
+
+async def write_metrics_snapshot_job() -> None:
+    get_metrics().write_snapshot(snapshot_dir())
+
+
+def start_background_jobs() -> List[asyncio.Task]:
+    from backend.config import get_settings
+    settings = get_settings()
+    tasks = [
+        asyncio.create_task(run_periodic("rollups", settings.rollup_interval, refresh_rollups_job)),
+        asyncio.create_task(run_periodic(
+            "partitions", settings.partition_maintenance_interval, maintain_partitions_job
+        )),
+        asyncio.create_task(run_periodic("sessions", settings.sessionize_interval, sessionize_job)),
+        # Per-worker buffers: every worker flushes its own
+        asyncio.create_task(run_periodic(
+            "sketches", settings.sketch_flush_interval, flush_sketches_job, exclusive=False
+        )),
+    ]
+    if settings.metrics_enabled and settings.web_concurrency > 1:
+        tasks.append(asyncio.create_task(run_periodic(
+            "metrics", settings.metrics_snapshot_interval, write_metrics_snapshot_job, exclusive=False
+        )))
+    return tasks
+
+
+async def stop_background_jobs(tasks: List[asyncio.Task]) -> None:
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await get_job_leader().release()
+
+
+# Module level cache - initialized at runtime, not import time
+_job_leader = None
+
+
+def get_job_leader() -> JobLeader:
+    global _job_leader
+    if _job_leader is None:
+        from backend.config import get_settings
+        _job_leader = JobLeader(workers=get_settings().web_concurrency)
+    return _job_leader
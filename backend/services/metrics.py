@@ -0,0 +1,382 @@
+"""
+Request and database instrumentation, exported in Prometheus text format.
+
+A pure ASGI middleware times every request and labels it with its route
+template. SQLAlchemy cursor events on the API engine count statements and
+DB time, attributed to the request in flight through a contextvar (or to
+"background" for the ingestion flusher and jobs). A pool subclass records
+how long each connection checkout waited.
+
+With METRICS_ENABLED=false nothing is hooked: the middleware passes
+requests straight through and the engine gets no listeners.
+
+Every worker process keeps its own metrics. With several workers, each one
+writes a snapshot of its metrics (labelled worker="<pid>") to a directory
+shared by the workers of the same server. Whichever worker answers a scrape
+renders its own live metrics and merges in the snapshots of the others, so
+their values can be up to one snapshot interval old.
+"""
+import bisect
+import contextvars
+import os
+import tempfile
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+# Seconds; shared by request latency and pool checkout wait
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Slowest statements kept per route
+SLOWEST_PER_ROUTE = 5
+STATEMENT_PREVIEW_CHARS = 200
+
+BACKGROUND_ROUTE = "background"
+
+
+class RequestStats:
+    """DB work done while serving one request."""
+
+    __slots__ = ("scope", "statements", "db_seconds", "slowest")
+
+    def __init__(self, scope: Dict[str, Any]):
+        self.scope = scope
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.slowest: List[Tuple[float, str]] = []
+
+    @property
+    def route(self) -> str:
+        """Route template once routing has matched, else the raw path."""
+        route = self.scope.get("route")
+        return getattr(route, "path", None) or self.scope.get("path", "unmatched")
+
+
+# Stats of the request being served; None outside requests
+current_request = contextvars.ContextVar("current_request", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """(le, cumulative count) pairs, ending with +Inf."""
+        total = 0
+        pairs = []
+        for bound, count in zip([*map(str, self.buckets), "+Inf"], self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+
+class Metrics:
+    def __init__(self):
+        self.request_latency: Dict[str, Histogram] = defaultdict(Histogram)
+        self.requests: Dict[Tuple[str, str, int], int] = defaultdict(int)
+        self.statements: Dict[str, int] = defaultdict(int)
+        self.db_seconds: Dict[str, float] = defaultdict(float)
+        self.slowest: Dict[str, List[Tuple[float, str]]] = defaultdict(list)
+        self.pool_checkout = Histogram()
+        self._pools: List[Any] = []
+        self.slow_query_log = None
+        # Extra gauges rendered at scrape time: name -> callable returning {key: value}
+        self._collectors: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+    # ============================================
+    # RECORDING
+    # ============================================
+
+    def observe_request(self, route: str, method: str, status: int, seconds: float, stats: RequestStats) -> None:
+        self.request_latency[route].observe(seconds)
+        self.requests[(route, method, status)] += 1
+        self.statements[route] += stats.statements
+        self.db_seconds[route] += stats.db_seconds
+        for statement_seconds, statement in stats.slowest:
+            _keep_slowest(self.slowest[route], statement_seconds, statement)
+
+    def observe_statement(self, statement: str, seconds: float) -> None:
+        stats = current_request.get()
+        if stats is None:
+            self.statements[BACKGROUND_ROUTE] += 1
+            self.db_seconds[BACKGROUND_ROUTE] += seconds
+            _keep_slowest(self.slowest[BACKGROUND_ROUTE], seconds, statement)
+            return
+
+        # Attributed to the route (only known at the end) by observe_request
+        stats.statements += 1
+        stats.db_seconds += seconds
+        _keep_slowest(stats.slowest, seconds, statement)
+
+    def observe_checkout(self, seconds: float) -> None:
+        self.pool_checkout.observe(seconds)
+
+    # ============================================
+    # WIRING
+    # ============================================
+
+    def instrument_engine(self, engine) -> None:
+        """Hook cursor events on a (sync) engine and track its pool."""
+        from backend.services.slow_query_log import get_slow_query_log
+        slow_query_log = get_slow_query_log()
+        self.slow_query_log = slow_query_log if slow_query_log.enabled else None
+
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        self._pools.append(engine.pool)
+
+    def add_collector(self, name: str, collect: Callable[[], Dict[str, Any]]) -> None:
+        """Export the numeric values of collect() as <name>_<key> gauges."""
+        self._collectors[name] = collect
+
+    # ============================================
+    # EXPORT
+    # ============================================
+
+    def render(self, worker: Optional[str] = None) -> str:
+        """All metrics in the Prometheus text exposition format (labelled with worker if given)."""
+        lines: List[str] = []
+
+        lines.append("# TYPE validateiq_request_duration_seconds histogram")
+        for route, histogram in sorted(self.request_latency.items()):
+            labels = f'route="{route}"'
+            for bound, count in histogram.cumulative():
+                lines.append(f'validateiq_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f"validateiq_request_duration_seconds_sum{{{labels}}} {histogram.sum}")
+            lines.append(f"validateiq_request_duration_seconds_count{{{labels}}} {histogram.count}")
+
+        lines.append("# TYPE validateiq_requests_total counter")
+        for (route, method, status), count in sorted(self.requests.items()):
+            lines.append(
+                f'validateiq_requests_total{{route="{route}",method="{method}",status="{status}"}} {count}'
+            )
+
+        lines.append("# TYPE validateiq_db_statements_total counter")
+        for route, count in sorted(self.statements.items()):
+            lines.append(f'validateiq_db_statements_total{{route="{route}"}} {count}')
+
+        lines.append("# TYPE validateiq_db_seconds_total counter")
+        for route, seconds in sorted(self.db_seconds.items()):
+            lines.append(f'validateiq_db_seconds_total{{route="{route}"}} {seconds}')
+
+        lines.append("# TYPE validateiq_db_slowest_statement_seconds gauge")
+        for route, slowest in sorted(self.slowest.items()):
+            for rank, (seconds, statement) in enumerate(slowest, start=1):
+                lines.append(
+                    f'validateiq_db_slowest_statement_seconds{{route="{route}",rank="{rank}",'
+                    f'statement="{_escape_label(statement)}"}} {seconds}'
+                )
+
+        lines.append("# TYPE validateiq_db_pool_checkout_seconds histogram")
+        for bound, count in self.pool_checkout.cumulative():
+            lines.append(f'validateiq_db_pool_checkout_seconds_bucket{{le="{bound}"}} {count}')
+        lines.append(f"validateiq_db_pool_checkout_seconds_sum {self.pool_checkout.sum}")
+        lines.append(f"validateiq_db_pool_checkout_seconds_count {self.pool_checkout.count}")
+
+        for pool in self._pools:
+            for name in ("size", "checkedin", "checkedout", "overflow"):
+                reading = getattr(pool, name, None)
+                if reading is not None:
+                    lines.append(f"# TYPE validateiq_db_pool_{name} gauge")
+                    lines.append(f"validateiq_db_pool_{name} {reading()}")
+
+        for prefix, collect in self._collectors.items():
+            for key, value in collect().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f"# TYPE validateiq_{prefix}_{key} gauge")
+                    lines.append(f"validateiq_{prefix}_{key} {value}")
+
+        if worker is not None:
+            lines = [_add_label(line, f'worker="{worker}"') for line in lines]
+        return "\n".join(lines) + "\n"
+
+    # ============================================
+    # MULTIPLE WORKERS
+    # ============================================
+
+    def write_snapshot(self, directory: str) -> None:
+        """Write this worker's metrics for the others to serve (write-then-rename)."""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{os.getpid()}.prom")
+        with open(path + ".tmp", "w") as snapshot:
+            snapshot.write(self.render(worker=str(os.getpid())))
+        os.replace(path + ".tmp", path)
+
+    def remove_snapshot(self, directory: str) -> None:
+        try:
+            os.remove(os.path.join(directory, f"{os.getpid()}.prom"))
+        except FileNotFoundError:
+            pass
+
+    def render_workers(self, directory: str) -> str:
+        """This worker's live metrics merged with the snapshots of the other live workers."""
+        own = str(os.getpid())
+        texts = [self.render(worker=own)]
+        names = sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+        for name in names:
+            pid, extension = os.path.splitext(name)
+            if extension != ".prom" or pid == own:
+                continue
+            path = os.path.join(directory, name)
+            if not _process_alive(int(pid)):
+                # Left behind by a worker that died (or was replaced)
+                os.remove(path)
+                continue
+            with open(path) as snapshot:
+                texts.append(snapshot.read())
+        return _merge_families(texts)
+
+
+def _keep_slowest(slowest: List[Tuple[float, str]], seconds: float, statement: str) -> None:
+    """Insert into a descending top-SLOWEST_PER_ROUTE list if slow enough."""
+    if len(slowest) >= SLOWEST_PER_ROUTE and seconds <= slowest[-1][0]:
+        return
+    slowest.append((seconds, " ".join(statement.split())[:STATEMENT_PREVIEW_CHARS]))
+    slowest.sort(key=lambda item: item[0], reverse=True)
+    del slowest[SLOWEST_PER_ROUTE:]
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def _add_label(line: str, label: str) -> str:
+    """Add label to a sample line; comment lines are returned unchanged."""
+    if line.startswith("#"):
+        return line
+    name_end = min(index for index in (line.find("{"), line.find(" "), len(line)) if index >= 0)
+    if line[name_end:name_end + 1] == "{":
+        return f"{line[:name_end + 1]}{label},{line[name_end + 1:]}"
+    return f"{line[:name_end]}{{{label}}}{line[name_end:]}"
+
+
+def _merge_families(texts: List[str]) -> str:
+    """Concatenate expositions, keeping each metric family (TYPE line and samples) together."""
+    families: Dict[str, List[str]] = {}
+    for text in texts:
+        family = ""
+        for line in text.splitlines():
+            if line.startswith("# TYPE "):
+                family = line
+                families.setdefault(family, [])
+            elif line:
+                families.setdefault(family, []).append(line)
+    lines: List[str] = []
+    for type_line, samples in families.items():
+        if type_line:
+            lines.append(type_line)
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def snapshot_dir() -> str:
+    """Shared by the workers of one server: they have the same parent process."""
+    return os.path.join(tempfile.gettempdir(), f"validateiq-metrics-{os.getppid()}")
+
+
+# ============================================
+# SQLALCHEMY HOOKS
+# ============================================
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_started", None)
+    if started is None:
+        return
+    seconds = time.perf_counter() - started
+    metrics = get_metrics()
+    metrics.observe_statement(statement, seconds)
+    if metrics.slow_query_log is not None:
+        stats = current_request.get()
+        route = stats.route if stats is not None else BACKGROUND_ROUTE
+        metrics.slow_query_log.observe(statement, parameters, seconds, route)
+
+
+class TimedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that records how long each checkout waited."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            get_metrics().observe_checkout(time.perf_counter() - started)
+
+
+# ============================================
+# MIDDLEWARE
+# ============================================
+
+
+class MetricsMiddleware:
+    """Times each HTTP request and records its DB work under the route template."""
+
+    def __init__(self, app):
+        self.app = app
+        from backend.config import get_settings
+        self.enabled = get_settings().metrics_enabled
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            current_request.reset(token)
+            route = scope.get("route")
+            get_metrics().observe_request(
+                route=getattr(route, "path", "unmatched"),
+                method=scope["method"],
+                status=status,
+                seconds=time.perf_counter() - started,
+                stats=stats,
+            )
+
+
+# Module level cache - initialized at runtime, not import time
+_metrics = None
+
+
+def get_metrics() -> Metrics:
+    global _metrics
+    if _metrics is None:
+        _metrics = Metrics()
+    return _metrics
@@ -0,0 +1,225 @@
+"""
+Time-based partitions for the append-only events and page_views tables.
+
+Both tables are PARTITION BY RANGE (created_at). The maintenance job keeps
+the current and the next few partitions created ahead of time, and applies
+the retention policy by detaching whole partitions (then dropping them or
+moving them to an archive schema) instead of running DELETEs.
+
+Each table also has a DEFAULT partition (<table>_default), so inserts keep
+working when the job falls behind. It should stay empty: maintenance moves
+any rows it finds there into range partitions and logs a warning.
+"""
+import re
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, NamedTuple, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+PARTITIONED_TABLES = ("events", "page_views")
+
+INTERVALS = ("month", "day")
+
+ARCHIVE_SCHEMA = "archive"
+
+_BOUNDS = re.compile(r"FROM \('(?P<start>[^']+)'\) TO \('(?P<end>[^']+)'\)")
+
+_PARTITION_NAME = re.compile(
+    r"^(?:%s)_(?:p\d{4}_\d{2}(?:_\d{2})?|default)$" % "|".join(PARTITIONED_TABLES)
+)
+
+
+class Partition(NamedTuple):
+    name: str
+    start: datetime
+    end: datetime
+
+
+def partition_start(moment: date, interval: str) -> date:
+    """First day of the partition that contains moment."""
+    if interval == "month":
+        return moment.replace(day=1)
+    return moment
+
+
+def next_partition_start(start: date, interval: str) -> date:
+    if interval == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def partition_name(table: str, start: date, interval: str) -> str:
+    if interval == "month":
+        return f"{table}_p{start:%Y_%m}"
+    return f"{table}_p{start:%Y_%m_%d}"
+
+
+def default_partition_name(table: str) -> str:
+    return f"{table}_default"
+
+
+def is_partition_name(name: str) -> bool:
+    """True for partition tables created here (not part of the model metadata)."""
+    return _PARTITION_NAME.match(name) is not None
+
+
+def create_partition_sql(table: str, start: date, interval: str) -> str:
+    """DDL for the partition of table that starts at start (UTC day boundaries)."""
+    end = next_partition_start(start, interval)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table, start, interval)} "
+        f"PARTITION OF {table} "
+        f"FOR VALUES FROM ('{start.isoformat()} 00:00:00+00') TO ('{end.isoformat()} 00:00:00+00')"
+    )
+
+
+def partitions_between(table: str, first: date, last: date, interval: str) -> List[str]:
+    """CREATE statements for every partition from the one holding first to the one holding last."""
+    statements = []
+    start = partition_start(first, interval)
+    while start <= last:
+        statements.append(create_partition_sql(table, start, interval))
+        start = next_partition_start(start, interval)
+    return statements
+
+
+def upcoming_partitions(interval: str, premake: int) -> List[str]:
+    """CREATE statements for the current partition and the next `premake` ones of every table."""
+    today = datetime.now(timezone.utc).date()
+    last = partition_start(today, interval)
+    for _ in range(premake):
+        last = next_partition_start(last, interval)
+
+    return [
+        statement
+        for table in PARTITIONED_TABLES
+        for statement in partitions_between(table, today, last, interval)
+    ]
+
+
+def drain_default_partition(conn, table: str, interval: str) -> int:
+    """
+    Move the rows of table's DEFAULT partition into range partitions and
+    return how many there were. Takes a sync connection or session (the job
+    calls it through run_sync); the caller commits.
+
+    A range partition cannot be created while the default holds rows in its
+    range, so the default is detached, the partitions its rows need are
+    created, the rows are copied and the emptied default is attached again.
+    Inserts into the table wait on the lock until the caller commits.
+    """
+    default = default_partition_name(table)
+    if conn.execute(text("SELECT to_regclass(:name)"), {"name": default}).scalar() is None:
+        # Schema older than revision 0010
+        return 0
+
+    first, last, rows = conn.execute(
+        text(f"SELECT MIN(created_at), MAX(created_at), COUNT(*) FROM {default}")
+    ).one()
+    if not rows:
+        return 0
+
+    conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {default}"))
+    for statement in partitions_between(
+        table, first.astimezone(timezone.utc).date(), last.astimezone(timezone.utc).date(), interval
+    ):
+        conn.execute(text(statement))
+    conn.execute(text(f"INSERT INTO {table} SELECT * FROM {default}"))
+    conn.execute(text(f"TRUNCATE {default}"))
+    conn.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT"))
+    return rows
+
+
+async def drain_default_partitions(db: AsyncSession, interval: str) -> Dict[str, int]:
+    """drain_default_partition for every table; {table: rows moved} for the non-empty ones."""
+    moved = {}
+    for table in PARTITIONED_TABLES:
+        rows = await db.run_sync(drain_default_partition, table, interval)
+        if rows:
+            moved[table] = rows
+    return moved
+
+
+async def ensure_partitions(db: AsyncSession, interval: str, premake: int) -> None:
+    """Create the current partition and the next `premake` ones for every table."""
+    for statement in upcoming_partitions(interval, premake):
+        await db.execute(text(statement))
+    await db.commit()
+
+
+async def list_partitions(db: AsyncSession, table: str) -> List[Partition]:
+    rows = (await db.execute(
+        text(
+            "SELECT child.relname, pg_get_expr(child.relpartbound, child.oid) "
+            "FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = :table"
+        ),
+        {"table": table},
+    )).all()
+
+    partitions = []
+    for name, bound in rows:
+        match = _BOUNDS.search(bound or "")
+        if match is None:
+            # DEFAULT partition or unexpected bound: never a retention candidate
+            continue
+        partitions.append(Partition(
+            name=name,
+            start=datetime.fromisoformat(match["start"]),
+            end=datetime.fromisoformat(match["end"]),
+        ))
+    return sorted(partitions, key=lambda partition: partition.start)
+
+
+async def apply_retention(db: AsyncSession, retention_days: int, mode: str = "drop") -> List[str]:
+    """
+    Detach every partition that ends before now - retention_days, then drop
+    it (mode="drop") or move it to the archive schema (mode="archive").
+    Returns the affected partition names.
+    """
+    if retention_days <= 0:
+        return []
+
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    expired: List[str] = []
+
+    for table in PARTITIONED_TABLES:
+        for partition in await list_partitions(db, table):
+            if partition.end > cutoff:
+                continue
+            await db.execute(text(f"ALTER TABLE {table} DETACH PARTITION {partition.name}"))
+            if mode == "archive":
+                await db.execute(text(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}"))
+                await db.execute(text(f"ALTER TABLE {partition.name} SET SCHEMA {ARCHIVE_SCHEMA}"))
+            else:
+                await db.execute(text(f"DROP TABLE {partition.name}"))
+            expired.append(partition.name)
+
+    await db.commit()
+    return expired
+
+
+async def maintain_partitions(
+    db: AsyncSession,
+    interval: str,
+    premake: int,
+    retention_days: int,
+    retention_mode: str,
+) -> Optional[List[str]]:
+    """
+    Maintenance job entry point: empty the DEFAULT partitions, premake
+    upcoming partitions, expire old ones.
+    """
+    for table, rows in (await drain_default_partitions(db, interval)).items():
+        print(
+            f"[PARTITIONS] WARNING: {default_partition_name(table)} had {rows} rows "
+            f"(missing partitions, was maintenance down?); moved them to range partitions"
+        )
+    await ensure_partitions(db, interval, premake)
+    expired = await apply_retention(db, retention_days, retention_mode)
+    if expired:
+        print(f"[PARTITIONS] Retention ({retention_mode}): {', '.join(expired)}")
+    return expired
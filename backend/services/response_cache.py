@@ -0,0 +1,231 @@
+"""
+TTL cache for read-only stats responses.
+
+Concurrent misses for the same key share one computation (single-flight),
+writers invalidate by key prefix, and every entry carries an ETag so
+browsers and proxies can revalidate with If-None-Match.
+
+Each worker process has its own cache. Writers call broadcast_invalidation,
+which with several workers also sends the prefix over Postgres NOTIFY; the
+InvalidationListener of every other worker applies it. After a lost
+listener connection the whole cache is dropped, since notifications may
+have been missed. TTLs still bound staleness.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from sqlalchemy import func, select
+
+# NOTIFY channel carrying invalidations between worker processes
+INVALIDATION_CHANNEL = "validateiq_cache_invalidation"
+LISTENER_RETRY_SECONDS = 5.0
+
+
+class _Abandoned(Exception):
+    """The computation was cancelled with its caller; waiters retry it."""
+
+
+class CachedResponse(NamedTuple):
+    value: Any
+    etag: str
+    expires_at: float
+
+
+class ResponseCache:
+    def __init__(self, ttl: float, max_entries: int = 256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Bumped by invalidate(); results computed across a bump are not stored
+        self._generation = 0
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        ttl: Optional[float] = None,
+    ) -> CachedResponse:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at > time.monotonic():
+            self.hits += 1
+            return entry
+
+        while key in self._inflight:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(self._inflight[key])
+            except _Abandoned:
+                # The request computing it went away (its compute may use that
+                # request's session): the first waiter computes it instead
+                pass
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        generation = self._generation
+        try:
+            value = await compute()
+            entry = CachedResponse(
+                value=value,
+                etag=make_etag(value),
+                expires_at=time.monotonic() + (self.ttl if ttl is None else ttl),
+            )
+            if generation == self._generation:
+                self._store(key, entry)
+            future.set_result(entry)
+            return entry
+        except asyncio.CancelledError:
+            # Not cancel(): that would cancel every coalesced request too
+            future.set_exception(_Abandoned())
+            future.exception()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # Mark retrieved so an unawaited failure does not warn
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    def invalidate(self, prefix: str = "") -> None:
+        """Drop every entry whose key starts with prefix (all entries by default)."""
+        self._generation += 1
+        self.invalidations += 1
+        for key in [key for key in self._entries if key.startswith(prefix)]:
+            del self._entries[key]
+
+    def _store(self, key: str, entry: CachedResponse) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "invalidations": self.invalidations,
+        }
+
+
+def make_etag(value: Any) -> str:
+    body = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return '"' + hashlib.sha1(body.encode()).hexdigest() + '"'
+
+
+def cached_json_response(
+    request: Request,
+    cached: CachedResponse,
+    max_age: int,
+    public: bool = True,
+) -> Response:
+    """JSON response with ETag/Cache-Control; 304 when If-None-Match matches."""
+    headers = {
+        "ETag": cached.etag,
+        "Cache-Control": f"{'public' if public else 'private'}, max-age={max_age}",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and cached.etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    return JSONResponse(content=cached.value, headers=headers)
+
+
+async def broadcast_invalidation(prefix: str = "") -> None:
+    """Invalidate prefix in this process and, with several workers, in all the others."""
+    get_response_cache().invalidate(prefix)
+
+    from backend.config import get_settings
+    if get_settings().web_concurrency > 1:
+        from backend.database import get_async_engine
+        async with get_async_engine().connect() as conn:
+            await conn.execute(select(func.pg_notify(INVALIDATION_CHANNEL, f"{os.getpid()}:{prefix}")))
+            await conn.commit()
+
+
+class InvalidationListener:
+    """LISTENs on one pooled connection and applies other workers' invalidations."""
+
+    def __init__(self, cache: ResponseCache):
+        self.cache = cache
+        self.received = 0
+        self.reconnects = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def _on_notify(self, connection, pid, channel, payload: str) -> None:
+        sender, _, prefix = payload.partition(":")
+        # Our own broadcasts were applied before sending
+        if sender != str(os.getpid()):
+            self.received += 1
+            self.cache.invalidate(prefix)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"received": self.received, "reconnects": self.reconnects}
+
+    async def _run(self) -> None:
+        from backend.database import get_async_engine
+        while True:
+            try:
+                async with get_async_engine().connect() as conn:
+                    driver = (await conn.get_raw_connection()).driver_connection
+                    lost = asyncio.Event()
+
+                    def on_lost(_connection) -> None:
+                        lost.set()
+
+                    driver.add_termination_listener(on_lost)
+                    await driver.add_listener(INVALIDATION_CHANNEL, self._on_notify)
+                    try:
+                        await lost.wait()
+                    finally:
+                        driver.remove_termination_listener(on_lost)
+                        if not driver.is_closed():
+                            # The connection goes back to the pool
+                            await driver.remove_listener(INVALIDATION_CHANNEL, self._on_notify)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                print(f"[CACHE] Invalidation listener failed: {exc}")
+            # Whatever was sent while we were not listening is lost
+            self.reconnects += 1
+            self.cache.invalidate()
+            await asyncio.sleep(LISTENER_RETRY_SECONDS)
+
+
+# Module level cache - initialized at runtime, not import time
+_response_cache = None
+
+
+def get_response_cache() -> ResponseCache:
+    global _response_cache
+    if _response_cache is None:
+        from backend.config import get_settings
+        settings = get_settings()
+        _response_cache = ResponseCache(ttl=settings.response_cache_ttl)
+    return _response_cache
@@ -0,0 +1,166 @@
+"""
+Cohort retention from visitor_activity_days.
+
+Visitors are grouped into cohorts by the day/week of first_seen, and
+optionally into segments by utm_source or original referrer. A cohort
+visitor counts as retained in period N when they had any activity day
+N periods after their own first day.
+
+The query reads one entry per active visitor-day of the cohort visitors
+(plus one per visitor with no activity days), as column arrays. It never
+reads events. The matrix is built with NumPy: dedupe (visitor, period), then
+one bincount over (segment, cohort, period).
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import Integer, cast, func, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.models import Visitor, VisitorActivityDay
+from backend.services.rollup_service import utc_day
+from backend.services.timeseries_service import truncate
+
+PERIOD_DAYS = {"day": 1, "week": 7}
+
+# breakdown -> (column, segment name for NULL)
+BREAKDOWNS = {
+    "none": (None, None),
+    "utm_source": (Visitor.utm_source, "none"),
+    "referrer": (Visitor.original_referrer, "direct"),
+}
+
+# Largest segments kept by name; the rest are summed into OTHER_SEGMENT
+MAX_SEGMENTS = 10
+OTHER_SEGMENT = "other"
+ALL_SEGMENT = "all"
+
+MAX_PERIODS = 52
+
+
+def retention_matrix(
+    ids: Sequence[int],
+    first_offsets: Sequence[int],
+    names: Sequence[str],
+    ages: Sequence[int],
+    period_days: int,
+    cohorts: int,
+    periods: int,
+) -> List[Tuple[str, np.ndarray, np.ndarray]]:
+    """
+    (segment, cohort sizes, retained visitors per (cohort, period)) from
+    parallel columns with one entry per active visitor-day: visitor id,
+    first day (days after the first cohort start), segment name and activity
+    day (days after the visitor's first day, -1 = no activity). The
+    MAX_SEGMENTS largest segments are kept by name, the rest summed into
+    OTHER_SEGMENT.
+    """
+    visitor_ids = np.array(ids, dtype=np.int64)
+    cohort = np.array(first_offsets, dtype=np.int64) // period_days
+    age = np.array(ages, dtype=np.int64)
+    segment_names, segment = np.unique(np.array(names, dtype=object), return_inverse=True)
+
+    # One row per visitor for cohort sizes
+    _, first_rows = np.unique(visitor_ids, return_index=True)
+    sizes = np.bincount(
+        segment[first_rows] * cohorts + cohort[first_rows], minlength=len(segment_names) * cohorts
+    ).reshape(len(segment_names), cohorts)
+
+    # Retained: one row per (visitor, period), periods in [0, periods)
+    offset = age // period_days
+    active = (age >= 0) & (offset < periods)
+    keys = visitor_ids[active] * periods + offset[active]
+    _, unique_rows = np.unique(keys, return_index=True)
+    picked = np.flatnonzero(active)[unique_rows]
+    retained = np.bincount(
+        (segment[picked] * cohorts + cohort[picked]) * periods + offset[picked],
+        minlength=len(segment_names) * cohorts * periods,
+    ).reshape(len(segment_names), cohorts, periods)
+
+    # Largest segments by visitors; the tail is summed into "other"
+    order = np.argsort(-sizes.sum(axis=1), kind="stable")
+    keep, rest = order[:MAX_SEGMENTS], order[MAX_SEGMENTS:]
+    segments = [(str(segment_names[i]), sizes[i], retained[i]) for i in keep]
+    if len(rest):
+        segments.append((OTHER_SEGMENT, sizes[rest].sum(axis=0), retained[rest].sum(axis=0)))
+    return segments
+
+
+async def get_retention(
+    db: AsyncSession,
+    start: datetime,
+    end: datetime,
+    period: str,
+    breakdown: str = "none",
+    periods: int = 12,
+) -> Dict[str, Any]:
+    """
+    Retention matrix for visitors first seen in [start, end): per segment,
+    cohort sizes, retained visitors per (cohort, period) and the same as a
+    percentage. "complete" flags the (cohort, period) cells that are over
+    for every visitor of the cohort; the rest are still filling up.
+    """
+    if period not in PERIOD_DAYS:
+        raise ValueError(f"Unknown period '{period}'")
+    if breakdown not in BREAKDOWNS:
+        raise ValueError(f"Unknown breakdown '{breakdown}'")
+    if not 1 <= periods <= MAX_PERIODS:
+        raise ValueError(f"periods must be between 1 and {MAX_PERIODS}")
+
+    period_days = PERIOD_DAYS[period]
+    # Cohorts start on a period boundary (ISO weeks start on Monday)
+    first_cohort = truncate(start, period).date()
+    cohorts = (end.date() - first_cohort).days // period_days + 1
+
+    first_day = utc_day(Visitor.first_seen)
+    dimension, missing = BREAKDOWNS[breakdown]
+    # Columns come back as arrays in one row: no per-row objects on the Python side
+    stmt = (
+        select(
+            func.array_agg(Visitor.id),
+            func.array_agg(cast(first_day - literal(first_cohort), Integer)),
+            func.array_agg(
+                func.coalesce(dimension, missing) if dimension is not None else literal(ALL_SEGMENT)
+            ),
+            # -1 for visitors without activity rows: dropped from the retained counts below
+            func.array_agg(func.coalesce(cast(VisitorActivityDay.day - first_day, Integer), -1)),
+        )
+        .select_from(Visitor)
+        .outerjoin(VisitorActivityDay, VisitorActivityDay.visitor_id == Visitor.id)
+        .where(Visitor.first_seen >= start, Visitor.first_seen < end)
+    )
+    ids, first_offsets, names, ages = (await db.execute(stmt)).one()
+
+    segments = retention_matrix(
+        ids or [], first_offsets or [], names or [], ages or [], period_days, cohorts, periods
+    )
+
+    cohort_starts = [first_cohort + timedelta(days=i * period_days) for i in range(cohorts)]
+    # Period n of the cohort's last first-day ends (n + 2) periods - 1 day after the cohort start
+    today = datetime.now(timezone.utc).date()
+    complete = [
+        [cohort_start + timedelta(days=(n + 2) * period_days - 1) <= today for n in range(periods)]
+        for cohort_start in cohort_starts
+    ]
+
+    return {
+        "period": period,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "breakdown": breakdown,
+        "cohorts": [cohort_start.isoformat() for cohort_start in cohort_starts],
+        "periods": periods,
+        "complete": complete,
+        "segments": [
+            {
+                "segment": name,
+                "visitors": int(cohort_sizes.sum()),
+                "cohort_sizes": cohort_sizes.tolist(),
+                "retained": counts.tolist(),
+                "retention": np.round(counts / np.maximum(cohort_sizes, 1)[:, None] * 100, 2).tolist(),
+            }
+            for name, cohort_sizes, counts in segments
+        ],
+    }
+
@@ -0,0 +1,221 @@
+"""
+Daily rollups behind /api/stats/dashboard.
+
+A periodic compaction job re-aggregates the last few days of raw rows into
+stats_rollups (one row per day, metric and dimension), so the dashboard reads
+O(number of buckets) rows instead of scanning events on every call.
+
+Unique-visitor metrics (section engagement, form funnel) are stored as "first
+occurrence" counts: a visitor is counted on the first day they did X, which
+keeps them additive across days.
+
+The "rollups" job watermark is the start of the first day not aggregated yet.
+Each run starts from the earlier of the watermark and the lookback window and
+moves the watermark in the same transaction as every chunk it rewrites, so an
+interrupted backfill resumes where it stopped instead of leaving a gap.
+"""
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Date, and_, cast, delete, exists, func, insert, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from backend.models import Event, PageView, Signup, StatsRollup, Visitor
+from backend.services.watermark_service import get_watermark, set_watermark
+
+ROLLUP_COLUMNS = ["bucket_date", "metric", "dimension", "count", "total"]
+
+FORM_FUNNEL_EVENTS = ("form_focus", "form_field_blur")
+
+# Days re-aggregated per transaction when backfilling
+BACKFILL_CHUNK_DAYS = 31
+
+WATERMARK = "rollups"
+
+# metric -> {dimension: (count, total)}
+Rollups = Dict[str, Dict[str, Tuple[int, int]]]
+
+
+def utc_day(column):
+    """Calendar day (UTC) of a timestamptz column."""
+    return cast(func.timezone("UTC", column), Date)
+
+
+def _rollup_select(
+    metric: str,
+    day_column,
+    start: datetime,
+    end: datetime,
+    dimension=None,
+    count=None,
+    total=None,
+    filters=(),
+):
+    day = utc_day(day_column)
+    group_by = [day] if dimension is None else [day, dimension]
+
+    return select(
+        day.label("bucket_date"),
+        literal(metric).label("metric"),
+        (dimension if dimension is not None else literal("")).label("dimension"),
+        (count if count is not None else func.count()).label("count"),
+        (total if total is not None else literal(0)).label("total"),
+    ).where(
+        day_column >= start,
+        day_column < end,
+        *filters
+    ).group_by(*group_by)
+
+
+def _first_occurrence(match_section: bool):
+    """No earlier-day event of the same type (and section) for the same visitor."""
+    earlier = aliased(Event)
+    conditions = [
+        earlier.visitor_id == Event.visitor_id,
+        earlier.event_type == Event.event_type,
+        func.timezone("UTC", earlier.created_at)
+        < func.date_trunc("day", func.timezone("UTC", Event.created_at)),
+    ]
+    if match_section:
+        conditions.append(earlier.section.is_not_distinct_from(Event.section))
+    return ~exists().where(and_(*conditions))
+
+
+def _rollup_selects(start: datetime, end: datetime) -> list:
+    return [
+        _rollup_select("visitors", Visitor.first_seen, start, end),
+        _rollup_select(
+            "devices", Visitor.first_seen, start, end,
+            dimension=func.coalesce(Visitor.device_type, "unknown"),
+        ),
+        _rollup_select(
+            "referrers", Visitor.first_seen, start, end,
+            dimension=func.coalesce(Visitor.original_referrer, "direct"),
+        ),
+        _rollup_select("page_views", PageView.created_at, start, end),
+        _rollup_select(
+            "time_on_page", PageView.created_at, start, end,
+            count=func.count(PageView.time_on_page_seconds),
+            total=func.coalesce(func.sum(PageView.time_on_page_seconds), 0),
+        ),
+        _rollup_select(
+            "scroll_depth", PageView.created_at, start, end,
+            count=func.count(PageView.max_scroll_depth),
+            total=func.coalesce(func.sum(PageView.max_scroll_depth), 0),
+        ),
+        _rollup_select("signups", Signup.created_at, start, end),
+        _rollup_select(
+            "feature_votes", Signup.created_at, start, end,
+            dimension=Signup.most_wanted_feature,
+        ),
+        _rollup_select(
+            "events", Event.created_at, start, end,
+            dimension=Event.event_type,
+        ),
+        _rollup_select(
+            "section_visitors", Event.created_at, start, end,
+            dimension=func.coalesce(Event.section, "unknown"),
+            count=func.count(func.distinct(Event.visitor_id)),
+            filters=[Event.event_type == "section_view", _first_occurrence(match_section=True)],
+        ),
+        _rollup_select(
+            "form_visitors", Event.created_at, start, end,
+            dimension=Event.event_type,
+            count=func.count(func.distinct(Event.visitor_id)),
+            filters=[Event.event_type.in_(FORM_FUNNEL_EVENTS), _first_occurrence(match_section=False)],
+        ),
+    ]
+
+
+async def refresh_rollups(db: AsyncSession, start_day: date, end_day: date) -> None:
+    """Recompute every rollup bucket between start_day and end_day (inclusive); the caller commits."""
+    start = datetime.combine(start_day, time.min, tzinfo=timezone.utc)
+    end = datetime.combine(end_day + timedelta(days=1), time.min, tzinfo=timezone.utc)
+
+    await db.execute(
+        delete(StatsRollup).where(
+            StatsRollup.bucket_date >= start_day,
+            StatsRollup.bucket_date <= end_day,
+        )
+    )
+    for stmt in _rollup_selects(start, end):
+        await db.execute(insert(StatsRollup).from_select(ROLLUP_COLUMNS, stmt))
+
+
+async def refresh_recent_rollups(db: AsyncSession, lookback_days: int) -> None:
+    """
+    Compaction job entry point. Re-aggregates the last lookback_days days
+    (late beacons still update page views) and whatever the watermark says
+    is not aggregated yet, in chunks; with no watermark it backfills from
+    the earliest data.
+    """
+    today = datetime.now(timezone.utc).date()
+
+    watermark = await get_watermark(db, WATERMARK)
+    if watermark is not None:
+        start_day = min(watermark.astimezone(timezone.utc).date(), today - timedelta(days=lookback_days))
+    else:
+        start_day = await _earliest_data_day(db)
+        if start_day is None:
+            return
+
+    while start_day <= today:
+        end_day = min(start_day + timedelta(days=BACKFILL_CHUNK_DAYS - 1), today)
+        await refresh_rollups(db, start_day, end_day)
+        start_day = end_day + timedelta(days=1)
+        await set_watermark(db, WATERMARK, datetime.combine(start_day, time.min, tzinfo=timezone.utc))
+        await db.commit()
+
+
+async def _earliest_data_day(db: AsyncSession) -> Optional[date]:
+    days = [
+        await db.scalar(select(func.min(utc_day(column))))
+        for column in (Visitor.first_seen, PageView.created_at, Event.created_at, Signup.created_at)
+    ]
+    days = [day for day in days if day is not None]
+    return min(days) if days else None
+
+
+async def load_rollups(
+    db: AsyncSession,
+    start_day: Optional[date] = None,
+    end_day: Optional[date] = None,
+) -> Rollups:
+    """Sum rollup buckets per (metric, dimension), optionally within a day range."""
+    stmt = select(
+        StatsRollup.metric,
+        StatsRollup.dimension,
+        func.sum(StatsRollup.count),
+        func.sum(StatsRollup.total),
+    ).group_by(StatsRollup.metric, StatsRollup.dimension)
+
+    if start_day is not None:
+        stmt = stmt.where(StatsRollup.bucket_date >= start_day)
+    if end_day is not None:
+        stmt = stmt.where(StatsRollup.bucket_date <= end_day)
+
+    rollups: Rollups = defaultdict(dict)
+    for metric, dimension, count, total in (await db.execute(stmt)).all():
+        rollups[metric][dimension] = (int(count or 0), int(total or 0))
+    return rollups
+
+
+def rollup_count(rollups: Rollups, metric: str, dimension: str = "") -> int:
+    return rollups.get(metric, {}).get(dimension, (0, 0))[0]
+
+
+def rollup_average(rollups: Rollups, metric: str) -> float:
+    count, total = rollups.get(metric, {}).get("", (0, 0))
+    return total / count if count else 0
+
+
+def rollup_breakdown(rollups: Rollups, metric: str, limit: Optional[int] = None) -> Dict[str, int]:
+    """{dimension: count} for a metric, largest first."""
+    items = sorted(
+        ((dimension, value[0]) for dimension, value in rollups.get(metric, {}).items()),
+        key=lambda item: item[1],
+        reverse=True,
+    )
+    return dict(items[:limit] if limit else items)
@@ -0,0 +1,281 @@
+"""
+Server-side sessionization of page views and events.
+
+A visitor's activity (page view loads and events, ordered by created_at) is
+split into sessions wherever two consecutive rows are more than the
+inactivity gap apart. Each session is written once to the compact sessions
+table (duration, depth, bounce, entry/exit section), and its page views get
+their session_id, so reports never re-derive sessions from events.
+
+The job is incremental. The "sessions" watermark says all activity before
+it is sessionized; each run processes [watermark, now - LATE_ROWS) in
+chunks. A visitor with new rows in the chunk may be continuing a session
+that ended within the gap before the chunk, so those sessions are deleted
+and rebuilt together with the new rows. Every other session is final.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.models import VisitorSession
+from backend.services.timeseries_service import bucket_starts
+from backend.services.watermark_service import get_watermark, set_watermark
+
+WATERMARK = "sessions"
+
+# created_at is set when the write-behind queue flushes; rows are committed
+# a little after it, so the newest seconds are left for the next run
+LATE_ROWS = timedelta(seconds=60)
+
+# Activity window sessionized per transaction (backfill and catch-up)
+CHUNK = timedelta(days=1)
+
+# Automatic events that do not make a single-page session "engaged"
+PASSIVE_EVENTS = ("section_view", "scroll_milestone", "tab_hidden", "tab_visible", "exit_intent")
+
+CONVERSION_EVENT = "form_submit_success"
+
+_CREATE_VISITORS = text("""
+    CREATE TEMP TABLE sessionize_visitors (
+        visitor_id integer PRIMARY KEY,
+        since timestamptz NOT NULL
+    ) ON COMMIT DROP
+""")
+
+# Visitors with new rows in [lo, hi), and where their rebuild starts: the
+# first still-open session (ended within the gap before lo), else lo.
+# A signup reopens the session it converts.
+_FIND_VISITORS = text("""
+    INSERT INTO sessionize_visitors (visitor_id, since)
+    SELECT active.visitor_id, LEAST(CAST(:lo AS timestamptz), MIN(s.started_at))
+    FROM (
+        SELECT visitor_id FROM page_views WHERE created_at >= :lo AND created_at < :hi
+        UNION
+        SELECT visitor_id FROM events WHERE created_at >= :lo AND created_at < :hi
+        UNION
+        SELECT visitor_id FROM signups WHERE created_at >= :lo AND created_at < :hi
+    ) active
+    LEFT JOIN sessions s
+        ON s.visitor_id = active.visitor_id
+        AND s.ended_at >= CAST(:lo AS timestamptz) - CAST(:gap AS interval)
+    GROUP BY active.visitor_id
+""")
+
+_DELETE_OPEN = text("""
+    DELETE FROM sessions s
+    USING sessionize_visitors v
+    WHERE s.visitor_id = v.visitor_id AND s.started_at >= v.since
+""")
+
+_BUILD_SESSIONS = text("""
+    WITH activity AS (
+        SELECT pv.visitor_id, pv.created_at, pv.id, 1 AS is_page_view, 0 AS is_interaction,
+               NULL::varchar AS event_type, NULL::varchar AS section,
+               pv.created_at + make_interval(secs => COALESCE(pv.time_on_page_seconds, 0)) AS active_until,
+               pv.referrer, pv.utm_source
+        FROM page_views pv
+        JOIN sessionize_visitors v ON v.visitor_id = pv.visitor_id
+        WHERE pv.created_at >= :since AND pv.created_at < :hi AND pv.created_at >= v.since
+        UNION ALL
+        SELECT e.visitor_id, e.created_at, e.id, 0, (e.event_type <> ALL(CAST(:passive AS varchar[])))::int,
+               e.event_type, e.section, e.created_at, NULL, NULL
+        FROM events e
+        JOIN sessionize_visitors v ON v.visitor_id = e.visitor_id
+        WHERE e.created_at >= :since AND e.created_at < :hi AND e.created_at >= v.since
+    ),
+    marked AS (
+        SELECT *,
+               CASE WHEN created_at - LAG(created_at) OVER w > CAST(:gap AS interval) THEN 1 ELSE 0 END AS starts_session
+        FROM activity
+        WINDOW w AS (PARTITION BY visitor_id ORDER BY created_at, is_page_view DESC, id)
+    ),
+    numbered AS (
+        SELECT *,
+               SUM(starts_session) OVER (
+                   PARTITION BY visitor_id ORDER BY created_at, is_page_view DESC, id ROWS UNBOUNDED PRECEDING
+               ) AS session_number
+        FROM marked
+    )
+    INSERT INTO sessions (
+        session_id, visitor_id, started_at, ended_at, duration_seconds, page_views, events,
+        is_bounce, converted, entry_section, exit_section, referrer, utm_source
+    )
+    SELECT
+        visitor_id || '-' || FLOOR(EXTRACT(EPOCH FROM MIN(created_at)) * 1000)::bigint,
+        visitor_id,
+        MIN(created_at),
+        MAX(created_at),
+        EXTRACT(EPOCH FROM GREATEST(MAX(created_at), MAX(active_until)) - MIN(created_at))::int,
+        SUM(is_page_view),
+        COUNT(*) - SUM(is_page_view),
+        SUM(is_page_view) <= 1 AND SUM(is_interaction) = 0,
+        COALESCE(BOOL_OR(event_type = :conversion), false) OR EXISTS (
+            SELECT 1 FROM signups sg
+            WHERE sg.visitor_id = numbered.visitor_id
+              AND sg.created_at >= MIN(numbered.created_at)
+              AND sg.created_at <= MAX(numbered.created_at) + CAST(:gap AS interval)
+              AND sg.created_at < :hi
+        ),
+        (ARRAY_AGG(section ORDER BY created_at, id) FILTER (WHERE section IS NOT NULL))[1],
+        (ARRAY_AGG(section ORDER BY created_at DESC, id DESC) FILTER (WHERE section IS NOT NULL))[1],
+        (ARRAY_AGG(referrer ORDER BY created_at, id) FILTER (WHERE is_page_view = 1))[1],
+        (ARRAY_AGG(utm_source ORDER BY created_at, id) FILTER (WHERE is_page_view = 1))[1]
+    FROM numbered
+    GROUP BY visitor_id, session_number
+""")
+
+_TAG_PAGE_VIEWS = text("""
+    UPDATE page_views pv
+    SET session_id = s.session_id
+    FROM sessions s
+    JOIN sessionize_visitors v ON v.visitor_id = s.visitor_id
+    WHERE s.started_at >= v.since
+      AND pv.visitor_id = s.visitor_id
+      AND pv.created_at >= s.started_at AND pv.created_at <= s.ended_at
+      AND pv.created_at >= :since AND pv.created_at < :hi
+      AND pv.session_id IS DISTINCT FROM s.session_id
+""")
+
+
+async def _earliest_activity(db: AsyncSession) -> Optional[datetime]:
+    moments = [
+        await db.scalar(text(f"SELECT MIN(created_at) FROM {table}"))
+        for table in ("page_views", "events")
+    ]
+    moments = [moment for moment in moments if moment is not None]
+    return min(moments) if moments else None
+
+
+async def sessionize_window(db: AsyncSession, lo: datetime, hi: datetime, gap: timedelta) -> int:
+    """
+    Sessionize the rows created in [lo, hi) and move the watermark to hi,
+    in one transaction. Returns how many visitors had new activity.
+    """
+    await db.execute(_CREATE_VISITORS)
+    await db.execute(_FIND_VISITORS, {"lo": lo, "hi": hi, "gap": gap})
+    visitors, since = (await db.execute(
+        text("SELECT COUNT(*), MIN(since) FROM sessionize_visitors")
+    )).one()
+
+    if visitors:
+        params = {"since": since, "hi": hi}
+        await db.execute(_DELETE_OPEN)
+        await db.execute(_BUILD_SESSIONS, {
+            **params,
+            "gap": gap,
+            "passive": list(PASSIVE_EVENTS),
+            "conversion": CONVERSION_EVENT,
+        })
+        await db.execute(_TAG_PAGE_VIEWS, params)
+
+    await set_watermark(db, WATERMARK, hi)
+    await db.commit()
+    return visitors
+
+
+async def sessionize(db: AsyncSession, gap: timedelta, until: Optional[datetime] = None) -> int:
+    """
+    Job entry point: sessionize everything between the watermark and
+    until (default now - LATE_ROWS), one CHUNK per transaction. The first
+    run starts at the earliest page view / event.
+    """
+    until = until or datetime.now(timezone.utc) - LATE_ROWS
+    lo = await get_watermark(db, WATERMARK)
+    if lo is None:
+        lo = await _earliest_activity(db)
+        if lo is None:
+            return 0
+
+    visitors = 0
+    while lo < until:
+        hi = min(lo + CHUNK, until)
+        visitors += await sessionize_window(db, lo, hi, gap)
+        lo = hi
+    return visitors
+
+
+async def get_session_report(
+    db: AsyncSession,
+    start: datetime,
+    end: datetime,
+    granularity: str,
+) -> Dict[str, Any]:
+    """
+    Session metrics for sessions started in [start, end), read only from
+    the sessions table: overview, entry/exit sections, referrers and a
+    zero-filled series per bucket.
+    """
+    in_window = (VisitorSession.started_at >= start, VisitorSession.started_at < end)
+
+    overview = (await db.execute(
+        select(
+            func.count(),
+            func.count(func.distinct(VisitorSession.visitor_id)),
+            func.coalesce(func.avg(VisitorSession.duration_seconds), 0),
+            func.coalesce(func.avg(VisitorSession.page_views), 0),
+            func.coalesce(func.avg(VisitorSession.events), 0),
+            func.count().filter(VisitorSession.is_bounce),
+            func.count().filter(VisitorSession.converted),
+        ).where(*in_window)
+    )).one()
+    sessions, visitors, avg_duration, avg_page_views, avg_events, bounces, conversions = overview
+
+    async def breakdown(column, default: str, limit: Optional[int] = None) -> Dict[str, int]:
+        dimension = func.coalesce(column, default)
+        stmt = (
+            select(dimension, func.count())
+            .where(*in_window)
+            .group_by(dimension)
+            .order_by(func.count().desc())
+            .limit(limit)
+        )
+        return {name: count for name, count in (await db.execute(stmt)).all()}
+
+    buckets = bucket_starts(start, end, granularity)
+    index = {bucket.replace(tzinfo=None): i for i, bucket in enumerate(buckets)}
+    series = defaultdict(lambda: [0] * len(buckets))
+    bucket = func.date_trunc(granularity, func.timezone("UTC", VisitorSession.started_at))
+    rows = (await db.execute(
+        select(
+            bucket,
+            func.count(),
+            func.count().filter(VisitorSession.is_bounce),
+            func.coalesce(func.sum(VisitorSession.duration_seconds), 0),
+        ).where(*in_window).group_by(bucket)
+    )).all()
+    for moment, count, bounce_count, duration in rows:
+        if moment in index:
+            i = index[moment]
+            series["sessions"][i] = count
+            series["bounces"][i] = bounce_count
+            series["duration_seconds"][i] = int(duration)
+
+    return {
+        "granularity": granularity,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "sessionized_until": _isoformat(await get_watermark(db, WATERMARK)),
+        "overview": {
+            "sessions": sessions,
+            "visitors": visitors,
+            "avg_duration_seconds": round(float(avg_duration), 1),
+            "avg_page_views": round(float(avg_page_views), 2),
+            "avg_events": round(float(avg_events), 2),
+            "bounce_rate": round(bounces / sessions * 100, 2) if sessions else 0,
+            "conversion_rate": round(conversions / sessions * 100, 2) if sessions else 0,
+        },
+        "entry_sections": await breakdown(VisitorSession.entry_section, "unknown"),
+        "exit_sections": await breakdown(VisitorSession.exit_section, "unknown"),
+        "referrers": await breakdown(VisitorSession.referrer, "direct", limit=10),
+        "buckets": [moment.isoformat() for moment in buckets],
+        "sessions": series["sessions"],
+        "bounces": series["bounces"],
+        "duration_seconds": series["duration_seconds"],
+    }
+
+
+def _isoformat(moment: Optional[datetime]) -> Optional[str]:
+    return moment.isoformat() if moment else None
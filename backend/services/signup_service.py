@@ -0,0 +1,117 @@
+from sqlalchemy import select, literal, func, update, true
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional, NamedTuple
+from backend.models import Counter, Signup, Visitor
+
+SIGNUPS_COUNTER = "signups"
+
+
+class DuplicateEmailError(Exception):
+    pass
+
+
+class VisitorNotFoundError(Exception):
+    pass
+
+
+class SignupResult(NamedTuple):
+    signup_id: int
+    waitlist_position: int
+
+
+async def create_signup(
+    db: AsyncSession,
+    visitor_id: int,
+    email: str,
+    most_wanted_feature: str,
+    marketing_consent: bool,
+    signup_source: Optional[str] = None,
+    time_to_signup_seconds: Optional[int] = None,
+) -> SignupResult:
+    """
+    Allocate the waitlist position, mark the visitor converted and insert
+    the signup in a single statement.
+
+    The position comes from the "signups" counter row: the upsert locks it
+    until commit, so concurrent signups get unique, consecutive positions.
+    page_views_before_signup / events_before_signup are read from the
+    visitor's denormalized totals instead of counting rows. A duplicate
+    email (ON CONFLICT DO NOTHING) or an unknown visitor inserts nothing;
+    the transaction is then rolled back so the counter keeps no gap.
+    """
+    position = (
+        pg_insert(Counter)
+        .values(name=SIGNUPS_COUNTER, value=1)
+        .on_conflict_do_update(
+            index_elements=[Counter.name],
+            set_={"value": Counter.value + 1},
+        )
+        .returning(Counter.value)
+        .cte("position")
+    )
+
+    visitor = (
+        update(Visitor)
+        .where(Visitor.id == visitor_id)
+        .values(converted=True, converted_at=func.now())
+        .returning(Visitor.id, Visitor.total_visits, Visitor.total_events)
+        .cte("visitor")
+    )
+
+    signup_values = {
+        "email": email,
+        "most_wanted_feature": most_wanted_feature,
+        "marketing_consent": marketing_consent,
+        "signup_source": signup_source,
+        "time_to_signup_seconds": time_to_signup_seconds,
+    }
+    signup_insert = (
+        pg_insert(Signup)
+        .from_select(
+            [
+                "visitor_id",
+                "waitlist_position",
+                "page_views_before_signup",
+                "events_before_signup",
+                *signup_values,
+            ],
+            select(
+                visitor.c.id,
+                position.c.value,
+                visitor.c.total_visits,
+                visitor.c.total_events,
+                *(
+                    literal(value, type_=Signup.__table__.c[name].type)
+                    for name, value in signup_values.items()
+                ),
+            ).select_from(visitor.join(position, true())),
+        )
+        .on_conflict_do_nothing(index_elements=[Signup.email])
+        .returning(Signup.id, Signup.waitlist_position)
+        .cte("signup")
+    )
+
+    stmt = select(
+        select(signup_insert.c.id).scalar_subquery(),
+        select(signup_insert.c.waitlist_position).scalar_subquery(),
+        select(visitor.c.id).scalar_subquery(),
+    )
+
+    row = (await db.execute(stmt)).one()
+    signup_id, waitlist_position, found_visitor_id = row
+
+    if waitlist_position is None:
+        await db.rollback()
+        if found_visitor_id is None:
+            raise VisitorNotFoundError(visitor_id)
+        raise DuplicateEmailError(email)
+
+    await db.commit()
+    return SignupResult(signup_id=signup_id, waitlist_position=waitlist_position)
+
+
+async def get_signup_count(db: AsyncSession) -> int:
+    """Signups so far, read from the position counter instead of COUNT(*)."""
+    value = await db.scalar(select(Counter.value).where(Counter.name == SIGNUPS_COUNTER))
+    return int(value or 0)
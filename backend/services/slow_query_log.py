@@ -0,0 +1,177 @@
+"""
+Opt-in slow-query log (SLOW_QUERY_MS > 0, needs METRICS_ENABLED).
+
+Every statement slower than the threshold is logged with its route and
+parameters. Statements are grouped by shape (bind placeholders and IN /
+VALUES lists collapsed); the first time a read shape is slow, its plan is
+captured in a background task on a separate connection, inside a READ ONLY
+transaction. EXPLAIN ANALYZE runs the statement, so it is only used when
+every function the statement calls is on an allow-list of side-effect free
+ones; anything else (pg_notify, advisory locks, FOR UPDATE) gets a plain
+EXPLAIN. Shapes live in a bounded buffer (oldest evicted) that
+/api/stats/slow-queries reads.
+"""
+import asyncio
+import contextvars
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+# Set while capturing a plan, so the EXPLAIN itself is not logged
+_explaining = contextvars.ContextVar("slow_query_explaining", default=False)
+
+_PLACEHOLDER = re.compile(r"\$\d+|%\(\w+\)s|\?")
+_PLACEHOLDER_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+_VALUES_LIST = re.compile(r"(\(\?(?:, \?)*\))(?:\s*,\s*\(\?(?:, \?)*\))+")
+_DATA_MODIFYING = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE)\b", re.IGNORECASE)
+_ROW_LOCKING = re.compile(r"\bFOR\s+(NO\s+KEY\s+)?(UPDATE|SHARE|KEY\s+SHARE)\b", re.IGNORECASE)
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_CALL = re.compile(r"\b([a-z_][a-z0-9_]*)\s*\(", re.IGNORECASE)
+
+# Names that may precede "(" in a statement EXPLAIN ANALYZE can safely run:
+# SQL keywords and the read-only functions the app's queries use
+ANALYZE_SAFE_CALLS = frozenset({
+    "all", "and", "any", "as", "exists", "filter", "from", "in", "join", "lateral", "not", "on",
+    "or", "over", "select", "using", "values", "where", "within",
+    "array_agg", "avg", "bool_or", "cast", "coalesce", "count", "date_trunc", "distinct",
+    "extract", "floor", "greatest", "lag", "least", "max", "min", "now", "round", "sum", "timezone",
+})
+
+PARAMETERS_PREVIEW_CHARS = 500
+
+
+def statement_shape(statement: str) -> str:
+    """Statement text with parameters and repeated lists collapsed."""
+    shape = " ".join(statement.split())
+    shape = _PLACEHOLDER.sub("?", shape)
+    shape = _VALUES_LIST.sub(r"\1, ...", shape)
+    return _PLACEHOLDER_LIST.sub("?, ...", shape)
+
+
+def explain_prefix(statement: str) -> Optional[str]:
+    """
+    How to capture the plan of a statement: EXPLAIN (ANALYZE, BUFFERS) for
+    plain reads, EXPLAIN (planner estimates only, nothing runs) for reads
+    that call other functions or lock rows, None for writes (data-modifying
+    CTEs included).
+    """
+    if not statement.lstrip().upper().startswith(("SELECT", "WITH")) or _DATA_MODIFYING.search(statement):
+        return None
+    calls = {name.lower() for name in _CALL.findall(_STRING_LITERAL.sub("''", statement))}
+    if calls <= ANALYZE_SAFE_CALLS and not _ROW_LOCKING.search(statement):
+        return "EXPLAIN (ANALYZE, BUFFERS) "
+    return "EXPLAIN "
+
+
+class SlowQueryLog:
+    def __init__(self, threshold_ms: float, max_shapes: int, explain: bool):
+        self.threshold_ms = threshold_ms
+        self.max_shapes = max_shapes
+        self.explain = explain
+        self._shapes: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._tasks: set = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold_ms > 0
+
+    def observe(self, statement: str, parameters: Any, seconds: float, route: str) -> None:
+        duration_ms = seconds * 1000
+        if duration_ms < self.threshold_ms or _explaining.get():
+            return
+
+        preview = repr(parameters)[:PARAMETERS_PREVIEW_CHARS]
+        print(f"[SLOWQUERY] {duration_ms:.1f}ms route={route} {' '.join(statement.split())[:300]} params={preview}")
+
+        shape = statement_shape(statement)
+        key = hashlib.sha1(shape.encode()).hexdigest()[:16]
+        entry = self._shapes.get(key)
+        if entry is None:
+            entry = {
+                "shape": shape,
+                "count": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "routes": [],
+                "last_parameters": None,
+                "last_seen": None,
+                "plan": None,
+            }
+            self._shapes[key] = entry
+            while len(self._shapes) > self.max_shapes:
+                self._shapes.popitem(last=False)
+            prefix = explain_prefix(statement) if self.explain else None
+            if prefix is not None:
+                self._capture_plan(entry, prefix + statement, parameters)
+
+        entry["count"] += 1
+        entry["total_ms"] += duration_ms
+        entry["max_ms"] = max(entry["max_ms"], duration_ms)
+        entry["last_parameters"] = preview
+        entry["last_seen"] = datetime.now(timezone.utc).isoformat()
+        if route not in entry["routes"]:
+            entry["routes"].append(route)
+
+    def _capture_plan(self, entry: Dict[str, Any], statement: str, parameters: Any) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Sync engine (scripts): no loop to run the capture on
+            return
+        entry["plan"] = "pending"
+        task = loop.create_task(self._explain(entry, statement, parameters))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _explain(self, entry: Dict[str, Any], statement: str, parameters: Any) -> None:
+        from backend.database import get_async_engine
+        _explaining.set(True)
+        started = time.perf_counter()
+        try:
+            async with get_async_engine().connect() as conn:
+                await conn.exec_driver_sql("SET TRANSACTION READ ONLY")
+                result = await conn.exec_driver_sql(
+                    statement,
+                    tuple(parameters) if isinstance(parameters, list) else parameters,
+                )
+                entry["plan"] = "\n".join(row[0] for row in result)
+                await conn.rollback()
+        except Exception as exc:
+            entry["plan"] = f"EXPLAIN failed: {exc}"
+        print(f"[SLOWQUERY] Captured plan in {(time.perf_counter() - started) * 1000:.0f}ms: {entry['shape'][:120]}")
+
+    def worst(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Shapes by slowest single execution, with their plans."""
+        entries = sorted(self._shapes.values(), key=lambda entry: entry["max_ms"], reverse=True)
+        return [
+            {
+                **entry,
+                "total_ms": round(entry["total_ms"], 1),
+                "max_ms": round(entry["max_ms"], 1),
+                "avg_ms": round(entry["total_ms"] / entry["count"], 1),
+            }
+            for entry in entries[:limit]
+        ]
+
+    def clear(self) -> None:
+        self._shapes.clear()
+
+
+# Module level cache - initialized at runtime, not import time
+_slow_query_log = None
+
+
+def get_slow_query_log() -> SlowQueryLog:
+    global _slow_query_log
+    if _slow_query_log is None:
+        from backend.config import get_settings
+        settings = get_settings()
+        _slow_query_log = SlowQueryLog(
+            threshold_ms=settings.slow_query_ms,
+            max_shapes=settings.slow_query_buffer,
+            explain=settings.slow_query_explain,
+        )
+    return _slow_query_log
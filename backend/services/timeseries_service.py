@@ -0,0 +1,105 @@
+"""
+Time series over a [from, to) window for the dashboard.
+
+Every query filters on the raw created_at / first_seen column, so it is an
+index range scan: a 7-day window costs the same no matter how much history
+is stored.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.models import Event, PageView, Signup, Visitor
+
+GRANULARITIES = {
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+    "week": timedelta(weeks=1),
+}
+
+MAX_BUCKETS = 2000
+
+
+def truncate(moment: datetime, granularity: str) -> datetime:
+    """Python equivalent of date_trunc(granularity, ...) on a UTC datetime."""
+    moment = moment.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    if granularity == "hour":
+        return moment
+    moment = moment.replace(hour=0)
+    if granularity == "week":
+        # ISO weeks start on Monday, like Postgres
+        moment -= timedelta(days=moment.weekday())
+    return moment
+
+
+def bucket_starts(start: datetime, end: datetime, granularity: str) -> List[datetime]:
+    step = GRANULARITIES[granularity]
+    buckets = []
+    current = truncate(start, granularity)
+    while current < end:
+        buckets.append(current)
+        current += step
+    return buckets
+
+
+def _bucket(column, granularity: str):
+    return func.date_trunc(granularity, func.timezone("UTC", column))
+
+
+async def _count_series(db: AsyncSession, column, start, end, granularity, dimension=None):
+    bucket = _bucket(column, granularity)
+    columns = [bucket, func.count()] if dimension is None else [bucket, dimension, func.count()]
+    group_by = [bucket] if dimension is None else [bucket, dimension]
+
+    stmt = select(*columns).where(column >= start, column < end).group_by(*group_by)
+    return (await db.execute(stmt)).all()
+
+
+async def get_timeseries(
+    db: AsyncSession,
+    start: datetime,
+    end: datetime,
+    granularity: str,
+) -> Dict:
+    """
+    Counts per bucket for visitors (by first_seen), page views, signups and
+    events by type. Series are zero-filled and aligned with "buckets".
+    """
+    buckets = bucket_starts(start, end, granularity)
+    if len(buckets) > MAX_BUCKETS:
+        raise ValueError(f"Window has {len(buckets)} {granularity} buckets (max {MAX_BUCKETS})")
+
+    # date_trunc on timezone('UTC', ...) returns naive UTC timestamps
+    index = {bucket.replace(tzinfo=None): i for i, bucket in enumerate(buckets)}
+
+    def align(rows) -> List[int]:
+        series = [0] * len(buckets)
+        for bucket, count in rows:
+            if bucket in index:
+                series[index[bucket]] = count
+        return series
+
+    visitors = await _count_series(db, Visitor.first_seen, start, end, granularity)
+    page_views = await _count_series(db, PageView.created_at, start, end, granularity)
+    signups = await _count_series(db, Signup.created_at, start, end, granularity)
+    events = await _count_series(
+        db, Event.created_at, start, end, granularity, dimension=Event.event_type
+    )
+
+    events_by_type = defaultdict(list)
+    for bucket, event_type, count in events:
+        events_by_type[event_type].append((bucket, count))
+
+    return {
+        "granularity": granularity,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "buckets": [bucket.isoformat() for bucket in buckets],
+        "visitors": align(visitors),
+        "page_views": align(page_views),
+        "signups": align(signups),
+        "events": {event_type: align(rows) for event_type, rows in events_by_type.items()},
+    }
@@ -0,0 +1,120 @@
+"""
+Bounded LRU cache of parsed User-Agent strings.
+
+user_agents.parse is regex heavy, but real traffic only has a few hundred
+distinct UA strings, so the derived Visitor fields are cached per raw string.
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional
+
+from user_agents import parse
+
+
+class ParsedUserAgent(NamedTuple):
+    browser: Optional[str]
+    browser_version: Optional[str]
+    os: Optional[str]
+    os_version: Optional[str]
+    device_type: Optional[str]
+    device_brand: Optional[str]
+    device_model: Optional[str]
+    is_bot: bool
+
+
+EMPTY_USER_AGENT = ParsedUserAgent(None, None, None, None, None, None, None, False)
+
+
+class UserAgentCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, ParsedUserAgent]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_agent: str) -> ParsedUserAgent:
+        """Return the parsed fields for a raw UA string, parsing on a miss."""
+        if not user_agent:
+            return EMPTY_USER_AGENT
+
+        with self._lock:
+            parsed = self._entries.get(user_agent)
+            if parsed is not None:
+                self._entries.move_to_end(user_agent)
+                self.hits += 1
+                return parsed
+            self.misses += 1
+
+        # Parse outside the lock; a concurrent miss on the same key just parses twice
+        parsed = parse_user_agent(user_agent)
+
+        with self._lock:
+            self._entries[user_agent] = parsed
+            self._entries.move_to_end(user_agent)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+        return parsed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0,
+            }
+
+
+def parse_user_agent(user_agent: str) -> ParsedUserAgent:
+    """Uncached parse of a raw UA string into the Visitor columns."""
+    ua = parse(user_agent)
+
+    return ParsedUserAgent(
+        browser=ua.browser.family,
+        browser_version=ua.browser.version_string,
+        os=ua.os.family,
+        os_version=ua.os.version_string,
+        device_type=get_device_type(ua),
+        device_brand=ua.device.brand,
+        device_model=ua.device.model,
+        is_bot=ua.is_bot,
+    )
+
+
+def get_device_type(ua) -> str:
+    """Determine device type from user agent."""
+    if ua.is_mobile:
+        return "mobile"
+    elif ua.is_tablet:
+        return "tablet"
+    elif ua.is_pc:
+        return "desktop"
+    elif ua.is_bot:
+        return "bot"
+    return "unknown"
+
+
+# Module level cache - initialized at runtime, not import time
+_user_agent_cache = None
+
+
+def get_user_agent_cache() -> UserAgentCache:
+    global _user_agent_cache
+    if _user_agent_cache is None:
+        from backend.config import get_settings
+        settings = get_settings()
+        _user_agent_cache = UserAgentCache(max_size=settings.ua_cache_size)
+    return _user_agent_cache
@@ -1,66 +1,115 @@
-from sqlalchemy.orm import Session
-from typing import Optional
-from user_agents import parse
-from backend.models import Visitor
+from sqlalchemy import select, insert, literal, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional, NamedTuple
+from backend.models import Visitor, PageView, VisitorActivityDay
+from backend.services.rollup_service import utc_day
+from backend.services.sketch_service import PAGE_VIEW, get_sketch_buffer
+from backend.services.user_agent_cache import get_user_agent_cache
 
 
-def get_or_create_visitor(
-    db: Session,
+class Visit(NamedTuple):
+    visitor_id: int
+    page_view_id: int
+    total_visits: int
+
+
+async def record_visit(
+    db: AsyncSession,
     ip_address: str,
     user_agent: str,
     referrer: Optional[str] = None,
     utm_source: Optional[str] = None,
     utm_medium: Optional[str] = None,
     utm_campaign: Optional[str] = None,
-) -> Visitor:
+    utm_content: Optional[str] = None,
+    screen_width: Optional[int] = None,
+    screen_height: Optional[int] = None,
+    viewport_width: Optional[int] = None,
+    viewport_height: Optional[int] = None,
+) -> Visit:
     """
-    Get an existing visitor by IP or create a new one.
-    """
-    visitor = db.query(Visitor).filter(Visitor.ip_address == ip_address).first()
-
-    if visitor:
-        # Update visit count and last seen
-        visitor.total_visits += 1
-        db.commit()
-        db.refresh(visitor)
-        return visitor
+    Upsert the visitor by IP and insert its page view in a single statement.
 
-    # Parse user agent
-    ua = parse(user_agent) if user_agent else None
+    INSERT ... ON CONFLICT (ip_address) DO UPDATE bumps total_visits
+    atomically, so concurrent first visits from the same IP never hit the
+    unique constraint. The page view insert reads the visitor id from the
+    same CTE, and so does the (visitor, day) row for retention. Being one
+    statement, it runs on an autocommit connection: one round trip, no
+    BEGIN/COMMIT. The visitor is then added to the page view sketch buffer.
+    """
+    visitor_upsert = (
+        pg_insert(Visitor)
+        .values(
+            ip_address=ip_address,
+            user_agent=user_agent,
+            original_referrer=referrer,
+            utm_source=utm_source,
+            utm_medium=utm_medium,
+            utm_campaign=utm_campaign,
+            # Column defaults are not applied inside a CTE
+            total_visits=1,
+            total_events=0,
+            total_time_seconds=0,
+            converted=False,
+            **get_user_agent_cache().get(user_agent)._asdict(),
+        )
+        .on_conflict_do_update(
+            index_elements=[Visitor.ip_address],
+            set_={
+                "total_visits": Visitor.total_visits + 1,
+                "last_seen": func.now(),
+            },
+        )
+        .returning(Visitor.id, Visitor.total_visits)
+        .cte("visitor")
+    )
 
-    # Create new visitor
-    visitor = Visitor(
-        ip_address=ip_address,
-        user_agent=user_agent,
-        browser=ua.browser.family if ua else None,
-        browser_version=ua.browser.version_string if ua else None,
-        os=ua.os.family if ua else None,
-        os_version=ua.os.version_string if ua else None,
-        device_type=get_device_type(ua) if ua else None,
-        device_brand=ua.device.brand if ua else None,
-        device_model=ua.device.model if ua else None,
-        is_bot=ua.is_bot if ua else False,
-        original_referrer=referrer,
-        utm_source=utm_source,
-        utm_medium=utm_medium,
-        utm_campaign=utm_campaign,
+    page_view_values = {
+        "referrer": referrer,
+        "utm_source": utm_source,
+        "utm_medium": utm_medium,
+        "utm_campaign": utm_campaign,
+        "utm_content": utm_content,
+        "screen_width": screen_width,
+        "screen_height": screen_height,
+        "viewport_width": viewport_width,
+        "viewport_height": viewport_height,
+        "reached_form": False,
+    }
+    page_view_insert = (
+        insert(PageView)
+        .from_select(
+            ["visitor_id", *page_view_values],
+            select(
+                visitor_upsert.c.id,
+                *(
+                    literal(value, type_=PageView.__table__.c[name].type)
+                    for name, value in page_view_values.items()
+                ),
+            ),
+        )
+        .returning(PageView.id, PageView.visitor_id)
+        .cte("page_view")
     )
 
-    db.add(visitor)
-    db.commit()
-    db.refresh(visitor)
+    activity_insert = (
+        pg_insert(VisitorActivityDay)
+        .from_select(["visitor_id", "day"], select(visitor_upsert.c.id, utc_day(func.now())))
+        .on_conflict_do_nothing()
+        .cte("activity_day")
+    )
 
-    return visitor
+    stmt = select(
+        visitor_upsert.c.id,
+        page_view_insert.c.id,
+        visitor_upsert.c.total_visits,
+    ).select_from(
+        visitor_upsert.join(page_view_insert, page_view_insert.c.visitor_id == visitor_upsert.c.id)
+    ).add_cte(activity_insert)
 
+    conn = await db.connection(execution_options={"isolation_level": "AUTOCOMMIT"})
+    row = (await conn.execute(stmt)).one()
+    get_sketch_buffer().add(PAGE_VIEW, None, [row[0]])
 
-def get_device_type(ua) -> str:
-    """Determine device type from user agent."""
-    if ua.is_mobile:
-        return "mobile"
-    elif ua.is_tablet:
-        return "tablet"
-    elif ua.is_pc:
-        return "desktop"
-    elif ua.is_bot:
-        return "bot"
-    return "unknown"
+    return Visit(visitor_id=row[0], page_view_id=row[1], total_visits=row[2])
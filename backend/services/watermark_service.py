@@ -0,0 +1,30 @@
+"""
+Progress markers of the incremental jobs, one job_watermarks row per name.
+
+A watermark is a moment before which a job has finished its work; the job
+moves it forward in the same transaction as (or right after) the work it
+covers, so a failed or interrupted run resumes from the last committed one.
+"""
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.models import JobWatermark
+
+
+async def get_watermark(db: AsyncSession, name: str) -> Optional[datetime]:
+    return await db.scalar(select(JobWatermark.watermark).where(JobWatermark.name == name))
+
+
+async def set_watermark(db: AsyncSession, name: str, moment: datetime) -> None:
+    """Upsert; the caller commits."""
+    stmt = pg_insert(JobWatermark).values(name=name, watermark=moment)
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[JobWatermark.name],
+            set_={"watermark": stmt.excluded.watermark},
+        )
+    )
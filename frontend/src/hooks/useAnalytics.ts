@@ -8,8 +8,24 @@ interface AnalyticsState {
   lastTrackedMilestone: number;
 }
 
+interface QueuedEvent {
+  event_type: string;
+  event_category?: string;
+  element_id?: string;
+  element_class?: string;
+  element_text?: string;
+  section?: string;
+  properties?: Record<string, unknown>;
+  scroll_position: number;
+  time_since_page_load: number;
+}
+
 const API_BASE = '/api/analytics';
 
+// Events are buffered and sent in batches to /events
+const EVENT_BATCH_SIZE = 20;
+const EVENT_FLUSH_INTERVAL_MS = 2000;
+
 export function useAnalytics() {
   const state = useRef<AnalyticsState>({
     visitorId: null,
@@ -19,6 +35,32 @@ export function useAnalytics() {
     lastTrackedMilestone: 0,
   });
 
+  const eventQueue = useRef<QueuedEvent[]>([]);
+  const flushTimer = useRef<ReturnType<typeof setTimeout> | null>(null);
+
+  const flushEvents = useCallback(async (keepalive = false) => {
+    if (flushTimer.current) {
+      clearTimeout(flushTimer.current);
+      flushTimer.current = null;
+    }
+
+    if (!state.current.visitorId || eventQueue.current.length === 0) return;
+
+    const events = eventQueue.current;
+    eventQueue.current = [];
+
+    try {
+      await fetch(`${API_BASE}/events?visitor_id=${state.current.visitorId}&page_view_id=${state.current.pageViewId}`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ events }),
+        keepalive,
+      });
+    } catch (error) {
+      console.error('Track events error:', error);
+    }
+  }, []);
+
   const init = useCallback(async () => {
     try {
       const params = new URLSearchParams(window.location.search);
@@ -64,26 +106,24 @@ export function useAnalytics() {
   ) => {
     if (!state.current.visitorId) return;
 
-    try {
-      await fetch(`${API_BASE}/event?visitor_id=${state.current.visitorId}&page_view_id=${state.current.pageViewId}`, {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({
-          event_type: eventType,
-          event_category: options.category,
-          element_id: options.elementId,
-          element_class: options.elementClass,
-          element_text: options.elementText,
-          section: options.section,
-          properties: options.properties,
-          scroll_position: options.scrollPosition ?? window.scrollY,
-          time_since_page_load: Date.now() - state.current.pageLoadTime,
-        }),
-      });
-    } catch (error) {
-      console.error('Track event error:', error);
+    eventQueue.current.push({
+      event_type: eventType,
+      event_category: options.category,
+      element_id: options.elementId,
+      element_class: options.elementClass,
+      element_text: options.elementText,
+      section: options.section,
+      properties: options.properties,
+      scroll_position: options.scrollPosition ?? window.scrollY,
+      time_since_page_load: Date.now() - state.current.pageLoadTime,
+    });
+
+    if (eventQueue.current.length >= EVENT_BATCH_SIZE) {
+      await flushEvents();
+    } else if (!flushTimer.current) {
+      flushTimer.current = setTimeout(() => flushEvents(), EVENT_FLUSH_INTERVAL_MS);
     }
-  }, []);
+  }, [flushEvents]);
 
   const trackSectionView = useCallback((sectionId: string) => {
     trackEvent('section_view', {
@@ -159,11 +199,15 @@ export function useAnalytics() {
       navigator.sendBeacon(`${API_BASE}/beacon`, data);
     };
 
-    const handleBeforeUnload = () => sendBeacon();
+    const handleBeforeUnload = () => {
+      sendBeacon();
+      flushEvents(true);
+    };
     const handleVisibilityChange = () => {
       if (document.visibilityState === 'hidden') {
         sendBeacon();
         trackEvent('tab_hidden', { category: 'engagement' });
+        flushEvents(true);
       } else {
         trackEvent('tab_visible', { category: 'engagement' });
       }
@@ -176,7 +220,7 @@ export function useAnalytics() {
       window.removeEventListener('beforeunload', handleBeforeUnload);
       document.removeEventListener('visibilitychange', handleVisibilityChange);
     };
-  }, [trackEvent]);
+  }, [trackEvent, flushEvents]);
 
   return {
     init,
@@ -188,6 +232,7 @@ export function useAnalytics() {
     trackFormSubmit,
     trackCTAClick,
     trackFeatureHover,
+    flushEvents,
     getVisitorId: () => state.current.visitorId,
     getPageViewId: () => state.current.pageViewId,
     getPageLoadTime: () => state.current.pageLoadTime,
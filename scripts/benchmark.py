@@ -0,0 +1,288 @@
+"""
+Benchmark of the tracking and dashboard endpoints.
+
+Drives the real FastAPI app in process through httpx's ASGI transport (no
+uvicorn, no network) against the database in DATABASE_URL, and reports per
+endpoint: requests, errors, requests/sec, p50/p95/p99 latency and DB round
+trips (statements sent to the database) per request.
+
+Each synthetic session does what the landing page does:
+init -> N events (batched like the frontend) -> page view updates ->
+beacon -> signup (for a fraction of sessions). The dashboard is then
+requested with the response cache disabled, after one rollup refresh.
+
+Postgres only: visitor upserts, partitions and rollups use Postgres SQL,
+so there is no SQLite fallback.
+
+The schema must be current first: python -m backend.migrate
+
+Run with: python scripts/benchmark.py --sessions 2000 --concurrency 50
+Scale up: python scripts/benchmark.py --sessions 100000 --events-per-session 20
+"""
+import sys
+sys.path.insert(0, '.')
+
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+# Measure the real queries, not the response cache or a rollup job firing mid-run
+os.environ.setdefault("RESPONSE_CACHE_TTL", "0")
+os.environ.setdefault("ROLLUP_INTERVAL", "86400")
+
+import httpx
+from sqlalchemy import event
+
+from backend.config import get_settings
+from backend.database import get_async_engine
+from backend.main import app
+from backend.services.jobs import refresh_rollups_job
+
+# Endpoint being measured; statements from the background flusher keep the default
+current_endpoint = contextvars.ContextVar("current_endpoint", default="(ingestion flusher)")
+
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 14_5) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.5 Safari/605.1.15",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_5 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.5 Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0 Mobile Safari/537.36",
+    "Mozilla/5.0 (X11; Linux x86_64; rv:127.0) Gecko/20100101 Firefox/127.0",
+]
+REFERRERS = [None, "https://google.com", "https://twitter.com", "https://reddit.com", "https://producthunt.com"]
+SECTIONS = ["hero", "problem", "features", "social_proof", "waitlist_form"]
+EVENT_TYPES = [
+    ("section_view", "engagement"),
+    ("scroll_milestone", "scroll"),
+    ("cta_click", "navigation"),
+    ("form_focus", "form"),
+    ("form_field_blur", "form"),
+    ("feature_card_hover", "engagement"),
+]
+FEATURES = ["ai_research", "landing_pages", "analytics", "waitlist", "dashboard", "all"]
+
+
+class Recorder:
+    """Latencies, status codes and DB statements per endpoint."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.statements: Dict[str, int] = defaultdict(int)
+        self.elapsed: Dict[str, float] = {}
+
+    def on_statement(self, *args) -> None:
+        self.statements[current_endpoint.get()] += 1
+
+    async def request(self, client: httpx.AsyncClient, name: str, method: str, url: str, **kwargs):
+        token = current_endpoint.set(name)
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        finally:
+            self.latencies[name].append(time.perf_counter() - started)
+            current_endpoint.reset(token)
+        if response.status_code >= 400:
+            self.errors[name] += 1
+        return response
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+async def run_session(client: httpx.AsyncClient, recorder: Recorder, rng: random.Random, args, run_id: str, number: int) -> None:
+    headers = {
+        # One visitor per session; IPv6 keeps millions of sessions unique
+        "x-forwarded-for": f"fd00:{run_id}:{number >> 16:x}:{number & 0xffff:x}::1",
+        "user-agent": rng.choice(USER_AGENTS),
+    }
+    response = await recorder.request(client, "POST /init", "POST", "/api/analytics/init", headers=headers, json={
+        "referrer": rng.choice(REFERRERS),
+        "utm_source": rng.choice([None, "newsletter", "ads"]),
+        "screen_width": rng.choice([1920, 1440, 1366, 390, 414]),
+        "screen_height": rng.choice([1080, 900, 768, 844, 896]),
+    })
+    if response.status_code != 200:
+        return
+    visit = response.json()
+    params = {"visitor_id": visit["visitor_id"], "page_view_id": visit["page_view_id"]}
+
+    events = []
+    for _ in range(args.events_per_session):
+        event_type, category = rng.choice(EVENT_TYPES)
+        events.append({
+            "event_type": event_type,
+            "event_category": category,
+            "section": rng.choice(SECTIONS),
+            "scroll_position": rng.randint(0, 3000),
+            "time_since_page_load": rng.randint(1000, 300000),
+        })
+
+    if args.event_batch_size <= 1:
+        for tracked in events:
+            await recorder.request(client, "POST /event", "POST", "/api/analytics/event", params=params, json=tracked)
+    else:
+        for start in range(0, len(events), args.event_batch_size):
+            await recorder.request(client, "POST /events", "POST", "/api/analytics/events", params=params, json={
+                "events": events[start:start + args.event_batch_size],
+            })
+
+    scroll_depth = 0
+    time_on_page = 0
+    for _ in range(args.updates_per_session):
+        scroll_depth = min(100, scroll_depth + rng.randint(0, 30))
+        time_on_page += rng.randint(5, 30)
+        await recorder.request(client, "POST /pageview/update", "POST", "/api/analytics/pageview/update", json={
+            "page_view_id": visit["page_view_id"],
+            "time_on_page_seconds": time_on_page,
+            "max_scroll_depth": scroll_depth,
+            "reached_form": scroll_depth > 70,
+        })
+
+    if rng.random() < args.signup_rate:
+        await recorder.request(client, "POST /signups", "POST", "/api/signups/", json={
+            "visitor_id": visit["visitor_id"],
+            "email": f"bench-{run_id}-{number}@example.com",
+            "most_wanted_feature": rng.choice(FEATURES),
+            "marketing_consent": rng.random() > 0.3,
+            "time_to_signup_seconds": time_on_page,
+        })
+
+    await recorder.request(client, "POST /beacon", "POST", "/api/analytics/beacon", json={
+        "page_view_id": visit["page_view_id"],
+        "time_on_page_seconds": time_on_page + rng.randint(1, 20),
+        "max_scroll_depth": scroll_depth,
+        "events_count": len(events),
+    })
+
+
+async def run_ingestion(client: httpx.AsyncClient, recorder: Recorder, args, run_id: str) -> None:
+    next_session = iter(range(args.sessions))
+    progress_every = max(args.sessions // 10, 1)
+
+    async def worker() -> None:
+        for number in next_session:
+            # One RNG per session: the same --seed gives every session the same
+            # traffic, whichever worker happens to run it
+            rng = random.Random(f"{args.seed}-{number}")
+            await run_session(client, recorder, rng, args, run_id, number)
+            if (number + 1) % progress_every == 0:
+                print(f"[BENCH] {number + 1}/{args.sessions} sessions")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    recorder.elapsed["ingestion"] = time.perf_counter() - started
+
+
+async def run_dashboard(client: httpx.AsyncClient, recorder: Recorder, args) -> None:
+    window_start = (datetime.now(timezone.utc) - timedelta(days=args.window_days)).isoformat()
+    started = time.perf_counter()
+    for _ in range(args.dashboard_requests):
+        await recorder.request(client, "GET /dashboard", "GET", "/api/stats/dashboard")
+        await recorder.request(client, "GET /dashboard?from", "GET", "/api/stats/dashboard", params={
+            "from": window_start,
+            "granularity": "day",
+        })
+    recorder.elapsed["dashboard"] = time.perf_counter() - started
+
+
+def report(recorder: Recorder, args) -> dict:
+    phases = {"GET /dashboard": "dashboard", "GET /dashboard?from": "dashboard"}
+    rows = {}
+    for name, latencies in recorder.latencies.items():
+        latencies.sort()
+        elapsed = recorder.elapsed[phases.get(name, "ingestion")]
+        rows[name] = {
+            "requests": len(latencies),
+            "errors": recorder.errors[name],
+            "req_per_sec": round(len(latencies) / elapsed, 1) if elapsed else 0,
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "db_round_trips_per_req": round(recorder.statements[name] / len(latencies), 2),
+        }
+
+    total_requests = sum(len(latencies) for name, latencies in recorder.latencies.items() if name not in phases)
+    summary = {
+        "sessions": args.sessions,
+        "events": args.sessions * args.events_per_session,
+        "ingestion_seconds": round(recorder.elapsed["ingestion"], 2),
+        "ingestion_req_per_sec": round(total_requests / recorder.elapsed["ingestion"], 1),
+        "flusher_round_trips": recorder.statements["(ingestion flusher)"],
+        "endpoints": rows,
+    }
+
+    print()
+    print(f"{'endpoint':<26}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'db/req':>8}")
+    for name, row in rows.items():
+        print(
+            f"{name:<26}{row['requests']:>10}{row['errors']:>8}{row['req_per_sec']:>10}"
+            f"{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}{row['db_round_trips_per_req']:>8}"
+        )
+    print()
+    print(
+        f"{summary['sessions']} sessions, {summary['events']} events in {summary['ingestion_seconds']}s "
+        f"({summary['ingestion_req_per_sec']} req/s); "
+        f"ingestion flusher: {summary['flusher_round_trips']} DB round trips"
+    )
+    return summary
+
+
+async def main(args) -> None:
+    settings = get_settings()
+    if not settings.database_url.startswith("postgres"):
+        sys.exit("The benchmark needs Postgres (set DATABASE_URL)")
+
+    recorder = Recorder()
+    event.listen(get_async_engine().sync_engine, "before_cursor_execute", recorder.on_statement)
+
+    run_id = f"{int(time.time()) & 0xffff:x}"
+    transport = httpx.ASGITransport(app=app)
+
+    # Lifespan: check the schema (python -m backend.migrate must have run), start
+    # and finally drain the ingestion queue
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            await run_ingestion(client, recorder, args, run_id)
+
+    # Queue drained: aggregate what was written, then read it back (no
+    # lifespan here, so no background job competes with the refresh)
+    await refresh_rollups_job()
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        await run_dashboard(client, recorder, args)
+    await get_async_engine().dispose()
+
+    summary = report(recorder, args)
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(summary, output, indent=2)
+        print(f"[BENCH] Results written to {args.json}")
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=1000, help="synthetic page loads")
+    parser.add_argument("--concurrency", type=int, default=20, help="sessions in flight at once")
+    parser.add_argument("--events-per-session", type=int, default=10)
+    parser.add_argument("--event-batch-size", type=int, default=20, help="1 sends each event to /event")
+    parser.add_argument("--updates-per-session", type=int, default=3)
+    parser.add_argument("--signup-rate", type=float, default=0.05)
+    parser.add_argument("--dashboard-requests", type=int, default=50)
+    parser.add_argument("--window-days", type=int, default=7, help="timeseries window of the second dashboard call")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="also write the results to this file")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,51 @@
+"""
+Export events, page views, signups and visitors to partitioned Parquet.
+
+Heavy analysis then reads the files (pyarrow.dataset, DuckDB, Polars)
+instead of the production database. Each run only exports the append-only
+rows added since the previous run (see manifest.json in the output
+directory) and re-snapshots visitors. Personal data (emails, IPs) is left
+out unless --include-private. Needs pyarrow (pip install pyarrow).
+
+Run with: python scripts/export_parquet.py --out exports
+Full:     python scripts/export_parquet.py --out exports --full
+"""
+import sys
+sys.path.insert(0, '.')
+
+import argparse
+import shutil
+from datetime import timedelta
+from typing import Iterable, Optional
+
+from backend.database import get_engine
+from backend.services.export_service import EXPORT_TABLES, export_parquet
+
+
+def parse_args(argv: Optional[Iterable[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", default="exports", help="output directory (holds manifest.json)")
+    parser.add_argument("--tables", nargs="+", choices=list(EXPORT_TABLES), default=list(EXPORT_TABLES))
+    parser.add_argument("--batch-size", type=int, default=50000, help="rows per server-side cursor fetch")
+    parser.add_argument("--settle-minutes", type=float, default=60, help="leave rows newer than this for the next run")
+    parser.add_argument("--include-private", action="store_true", help="also export emails and IP addresses")
+    parser.add_argument("--full", action="store_true", help="delete the output directory and export everything again")
+    return parser.parse_args(argv)
+
+
+def main(args) -> None:
+    if args.full:
+        shutil.rmtree(args.out, ignore_errors=True)
+    with get_engine().connect() as conn:
+        export_parquet(
+            conn,
+            args.out,
+            tables=args.tables,
+            batch_size=args.batch_size,
+            settle=timedelta(minutes=args.settle_minutes),
+            include_private=args.include_private,
+        )
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -1,123 +1,356 @@
 """
-Script to seed the database with test data.
+Script to seed the database with synthetic test data.
+
+Generates visitors, page views, events and signups in chunks of visitors
+and streams each chunk into Postgres with COPY FROM STDIN, so memory stays
+bounded by --chunk-size and 10M+ events load in minutes. The same --seed
+and --end-date always produce the same data.
+
 Run with: python scripts/seed_data.py
+Large:    python scripts/seed_data.py --reset --visitors 500000 --days 90 --events-mean 20
 """
 import sys
 sys.path.insert(0, '.')
 
-from backend.database import SessionLocal, engine, Base
-from backend.models import Visitor, PageView, Event, Signup
-from datetime import datetime, timedelta
+import argparse
+import io
+import json
 import random
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Sequence
 
-# Create all tables
-Base.metadata.create_all(bind=engine)
+from sqlalchemy import text
 
-def seed_data():
-    db = SessionLocal()
+from backend.config import get_settings
+from backend.database import get_engine
+from backend.migrate import migrate
+from backend.services.partition_service import PARTITIONED_TABLES, partitions_between
+from backend.services.user_agent_cache import get_user_agent_cache
 
-    try:
-        # Clear existing data
-        db.query(Event).delete()
-        db.query(PageView).delete()
-        db.query(Signup).delete()
-        db.query(Visitor).delete()
-        db.commit()
-
-        # Create sample visitors
-        devices = ['mobile', 'desktop', 'tablet']
-        browsers = ['Chrome', 'Firefox', 'Safari', 'Edge']
-        referrers = [None, 'https://google.com', 'https://twitter.com', 'https://reddit.com', 'https://producthunt.com']
-        features = ['ai_research', 'landing_pages', 'analytics', 'waitlist', 'dashboard', 'all']
-
-        visitors = []
-        for i in range(50):
-            visitor = Visitor(
-                ip_address=f"192.168.1.{i+1}",
-                browser=random.choice(browsers),
-                browser_version=f"{random.randint(90, 120)}.0",
-                os=random.choice(['Windows', 'macOS', 'Linux', 'iOS', 'Android']),
-                device_type=random.choice(devices),
-                original_referrer=random.choice(referrers),
-                total_visits=random.randint(1, 5),
-                total_events=random.randint(5, 50),
-                total_time_seconds=random.randint(30, 600),
-                first_seen=datetime.utcnow() - timedelta(days=random.randint(0, 30)),
-            )
-            db.add(visitor)
-            visitors.append(visitor)
-
-        db.commit()
-
-        # Create page views for each visitor
-        for visitor in visitors:
-            for _ in range(visitor.total_visits):
-                page_view = PageView(
-                    visitor_id=visitor.id,
-                    referrer=visitor.original_referrer,
-                    screen_width=random.choice([1920, 1440, 1366, 390, 414]),
-                    screen_height=random.choice([1080, 900, 768, 844, 896]),
-                    time_on_page_seconds=random.randint(10, 300),
-                    max_scroll_depth=random.randint(20, 100),
-                    reached_form=random.random() > 0.4,
+VISITOR_COLUMNS = [
+    "id", "ip_address", "first_seen", "last_seen", "user_agent", "browser", "browser_version",
+    "os", "os_version", "device_type", "device_brand", "device_model", "is_bot",
+    "original_referrer", "utm_source", "utm_medium", "utm_campaign",
+    "total_visits", "total_events", "total_time_seconds", "converted", "converted_at",
+]
+PAGE_VIEW_COLUMNS = [
+    "id", "visitor_id", "created_at", "referrer", "utm_source", "utm_medium", "utm_campaign",
+    "screen_width", "screen_height", "viewport_width", "viewport_height",
+    "time_on_page_seconds", "max_scroll_depth", "reached_form",
+]
+EVENT_COLUMNS = [
+    "id", "visitor_id", "page_view_id", "created_at", "event_type", "event_category",
+    "element_id", "section", "properties", "scroll_position", "time_since_page_load",
+]
+SIGNUP_COLUMNS = [
+    "visitor_id", "email", "most_wanted_feature", "marketing_consent", "created_at",
+    "waitlist_position", "signup_source", "time_to_signup_seconds",
+    "page_views_before_signup", "events_before_signup",
+]
+ACTIVITY_DAY_COLUMNS = ["visitor_id", "day"]
+
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 14_5) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.5 Safari/605.1.15",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_5 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.5 Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0 Mobile Safari/537.36",
+    "Mozilla/5.0 (iPad; CPU OS 17_5 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.5 Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (X11; Linux x86_64; rv:127.0) Gecko/20100101 Firefox/127.0",
+    "Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)",
+]
+REFERRERS = [None, None, "https://google.com", "https://twitter.com", "https://reddit.com", "https://producthunt.com"]
+UTM_SOURCES = [None, None, None, "newsletter", "ads", "twitter"]
+SECTIONS = ["hero", "problem", "features", "social_proof", "waitlist_form"]
+EVENT_TYPES = [
+    ("section_view", "engagement"),
+    ("section_view", "engagement"),
+    ("scroll_milestone", "scroll"),
+    ("cta_click", "navigation"),
+    ("form_focus", "form"),
+    ("form_field_blur", "form"),
+    ("feature_card_hover", "engagement"),
+]
+FEATURES = ['ai_research', 'landing_pages', 'analytics', 'waitlist', 'dashboard', 'all']
+SCREENS = [(1920, 1080), (1440, 900), (1366, 768), (390, 844), (414, 896)]
+
+
+# ============================================
+# COPY HELPERS
+# ============================================
+
+
+def copy_value(value) -> str:
+    """One field in COPY text format."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, dict):
+        value = json.dumps(value, separators=(",", ":"))
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+class CopyBuffer:
+    """Rows of one table for the current chunk, in COPY text format."""
+
+    def __init__(self, table: str, columns: Sequence[str]):
+        self.table = table
+        self.columns = columns
+        self.buffer = io.StringIO()
+        self.rows = 0
+
+    def add(self, *values) -> None:
+        self.buffer.write("\t".join(copy_value(value) for value in values))
+        self.buffer.write("\n")
+        self.rows += 1
+
+    def copy_into(self, cursor) -> None:
+        self.buffer.seek(0)
+        cursor.copy_expert(
+            f"COPY {self.table} ({', '.join(self.columns)}) FROM STDIN",
+            self.buffer,
+        )
+
+
+class IdAllocator:
+    """
+    Hands out ids from a table's sequence without a round trip per row.
+    The seeder must be the only writer while it runs; sync() moves the
+    sequence past the ids used so far.
+    """
+
+    def __init__(self, cursor, table: str):
+        self.table = table
+        cursor.execute("SELECT nextval(pg_get_serial_sequence(%s, 'id'))", (table,))
+        self.next_id = cursor.fetchone()[0]
+
+    def take(self) -> int:
+        self.next_id += 1
+        return self.next_id - 1
+
+    def sync(self, cursor) -> None:
+        cursor.execute(
+            "SELECT setval(pg_get_serial_sequence(%s, 'id'), %s, false)",
+            (self.table, self.next_id),
+        )
+
+
+# ============================================
+# GENERATOR
+# ============================================
+
+
+def generate_chunk(
+    rng: random.Random,
+    args,
+    ids: Dict[str, IdAllocator],
+    count: int,
+    start: datetime,
+    end: datetime,
+    positions: List[int],
+):
+    """Build the COPY buffers (visitors, page views, events, signups, activity days) for count visitors."""
+    visitors = CopyBuffer("visitors", VISITOR_COLUMNS)
+    page_views = CopyBuffer("page_views", PAGE_VIEW_COLUMNS)
+    events = CopyBuffer("events", EVENT_COLUMNS)
+    signups = CopyBuffer("signups", SIGNUP_COLUMNS)
+    activity_days = CopyBuffer("visitor_activity_days", ACTIVITY_DAY_COLUMNS)
+    window_seconds = args.days * 86400
+
+    for _ in range(count):
+        visitor_id = ids["visitors"].take()
+        user_agent = rng.choice(USER_AGENTS)
+        parsed = get_user_agent_cache().get(user_agent)
+        referrer = rng.choice(REFERRERS)
+        utm_source = rng.choice(UTM_SOURCES)
+        first_seen = start + timedelta(seconds=rng.randrange(window_seconds))
+
+        visits = 1 + int(rng.expovariate(1 / max(args.pages_mean - 1, 1e-9))) if args.pages_mean > 1 else 1
+        visit_at = first_seen
+        total_events = 0
+        total_time = 0
+        days = set()
+
+        for _ in range(visits):
+            page_view_id = ids["page_views"].take()
+            time_on_page = int(rng.expovariate(1 / 60)) + 5
+            scroll_depth = min(100, int(rng.expovariate(1 / 45)))
+            screen = rng.choice(SCREENS)
+            n_events = int(rng.expovariate(1 / args.events_mean)) if args.events_mean > 0 else 0
+            page_reached_form = scroll_depth > 70
+
+            for _ in range(n_events):
+                event_type, category = rng.choice(EVENT_TYPES)
+                offset = rng.randrange(time_on_page * 1000)
+                event_at = visit_at + timedelta(milliseconds=offset)
+                days.add(event_at.date())
+                events.add(
+                    ids["events"].take(), visitor_id, page_view_id,
+                    event_at,
+                    event_type, category,
+                    f"{event_type}-{rng.randrange(5)}" if category == "navigation" else None,
+                    rng.choice(SECTIONS),
+                    None,
+                    rng.randrange(3000),
+                    offset,
                 )
-                db.add(page_view)
-
-        db.commit()
-
-        # Create some signups (conversion rate ~20%)
-        signup_visitors = random.sample(visitors, k=10)
-        for i, visitor in enumerate(signup_visitors):
-            signup = Signup(
-                visitor_id=visitor.id,
-                email=f"founder{i+1}@startup.com",
-                most_wanted_feature=random.choice(features),
-                marketing_consent=random.random() > 0.3,
-                waitlist_position=i + 1,
-                time_to_signup_seconds=random.randint(60, 300),
-                page_views_before_signup=random.randint(1, 5),
-                events_before_signup=random.randint(5, 30),
+                page_reached_form = page_reached_form or category == "form"
+
+            days.add(visit_at.date())
+            page_views.add(
+                page_view_id, visitor_id, visit_at, referrer, utm_source, None, None,
+                screen[0], screen[1], screen[0], screen[1] - 120,
+                time_on_page, scroll_depth, page_reached_form,
             )
-            visitor.converted = True
-            visitor.converted_at = datetime.utcnow() - timedelta(days=random.randint(0, 7))
-            db.add(signup)
-
-        db.commit()
-
-        # Create events for visitors
-        event_types = [
-            ('section_view', 'engagement'),
-            ('scroll_milestone', 'scroll'),
-            ('cta_click', 'navigation'),
-            ('form_focus', 'form'),
-            ('form_field_blur', 'form'),
-            ('feature_card_hover', 'engagement'),
-        ]
-        sections = ['hero', 'problem', 'features', 'social_proof', 'waitlist_form']
-
-        for visitor in visitors:
-            num_events = random.randint(5, 20)
-            for _ in range(num_events):
-                event_type, category = random.choice(event_types)
-                event = Event(
-                    visitor_id=visitor.id,
-                    event_type=event_type,
-                    event_category=category,
-                    section=random.choice(sections),
-                    scroll_position=random.randint(0, 3000),
-                    time_since_page_load=random.randint(1000, 300000),
-                )
-                db.add(event)
+            total_events += n_events
+            total_time += time_on_page
+            # Return visits within a week, never past the end of the window
+            visit_at = min(visit_at + timedelta(seconds=rng.randrange(3600, 7 * 86400)), end)
+
+        last_seen = visit_at
+        converted = not parsed.is_bot and rng.random() < args.conversion_rate
+        converted_at = first_seen + timedelta(seconds=rng.randrange(30, 600)) if converted else None
+
+        visitors.add(
+            visitor_id, visitor_ip(visitor_id), first_seen, last_seen, user_agent,
+            *parsed,
+            referrer, utm_source, None, None,
+            visits, total_events, total_time, converted, converted_at,
+        )
+
+        for day in sorted(days):
+            activity_days.add(visitor_id, day)
+
+        if converted:
+            positions[0] += 1
+            signups.add(
+                visitor_id, f"seed-{args.seed}-{visitor_id}@example.com", rng.choice(FEATURES),
+                rng.random() > 0.3, converted_at, positions[0],
+                rng.choice(["hero_cta", "bottom_form"]),
+                int((converted_at - first_seen).total_seconds()), visits, total_events,
+            )
+
+    return visitors, page_views, events, signups, activity_days
+
+
+def visitor_ip(visitor_id: int) -> str:
+    """Unique per visitor id (IPv6, so it never runs out)."""
+    return f"fd5e:{visitor_id >> 32 & 0xffff:x}:{visitor_id >> 16 & 0xffff:x}:{visitor_id & 0xffff:x}::1"
+
+
+# ============================================
+# MAIN
+# ============================================
+
+
+def create_partitions(conn, first_day: date, last_day: date) -> None:
+    interval = get_settings().partition_interval
+    for table in PARTITIONED_TABLES:
+        for statement in partitions_between(table, first_day, last_day, interval):
+            conn.execute(text(statement))
+
 
-        db.commit()
+def seed_data(args) -> None:
+    # Same schema as the app: the migrations, not create_all
+    migrate()
+    engine = get_engine()
 
-        print("Seeded database with:")
-        print(f"  - {len(visitors)} visitors")
-        print(f"  - {len(signup_visitors)} signups")
-        print(f"  - Multiple page views and events")
+    end = datetime.combine(args.end_date, datetime.min.time(), tzinfo=timezone.utc)
+    start = end - timedelta(days=args.days)
 
+    with engine.begin() as conn:
+        if args.reset:
+            conn.execute(text(
+                "TRUNCATE events, page_views, signups, visitors, sessions, visitor_activity_days RESTART IDENTITY"
+            ))
+            conn.execute(text("DELETE FROM counters WHERE name = 'signups'"))
+        elif conn.scalar(text("SELECT EXISTS (SELECT 1 FROM visitors)")):
+            # The jobs only catch up on recent data once they have run, so seeded
+            # history would never reach the rollups, sessions and sketches
+            sys.exit("The database already has visitors: seed an empty database or pass --reset")
+        # Derived data: the next job runs rebuild it from scratch, seeded history included
+        conn.execute(text("TRUNCATE stats_rollups, visitor_sketches"))
+        conn.execute(text(
+            "DELETE FROM job_watermarks"
+            " WHERE name IN ('sessions', 'sketch_backfill', 'sketch_backfill_until', 'rollups')"
+        ))
+        # The last page views can run a few minutes past the end of the window
+        create_partitions(conn, start.date(), (end + timedelta(days=1)).date())
+
+    rng = random.Random(args.seed)
+    raw = engine.raw_connection()
+    cursor = raw.cursor()
+    cursor.execute("SELECT COALESCE((SELECT value FROM counters WHERE name = 'signups'), 0)")
+    positions = [cursor.fetchone()[0]]
+    ids = {table: IdAllocator(cursor, table) for table in ("visitors", "page_views", "events")}
+
+    started = time.perf_counter()
+    totals = {"visitors": 0, "page_views": 0, "events": 0, "signups": 0, "visitor_activity_days": 0}
+
+    try:
+        remaining = args.visitors
+        while remaining > 0:
+            count = min(args.chunk_size, remaining)
+            buffers = generate_chunk(rng, args, ids, count, start, end, positions)
+
+            # Parents first: every other table references visitors
+            for buffer in buffers:
+                if buffer.rows:
+                    buffer.copy_into(cursor)
+                    totals[buffer.table] += buffer.rows
+            for allocator in ids.values():
+                allocator.sync(cursor)
+            raw.commit()
+
+            remaining -= count
+            elapsed = time.perf_counter() - started
+            print(
+                f"[SEED] {totals['visitors']}/{args.visitors} visitors, {totals['events']} events "
+                f"({totals['events'] / elapsed:,.0f} events/s)"
+            )
+
+        cursor.execute(
+            "INSERT INTO counters (name, value) VALUES ('signups', %s) "
+            "ON CONFLICT (name) DO UPDATE SET value = EXCLUDED.value",
+            (positions[0],),
+        )
+        raw.commit()
+
+        # Fresh statistics for the planner after a bulk load
+        raw.set_session(autocommit=True)
+        cursor.execute("ANALYZE visitors, page_views, events, signups, visitor_activity_days")
     finally:
-        db.close()
+        cursor.close()
+        raw.close()
+
+    print("Seeded database with:")
+    for table, rows in totals.items():
+        print(f"  - {rows} {table.replace('_', ' ')}")
+    print(f"  in {time.perf_counter() - started:.1f}s (rollups, sessions and sketches rebuild on the next job runs)")
+
+
+def parse_args(argv: Optional[Iterable[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--visitors", type=int, default=50)
+    parser.add_argument("--days", type=int, default=30, help="first visits spread over this many days")
+    parser.add_argument("--end-date", type=date.fromisoformat, default=date.today(), help="the window ends at the start of this day (default today)")
+    parser.add_argument("--pages-mean", type=float, default=1.5, help="mean page views per visitor")
+    parser.add_argument("--events-mean", type=float, default=12, help="mean events per page view (exponential)")
+    parser.add_argument("--conversion-rate", type=float, default=0.05)
+    parser.add_argument("--chunk-size", type=int, default=5000, help="visitors per COPY chunk")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true", help="truncate the tracking tables first (required unless the database is empty)")
+    return parser.parse_args(argv)
+
 
 if __name__ == "__main__":
-    seed_data()
+    seed_data(parse_args())
@@ -0,0 +1,45 @@
+import base64
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from backend.services.browse_service import InvalidCursor, decode_cursor, encode_cursor
+
+
+def raw_cursor(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("moment", [
+    datetime(2026, 10, 18, 2, 30, 15, 123456, tzinfo=timezone.utc),
+    datetime(2026, 1, 1, tzinfo=timezone(timedelta(hours=-3))),
+])
+@pytest.mark.parametrize("row_id", [1, 2**31 - 1, 2**53])
+def test_round_trip(moment, row_id):
+    cursor = encode_cursor(moment, row_id)
+    assert decode_cursor(cursor) == (moment, row_id)
+    # URL-safe and unpadded: goes into a query string as is
+    assert set(cursor) <= set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_")
+
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "not a cursor",
+    "éé",
+    encode_cursor(datetime(2026, 1, 1, tzinfo=timezone.utc), 7)[:-3],
+    raw_cursor("2026-01-01T00:00:00+00:00"),
+    raw_cursor({"moment": "2026-01-01T00:00:00+00:00", "id": 7}),
+    raw_cursor(["2026-01-01T00:00:00+00:00", 7, 8]),
+    raw_cursor(["yesterday", 7]),
+    raw_cursor([20260101, 7]),
+    raw_cursor(["2026-01-01T00:00:00", 7]),
+    raw_cursor(["2026-01-01T00:00:00+00:00", "7"]),
+    raw_cursor(["2026-01-01T00:00:00+00:00", 7.5]),
+    raw_cursor(["2026-01-01T00:00:00+00:00", True]),
+    raw_cursor(["2026-01-01T00:00:00+00:00", None]),
+])
+def test_tampered_cursors_are_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+
@@ -0,0 +1,98 @@
+import random
+
+from backend.services.funnel_service import deepest_step, step_bits
+
+WINDOW = 60.0
+END = 1000.0
+
+
+def depth(events, steps=3, window=WINDOW, start_before=END):
+    """events: [(moment, mask)] in time order."""
+    moments = [moment for moment, _ in events]
+    masks = [mask for _, mask in events]
+    return deepest_step(moments, masks, steps, window, start_before, step_bits(steps))
+
+
+def test_step_bits_lists_matched_steps_highest_first():
+    bits = step_bits(3)
+    assert bits[0] == ()
+    assert bits[0b001] == (0,)
+    assert bits[0b101] == (2, 0)
+    assert bits[0b111] == (2, 1, 0)
+
+
+def test_no_events():
+    assert depth([]) == 0
+
+
+def test_steps_in_order():
+    assert depth([(0, 0b001), (10, 0b010), (20, 0b100)]) == 3
+
+
+def test_steps_out_of_order_do_not_count():
+    assert depth([(0, 0b010), (10, 0b001), (20, 0b100)]) == 1
+    assert depth([(0, 0b100), (10, 0b010), (20, 0b001)]) == 1
+
+
+def test_without_a_first_step_nothing_is_reached():
+    assert depth([(0, 0b010), (10, 0b100)]) == 0
+
+
+def test_window_edge_is_inclusive():
+    assert depth([(0, 0b001), (30, 0b010), (WINDOW, 0b100)]) == 3
+    assert depth([(0, 0b001), (30, 0b010), (WINDOW + 0.001, 0b100)]) == 2
+
+
+def test_window_counts_from_the_first_step():
+    # Each gap is within the window, the chain as a whole is not
+    assert depth([(0, 0b001), (50, 0b010), (100, 0b100)]) == 2
+
+
+def test_first_step_must_happen_before_the_end():
+    assert depth([(END - 1, 0b001), (END + 1, 0b010)]) == 2
+    assert depth([(END, 0b001), (END + 1, 0b010)]) == 0
+
+
+def test_later_start_gets_a_fresh_window():
+    assert depth([(0, 0b001), (100, 0b001), (150, 0b010)]) == 2
+
+
+def test_deeper_progress_of_an_earlier_chain_is_kept():
+    # The chain from 0 reached step 2; the one from 50 only step 1
+    assert depth([(0, 0b001), (10, 0b010), (50, 0b001), (70, 0b100)]) == 2
+
+
+def test_one_event_advances_one_step():
+    # Every step is the same event type
+    assert depth([(0, 0b111)]) == 1
+    assert depth([(0, 0b111), (1, 0b111)]) == 2
+    assert depth([(0, 0b111), (1, 0b111), (2, 0b111)]) == 3
+
+
+def brute_force(events, steps, window, start_before):
+    """Deepest step over every possible chain start, matching each later step greedily."""
+    best = 0
+    for first, (start, mask) in enumerate(events):
+        if not mask & 1 or start >= start_before:
+            continue
+        reached = 1
+        for moment, mask in events[first + 1:]:
+            if reached == steps or moment - start > window:
+                break
+            if mask >> reached & 1:
+                reached += 1
+        best = max(best, reached)
+    return best
+
+
+def test_matches_brute_force_on_random_sequences():
+    rng = random.Random(7)
+    for _ in range(2000):
+        steps = rng.randint(2, 5)
+        moment = 0.0
+        events = []
+        for _ in range(rng.randint(0, 12)):
+            moment += rng.choice([0, 1, 5, 20, 40])
+            events.append((moment, rng.randrange(1 << steps)))
+        start_before = rng.uniform(0, moment + 1)
+        assert depth(events, steps, 45, start_before) == brute_force(events, steps, 45, start_before), events
@@ -0,0 +1,72 @@
+import pytest
+
+from backend.services.ingestion_queue import (
+    BEACON, EVENTS, PAGE_VIEW_UPDATE, IngestionQueue, PageViewBuffer, merge_page_view_update,
+)
+
+
+def update(time_on_page=None, scroll=None, reached_form=None, page_view_id=1):
+    return {
+        "page_view_id": page_view_id,
+        "time_on_page_seconds": time_on_page,
+        "max_scroll_depth": scroll,
+        "reached_form": reached_form,
+    }
+
+
+def test_merge_keeps_the_largest_values():
+    merged = merge_page_view_update(update(40, 80), update(30, 90))
+    assert merged["time_on_page_seconds"] == 40
+    assert merged["max_scroll_depth"] == 90
+
+
+def test_merge_none_is_no_value():
+    assert merge_page_view_update(update(40, 80, True), update()) == update(40, 80, True)
+    assert merge_page_view_update(update(), update(40, 80, False)) == update(40, 80, False)
+    assert merge_page_view_update(update(), update()) == update()
+
+
+@pytest.mark.parametrize("pending, new, expected", [
+    (True, False, True),
+    (False, True, True),
+    (False, False, False),
+    (None, False, False),
+    (True, None, True),
+])
+def test_merge_reached_form_is_sticky(pending, new, expected):
+    assert merge_page_view_update(update(reached_form=pending), update(reached_form=new))["reached_form"] is expected
+
+
+def test_merge_of_an_empty_pending_update():
+    assert merge_page_view_update({}, update(10, 20, True)) == update(10, 20, True)
+
+
+def test_buffer_coalesces_per_page_view():
+    buffer = PageViewBuffer(flush_interval=60)
+    buffer.add(update(10, 20, page_view_id=1))
+    buffer.add(update(15, 10, page_view_id=1))
+    buffer.add(update(5, page_view_id=2))
+
+    assert len(buffer) == 2
+    assert buffer.added == 3
+    assert buffer.coalesced == 1
+    assert buffer.pop(1) == update(15, 20, page_view_id=1)
+    assert buffer.drain() == [update(5, page_view_id=2)]
+    assert len(buffer) == 0
+
+
+def test_beacon_takes_the_pending_update_with_it():
+    queue = IngestionQueue(
+        max_size=10, batch_size=10, flush_interval=1, enqueue_timeout=1, page_view_flush_interval=60
+    )
+    events = {"visitor_id": 1, "page_view_id": 1, "events": []}
+    items = queue._coalesce([
+        (PAGE_VIEW_UPDATE, update(30, 70, True, page_view_id=1)),
+        (PAGE_VIEW_UPDATE, update(10, page_view_id=2)),
+        (EVENTS, events),
+        (BEACON, {"page_view_id": 1, "time_on_page_seconds": 45, "max_scroll_depth": 60}),
+    ])
+
+    assert items == [(EVENTS, events), (BEACON, update(45, 70, True, page_view_id=1))]
+    # Only the update of the page view without a beacon is left for the next flush
+    assert queue.page_views.drain() == [update(10, page_view_id=2)]
@@ -0,0 +1,69 @@
+from backend.services.retention_service import MAX_SEGMENTS, OTHER_SEGMENT, retention_matrix
+
+
+def matrix(rows, period_days=7, cohorts=2, periods=3):
+    """rows: [(visitor_id, first_offset, segment, age)], one per activity day."""
+    ids, first_offsets, names, ages = zip(*rows) if rows else ((), (), (), ())
+    return {
+        name: (sizes.tolist(), retained.tolist())
+        for name, sizes, retained in retention_matrix(
+            ids, first_offsets, names, ages, period_days, cohorts, periods
+        )
+    }
+
+
+def test_no_visitors():
+    assert matrix([]) == {}
+
+
+def test_visitor_without_activity_counts_in_the_cohort_only():
+    assert matrix([(1, 0, "all", -1)]) == {"all": ([1, 0], [[0, 0, 0], [0, 0, 0]])}
+
+
+def test_cohort_boundaries():
+    result = matrix([
+        (1, 0, "all", 0),
+        (2, 6, "all", 0),   # last day of the first week
+        (3, 7, "all", 0),   # first day of the second
+    ])
+    assert result["all"] == ([2, 1], [[2, 0, 0], [1, 0, 0]])
+
+
+def test_period_boundaries():
+    result = matrix([
+        (1, 0, "all", 0),
+        (1, 0, "all", 6),    # still period 0
+        (1, 0, "all", 7),    # period 1
+        (1, 0, "all", 20),   # last day of period 2
+        (1, 0, "all", 21),   # period 3: past the matrix
+    ])
+    assert result["all"] == ([1, 0], [[1, 1, 1], [0, 0, 0]])
+
+
+def test_several_days_in_one_period_count_once():
+    result = matrix([(1, 0, "all", 8), (1, 0, "all", 9), (2, 0, "all", 10)])
+    assert result["all"] == ([2, 0], [[0, 2, 0], [0, 0, 0]])
+
+
+def test_daily_periods():
+    result = matrix([(1, 0, "all", 0), (1, 0, "all", 1), (2, 1, "all", 2)], period_days=1)
+    assert result["all"] == ([1, 1], [[1, 1, 0], [0, 0, 1]])
+
+
+def test_segments_largest_first_and_the_tail_summed():
+    rows = []
+    visitor_id = 0
+    # Segment i has i + 1 visitors, each active on their first day
+    for i in range(MAX_SEGMENTS + 2):
+        for _ in range(i + 1):
+            visitor_id += 1
+            rows.append((visitor_id, 0, f"s{i:02d}", 0))
+
+    segments = retention_matrix(*zip(*rows), period_days=7, cohorts=1, periods=1)
+    names = [name for name, _, _ in segments]
+
+    assert names == [f"s{i:02d}" for i in range(MAX_SEGMENTS + 1, 1, -1)] + [OTHER_SEGMENT]
+    name, sizes, retained = segments[-1]
+    # s00 (1 visitor) and s01 (2 visitors)
+    assert sizes.tolist() == [3]
+    assert retained.tolist() == [[3]]
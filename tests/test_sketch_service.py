@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from backend.services.sketch_service import (
+    RELATIVE_ERROR, REGISTERS, _leading_zeros, empty_sketch, estimate, merge, sketch_of,
+)
+
+
+def relative_errors(n, sets):
+    """Estimate errors for `sets` disjoint id ranges of n visitors."""
+    return np.array([
+        (estimate(sketch_of(np.arange(k * 10**7, k * 10**7 + n))) - n) / n
+        for k in range(sets)
+    ])
+
+
+def test_empty_sketch_estimates_zero():
+    assert estimate(empty_sketch()) == 0
+
+
+@pytest.mark.parametrize("n", [1, 2, 10, 50])
+def test_tiny_counts_are_exact(n):
+    assert estimate(sketch_of(range(n))) == n
+
+
+@pytest.mark.parametrize("n", [1000, 2 * REGISTERS, int(2.5 * REGISTERS), 100_000])
+def test_error_bound(n):
+    # Around 2.5 * REGISTERS the estimator switches from linear counting
+    errors = relative_errors(n, sets=10)
+    assert np.abs(errors).max() < 4 * RELATIVE_ERROR
+    assert np.abs(errors).mean() < 2 * RELATIVE_ERROR
+
+
+def test_error_bound_at_a_million():
+    errors = relative_errors(1_000_000, sets=3)
+    assert np.abs(errors).max() < 3 * RELATIVE_ERROR
+
+
+def test_adding_a_visitor_twice_changes_nothing():
+    once = sketch_of(range(5000))
+    twice = sketch_of(list(range(5000)) * 2)
+    assert np.array_equal(once, twice)
+
+
+def test_merge_is_the_sketch_of_the_union():
+    a = sketch_of(range(0, 30_000))
+    b = sketch_of(range(20_000, 60_000))
+    assert np.array_equal(merge([a, b]), sketch_of(range(0, 60_000)))
+    assert np.array_equal(merge([a, a]), a)
+    assert np.array_equal(merge([]), empty_sketch())
+
+
+def test_leading_zeros_is_exact():
+    rng = np.random.default_rng(3)
+    values = np.concatenate([
+        np.array([0, 1, 2**63, 2**64 - 1], dtype=np.uint64),
+        (np.uint64(1) << rng.integers(0, 64, 1000).astype(np.uint64))
+        | rng.integers(0, 2**16, 1000).astype(np.uint64),
+    ])
+    expected = [64 - int(value).bit_length() for value in values]
+    assert _leading_zeros(values).tolist() == expected